@@ -0,0 +1,309 @@
+"""Tekton Benchmarks
+
+Times the parts of tekton whose speed matters most for large builds: level data compression, tile grid operations,
+room import, ROM builds and synthetic ROM generation. Everything runs on generated data (see tekton_synthetic_rom), so no
+original ROM is needed.
+
+    python benchmarks/run_benchmarks.py                     Run every benchmark and compare with benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --filter compress   Only run benchmarks whose names contain "compress"
+    python benchmarks/run_benchmarks.py --output out.json   Also save the results as JSON
+    python benchmarks/run_benchmarks.py --update-baseline   Save the results as the new baseline
+
+Each benchmark is run --repeat times. Setup, such as creating rooms, is not timed, and the fastest run is compared with
+the baseline. The script exits with status 1 if any benchmark is more than --tolerance slower than its baseline, and at
+least --min-slowdown seconds slower.
+Timings are only comparable on the same machine, so the baseline should be updated on the machine that checks for
+regressions.
+
+"""
+
+import argparse
+import atexit
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from tekton.tekton_compressor import TektonCompressionMapper
+from tekton.tekton_door import TektonDoor
+from tekton.tekton_project import TektonProject
+from tekton.tekton_room import TektonRoom
+from tekton.tekton_room_importer import TektonRoomImporter
+from tekton import tekton_synthetic_rom
+from tekton.tekton_tile import TektonTile
+from tekton.tekton_tile_grid import TektonTileGrid
+
+RESULTS_VERSION = 1
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+COMPRESSION_PROFILES = ("uniform", "patterned", "random")
+COMPRESSION_SCREENS = (1, 10, 25, 50)
+TILE_GRID_SCREENS = (1, 10, 50)
+IMPORT_ROOM_COUNTS = (10, 100, 260)
+BUILD_ROOM_COUNTS = (10, 100, 260)
+SYNTHETIC_ROM_SIZE = 0x300000
+
+
+def get_benchmarks():
+    """Returns every benchmark, in the order they are run.
+
+    Returns:
+        list : (name, setup) tuples. setup takes no arguments and returns the function to time, which also takes no
+            arguments.
+
+    """
+    benchmarks = []
+    for profile in COMPRESSION_PROFILES:
+        for screens in COMPRESSION_SCREENS:
+            benchmarks.append(("compress/{}/{}_screens".format(profile, screens),
+                               _partial(_setup_compress, profile, screens)))
+    for screens in TILE_GRID_SCREENS:
+        benchmarks.append(("tile_grid/fill/{}_screens".format(screens), _partial(_setup_tile_grid_fill, screens)))
+        benchmarks.append(("tile_grid/uncompressed_data/{}_screens".format(screens),
+                           _partial(_setup_tile_grid_uncompressed_data, screens)))
+        benchmarks.append(("tile_grid/overwrite_with/{}_screens".format(screens),
+                           _partial(_setup_tile_grid_overwrite_with, screens)))
+    benchmarks.append(("synthetic_rom/4mb", _setup_synthetic_rom))
+    for room_count in IMPORT_ROOM_COUNTS:
+        benchmarks.append(("import/{}_rooms".format(room_count), _partial(_setup_import, room_count)))
+    for room_count in BUILD_ROOM_COUNTS:
+        benchmarks.append(("build/{}_rooms".format(room_count), _partial(_setup_build, room_count)))
+    return benchmarks
+
+
+def run_benchmarks(benchmarks, *, repeat=5):
+    """Runs benchmarks and times them.
+
+    Args:
+        benchmarks (list): (name, setup) tuples, as returned by get_benchmarks.
+        repeat (int): Optional. Number of times to time each benchmark. Defaults to 5.
+
+    Returns:
+        dict : Results, which can be saved as JSON. "benchmarks" maps each name to its "min_seconds",
+            "median_seconds" and "repeat".
+
+    """
+    results = {"version": RESULTS_VERSION,
+               "python": platform.python_version(),
+               "platform": platform.platform(),
+               "benchmarks": {}}
+    for name, setup in benchmarks:
+        timings = []
+        for i in range(repeat):
+            timed_function = setup()
+            start_time = time.perf_counter()
+            timed_function()
+            timings.append(time.perf_counter() - start_time)
+        results["benchmarks"][name] = {"min_seconds": min(timings),
+                                       "median_seconds": statistics.median(timings),
+                                       "repeat": repeat}
+    return results
+
+
+def compare_results(results, baseline, *, tolerance=0.25, min_slowdown=0.01):
+    """Compares results with a baseline.
+
+    Args:
+        results (dict): Results from run_benchmarks.
+        baseline (dict): Earlier results from run_benchmarks.
+        tolerance (float): Optional. How much slower than the baseline a benchmark may be, as a fraction of the
+            baseline. Defaults to 0.25.
+        min_slowdown (float): Optional. How many seconds slower than the baseline a benchmark must also be to count as a
+            regression, so that noise in very short benchmarks is not reported. Defaults to 0.01.
+
+    Returns:
+        list : (name, baseline seconds, seconds, ratio) tuples for every benchmark in both results, with ratio > 1 if
+            the benchmark got slower, sorted by name.
+        list : Names of the benchmarks which are more than tolerance and min_slowdown slower than their baseline.
+
+    """
+    comparisons = []
+    regressions = []
+    for name, result in sorted(results["benchmarks"].items()):
+        baseline_result = baseline.get("benchmarks", {}).get(name)
+        if baseline_result is None or baseline_result["min_seconds"] <= 0:
+            continue
+        ratio = result["min_seconds"] / baseline_result["min_seconds"]
+        comparisons.append((name, baseline_result["min_seconds"], result["min_seconds"], ratio))
+        if ratio > 1 + tolerance and result["min_seconds"] - baseline_result["min_seconds"] > min_slowdown:
+            regressions.append(name)
+    return comparisons, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time tekton's compression, tile grids, import and builds.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH, help="Baseline results to compare with.")
+    parser.add_argument("--filter", default="", help="Only run benchmarks whose names contain this string.")
+    parser.add_argument("--output", help="Save the results as JSON to this path.")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of times to time each benchmark.")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Fraction slower than the baseline that counts as a regression.")
+    parser.add_argument("--min-slowdown", type=float, default=0.01,
+                        help="Seconds slower than the baseline that a regression must also be.")
+    parser.add_argument("--update-baseline", action="store_true", help="Save the results as the new baseline.")
+    args = parser.parse_args(argv)
+
+    benchmarks = [(name, setup) for name, setup in get_benchmarks() if args.filter in name]
+    results = run_benchmarks(benchmarks, repeat=args.repeat)
+
+    if args.output:
+        _write_results(args.output, results)
+    if args.update_baseline:
+        _write_results(args.baseline, results)
+
+    if not args.update_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        comparisons, regressions = compare_results(results, baseline, tolerance=args.tolerance,
+                                                  min_slowdown=args.min_slowdown)
+        for name, baseline_seconds, seconds, ratio in comparisons:
+            print("{:<45} {:>10.4f}s {:>10.4f}s {:>7.2f}x{}".format(name, baseline_seconds, seconds, ratio,
+                                                                    "  REGRESSION" if name in regressions else ""))
+        return 1 if regressions else 0
+
+    for name, result in results["benchmarks"].items():
+        print("{:<45} {:>10.4f}s".format(name, result["min_seconds"]))
+    return 0
+
+
+def _partial(function, *args):
+    return lambda: function(*args)
+
+
+def _write_results(results_path, results):
+    with open(results_path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def _get_uncompressed_data(profile, screens, rng):
+    tile_count = screens * 256
+    if profile == "uniform":
+        return bytes([0xff, 0x00]) * tile_count + bytes(tile_count)
+    if profile == "patterned":
+        # Runs of a few different tiles, like floors, walls and empty air
+        layer_1 = bytearray()
+        bts = bytearray()
+        while len(bts) < tile_count:
+            run_length = min(rng.randrange(1, 48), tile_count - len(bts))
+            layer_1 += bytes([rng.choice([0x00, 0x5f, 0xff]), rng.choice([0x00, 0x80, 0x84])]) * run_length
+            bts += bytes([rng.choice([0x00, 0x01])]) * run_length
+        return bytes(layer_1 + bts)
+    if profile == "random":
+        return bytes(rng.getrandbits(8) for i in range(tile_count * 3))
+    raise ValueError("profile must be one of {}".format(", ".join(COMPRESSION_PROFILES)))
+
+
+def _setup_compress(profile, screens):
+    compressor = TektonCompressionMapper()
+    compressor.width_screens = screens
+    compressor.uncompressed_data = _get_uncompressed_data(profile, screens, random.Random(screens))
+    return lambda: compressor.compressed_data
+
+
+def _setup_tile_grid_fill(screens):
+    tile_grid = TektonTileGrid(screens * 16, 16)
+    return tile_grid.fill
+
+
+def _setup_tile_grid_uncompressed_data(screens):
+    tile_grid = TektonTileGrid(screens * 16, 16)
+    fill_tile = TektonTile()
+    fill_tile.tileno = 0x5f
+    tile_grid.fill(fill_tile)
+    return lambda: tile_grid.uncompressed_data
+
+
+def _setup_tile_grid_overwrite_with(screens):
+    tile_grid = TektonTileGrid(screens * 16, 16)
+    tile_grid.fill()
+    new_tiles = TektonTileGrid(screens * 16, 16)
+    fill_tile = TektonTile()
+    fill_tile.tileno = 0x5f
+    new_tiles.fill(fill_tile)
+    return lambda: tile_grid.overwrite_with(new_tiles)
+
+
+def _make_rooms(room_count, rng):
+    # Rooms laid out the way Super Metroid lays them out: headers in bank $8F, doors in bank $83 and level data in the
+    # banks after $C2. Each room has two doors, leading to the rooms before and after it.
+    rooms = []
+    header_address = 0x791f8
+    level_data_address = 0x210000
+    for room_number in range(room_count):
+        width_screens = rng.randrange(1, 5)
+        height_screens = rng.randrange(1, 4)
+        new_room = TektonRoom(width_screens, height_screens)
+        new_room.header = header_address
+        new_room.room_index = room_number % 0x100
+        new_room.standard_state.tiles = TektonTileGrid.from_uncompressed_data(
+            width_screens * 16,
+            height_screens * 16,
+            _get_uncompressed_data("patterned", width_screens * height_screens, rng)
+        )
+        for door_number in range(2):
+            new_door = TektonDoor()
+            new_door.data_address = 0x18000 + (room_number * 2 + door_number) * 12
+            new_room.doors.append(new_door)
+        level_data_length = len(new_room.compressed_level_data(new_room.standard_state, fit_to_length=False))
+        if (level_data_address + level_data_length) // 0x8000 != level_data_address // 0x8000:
+            level_data_address = (level_data_address // 0x8000 + 1) * 0x8000
+        new_room.standard_state.level_data_address = level_data_address
+        new_room.level_data_length = level_data_length
+        level_data_address += level_data_length
+        header_address += len(new_room.header_data) + 2  # Leave 00 00 after the door list, which ends it
+        rooms.append(new_room)
+    for room_number, room in enumerate(rooms):
+        room.doors[0].target_room_id = rooms[room_number - 1].header
+        room.doors[1].target_room_id = rooms[(room_number + 1) % room_count].header
+    return rooms
+
+
+def _make_project(room_count, rom_path):
+    project = TektonProject()
+    project.source_rom_path = rom_path
+    for room in _make_rooms(room_count, random.Random(room_count)):
+        project.rooms.add_room(room)
+    return project
+
+
+def _get_blank_rom_path():
+    rom_path = os.path.join(tempfile.gettempdir(), "tekton_benchmark_blank_{}.sfc".format(os.getpid()))
+    if not os.path.exists(rom_path):
+        with open(rom_path, "wb") as f:
+            f.write(bytes(SYNTHETIC_ROM_SIZE))
+        atexit.register(os.remove, rom_path)
+    return rom_path
+
+
+def _setup_synthetic_rom():
+    # Time a cold start, including compressing the level data for each room size
+    tekton_synthetic_rom.clear_cache()
+    return lambda: tekton_synthetic_rom.generate_synthetic_rom(260, rom_size=0x400000)
+
+
+def _setup_import(room_count):
+    rom_contents, room_headers = tekton_synthetic_rom.generate_synthetic_rom(room_count)
+
+    def import_rooms():
+        room_importer = TektonRoomImporter()
+        room_importer.rom_contents = rom_contents
+        for header in room_headers:
+            room_importer.room_header_address = header
+            room_importer.import_room_from_rom()
+
+    return import_rooms
+
+
+def _setup_build(room_count):
+    project = _make_project(room_count, _get_blank_rom_path())
+    return project.get_modified_rom_contents
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+"""Tekton Address Space
+
+This module implements conversion between PC addresses (offsets into the ROM file) and the 24-bit LoROM addresses the
+SNES uses, for single addresses and for whole lists of pointers at once.
+
+In LoROM, each bank from $80 to $FF maps 0x8000 bytes of the ROM to the addresses $8000-$FFFF of that bank: PC address
+0x000000 is $80:8000, 0x007fff is $80:FFFF and 0x008000 is $81:8000. Addresses below $8000 in a bank are not part of
+the ROM, but Super Metroid ignores the high bit of the address, so they are read as if they were $8000 higher. Both
+directions are looked up in tables of banks, which are built once for each ROM size.
+
+Lists of addresses are converted with NumPy if it is installed, and with the bank tables otherwise. If a NumPy array is
+passed in, a NumPy array is returned, otherwise a list.
+
+Classes:
+    TektonAddressSpace: Converts addresses between PC and LoROM for a ROM of a given size.
+
+Functions:
+    get_address_space: Returns a shared TektonAddressSpace for a ROM size.
+
+"""
+
+from array import array
+from functools import lru_cache
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+LOROM_BANK_SIZE = 0x8000
+FIRST_LOROM_BANK = 0x80
+MAX_LOROM_ROM_SIZE = 0x400000  # Banks $80-$FF
+
+
+class TektonAddressSpace:
+    """Converts addresses between PC and LoROM for a ROM of a given size.
+
+    Attributes:
+        rom_size (int): Size of the ROM in bytes. Addresses outside the ROM cannot be converted.
+
+    """
+
+    def __init__(self, rom_size=MAX_LOROM_ROM_SIZE):
+        """
+        Args:
+            rom_size (int): Optional. Size of the ROM in bytes. Defaults to the largest LoROM ROM, 4 MB.
+
+        """
+        if not isinstance(rom_size, int):
+            raise TypeError("rom_size must be of type int!")
+        if rom_size <= 0 or rom_size > MAX_LOROM_ROM_SIZE:
+            raise ValueError("rom_size must be between 1 and {}".format(hex(MAX_LOROM_ROM_SIZE)))
+        self.rom_size = rom_size
+
+        bank_count = (rom_size + LOROM_BANK_SIZE - 1) // LOROM_BANK_SIZE
+        # LoROM bank number -> PC address of the start of the bank, or -1 if the bank is not part of the ROM
+        self._bank_pc_starts = array("l", [-1] * 0x100)
+        # PC address // LOROM_BANK_SIZE -> LoROM address of the start of the bank
+        self._bank_lorom_starts = array("l")
+        for bank_index in range(bank_count):
+            self._bank_pc_starts[FIRST_LOROM_BANK + bank_index] = bank_index * LOROM_BANK_SIZE
+            self._bank_lorom_starts.append(((FIRST_LOROM_BANK + bank_index) << 16) | 0x8000)
+
+        self._numpy_bank_pc_starts = None
+        self._numpy_bank_lorom_starts = None
+        if numpy is not None:
+            self._numpy_bank_pc_starts = numpy.array(self._bank_pc_starts, dtype=numpy.int64)
+            self._numpy_bank_lorom_starts = numpy.array(self._bank_lorom_starts, dtype=numpy.int64)
+
+    def lorom_to_pc(self, lorom_address):
+        """Converts a LoROM address to a PC address.
+
+        Args:
+            lorom_address (int): 24-bit LoROM address, e.g. 0xc3bcd2.
+
+        Returns:
+            int : PC address, e.g. 0x21bcd2.
+
+        """
+        if not 0 <= lorom_address <= 0xffffff:
+            raise ValueError("LoROM value must be a positive number between 0x800000 and 0xffffff")
+        pc_start = self._bank_pc_starts[lorom_address >> 16]
+        pc_address = pc_start + (lorom_address & 0x7fff)
+        if pc_start < 0 or pc_address >= self.rom_size:
+            raise ValueError("LoROM address {} is outside the ROM!".format(hex(lorom_address)))
+        return pc_address
+
+    def pc_to_lorom(self, pc_address):
+        """Converts a PC address to a LoROM address.
+
+        Args:
+            pc_address (int): PC address, e.g. 0x21bcd2.
+
+        Returns:
+            int : 24-bit LoROM address, e.g. 0xc3bcd2. The address within the bank is always $8000 or higher.
+
+        """
+        if not 0 <= pc_address < self.rom_size:
+            raise ValueError("PC address {} is outside the ROM!".format(hex(pc_address)))
+        return self._bank_lorom_starts[pc_address >> 15] | (pc_address & 0x7fff)
+
+    def bank_pointer_to_pc(self, pointer, bank):
+        """Converts a 16-bit pointer into a known bank, such as a door pointer into bank $83, to a PC address.
+
+        Args:
+            pointer (int): 16-bit address within the bank.
+            bank (int): LoROM bank number, e.g. 0x83.
+
+        Returns:
+            int : PC address.
+
+        """
+        return self.lorom_to_pc((bank << 16) | pointer)
+
+    def lorom_to_pc_array(self, lorom_addresses):
+        """Converts a list of LoROM addresses to PC addresses.
+
+        Args:
+            lorom_addresses (iterable): 24-bit LoROM addresses.
+
+        Returns:
+            list : PC addresses, in the same order. A NumPy array if lorom_addresses is one.
+
+        """
+        if numpy is not None and isinstance(lorom_addresses, numpy.ndarray):
+            return self._numpy_lorom_to_pc(lorom_addresses)
+        lorom_addresses = list(lorom_addresses)
+        if numpy is not None and len(lorom_addresses) > 0:
+            return self._numpy_lorom_to_pc(numpy.array(lorom_addresses, dtype=numpy.int64)).tolist()
+        return [self.lorom_to_pc(lorom_address) for lorom_address in lorom_addresses]
+
+    def pc_to_lorom_array(self, pc_addresses):
+        """Converts a list of PC addresses to LoROM addresses.
+
+        Args:
+            pc_addresses (iterable): PC addresses.
+
+        Returns:
+            list : 24-bit LoROM addresses, in the same order. A NumPy array if pc_addresses is one.
+
+        """
+        if numpy is not None and isinstance(pc_addresses, numpy.ndarray):
+            return self._numpy_pc_to_lorom(pc_addresses)
+        pc_addresses = list(pc_addresses)
+        if numpy is not None and len(pc_addresses) > 0:
+            return self._numpy_pc_to_lorom(numpy.array(pc_addresses, dtype=numpy.int64)).tolist()
+        return [self.pc_to_lorom(pc_address) for pc_address in pc_addresses]
+
+    def read_pointers(self, rom_contents, pointer_addresses, *, bank=None):
+        """Reads little-endian pointers from the ROM and converts them to PC addresses.
+
+        Args:
+            rom_contents (bytes): Contents of the ROM. Any buffer, such as an mmap, can be used.
+            pointer_addresses (iterable): PC addresses where the pointers are stored.
+            bank (int): Optional. If given, the pointers are 16-bit addresses within this LoROM bank. Otherwise they are
+                24-bit LoROM addresses.
+
+        Returns:
+            list : PC addresses the pointers point at, in the same order. A NumPy array if pointer_addresses is one.
+
+        """
+        pointer_length = 3 if bank is None else 2
+        if numpy is not None:
+            return_array = isinstance(pointer_addresses, numpy.ndarray)
+            pointer_addresses = numpy.asarray(pointer_addresses, dtype=numpy.int64)
+            if len(pointer_addresses) == 0:
+                return pointer_addresses if return_array else []
+            if pointer_addresses.min() < 0 or pointer_addresses.max() + pointer_length > len(rom_contents):
+                raise ValueError("Pointer addresses must be inside the ROM!")
+            rom_array = numpy.frombuffer(rom_contents, dtype=numpy.uint8)
+            lorom_addresses = rom_array[pointer_addresses].astype(numpy.int64) | \
+                (rom_array[pointer_addresses + 1].astype(numpy.int64) << 8)
+            if bank is None:
+                lorom_addresses |= rom_array[pointer_addresses + 2].astype(numpy.int64) << 16
+            else:
+                lorom_addresses |= bank << 16
+            pc_addresses = self._numpy_lorom_to_pc(lorom_addresses)
+            return pc_addresses if return_array else pc_addresses.tolist()
+
+        pc_addresses = []
+        for pointer_address in pointer_addresses:
+            if pointer_address < 0 or pointer_address + pointer_length > len(rom_contents):
+                raise ValueError("Pointer addresses must be inside the ROM!")
+            lorom_address = int.from_bytes(rom_contents[pointer_address:pointer_address + pointer_length],
+                                           byteorder="little")
+            if bank is not None:
+                lorom_address |= bank << 16
+            pc_addresses.append(self.lorom_to_pc(lorom_address))
+        return pc_addresses
+
+    def pointer_bytes(self, pc_address, *, length=3):
+        """Returns the little-endian LoROM pointer to a PC address, as it is stored in the ROM.
+
+        Args:
+            pc_address (int): PC address being pointed at.
+            length (int): Optional. 3 for a 24-bit pointer including the bank, or 2 for a 16-bit pointer within the bank.
+                Defaults to 3.
+
+        Returns:
+            bytes : The pointer.
+
+        """
+        if length not in (2, 3):
+            raise ValueError("length must be 2 or 3")
+        return (self.pc_to_lorom(pc_address) & ((1 << (length * 8)) - 1)).to_bytes(length, byteorder="little")
+
+    def _numpy_lorom_to_pc(self, lorom_addresses):
+        lorom_addresses = lorom_addresses.astype(numpy.int64, copy=False)
+        if len(lorom_addresses) == 0:
+            return lorom_addresses
+        if lorom_addresses.min() < 0 or lorom_addresses.max() > 0xffffff:
+            raise ValueError("LoROM value must be a positive number between 0x800000 and 0xffffff")
+        pc_starts = self._numpy_bank_pc_starts[lorom_addresses >> 16]
+        pc_addresses = pc_starts + (lorom_addresses & 0x7fff)
+        if pc_starts.min() < 0 or pc_addresses.max() >= self.rom_size:
+            raise ValueError("LoROM addresses must be inside the ROM!")
+        return pc_addresses
+
+    def _numpy_pc_to_lorom(self, pc_addresses):
+        pc_addresses = pc_addresses.astype(numpy.int64, copy=False)
+        if len(pc_addresses) == 0:
+            return pc_addresses
+        if pc_addresses.min() < 0 or pc_addresses.max() >= self.rom_size:
+            raise ValueError("PC addresses must be inside the ROM!")
+        return self._numpy_bank_lorom_starts[pc_addresses >> 15] | (pc_addresses & 0x7fff)
+
+
+@lru_cache(maxsize=None)
+def get_address_space(rom_size=MAX_LOROM_ROM_SIZE):
+    """Returns a TektonAddressSpace for a ROM size, creating it the first time that size is asked for. Later calls with
+    the same size return the same object, so its bank tables are only built once.
+
+    Args:
+        rom_size (int): Optional. Size of the ROM in bytes. Defaults to the largest LoROM ROM, 4 MB.
+
+    Returns:
+        TektonAddressSpace : The shared address space for rom_size.
+
+    """
+    return TektonAddressSpace(rom_size)
@@ -0,0 +1,175 @@
+"""Tekton Checksum
+
+This module implements the internal checksum stored in the cartridge header of a LoROM SNES ROM such as Super Metroid.
+
+The checksum is the sum of every byte in the ROM, modulo 0x10000, and is stored next to its complement (the checksum
+XOR 0xffff). While summing, the four bytes that hold the complement and checksum are counted as ff ff 00 00, which is
+what any valid complement and checksum pair adds up to, so the stored values never affect the sum. A ROM whose size is
+not a power of two is summed as if its last part were mirrored to fill the next power of two, as the SNES sees it: in
+Super Metroid's 3 MB ROM, every byte of the last 1 MB is counted twice.
+
+TektonChecksum keeps the sum of a ROM up to date from the old and new bytes of each write, so a build only reads the
+bytes it changes. calculate_checksum sums a whole ROM, using NumPy if it is installed.
+
+Classes:
+    TektonChecksum: Running checksum of a ROM, which is updated as bytes in the ROM are overwritten.
+
+Functions:
+    calculate_checksum: Returns the checksum of a whole ROM.
+    get_checksum_ranges: Returns the address ranges of a ROM and how many times each is counted in the checksum.
+    verify_checksum: Returns True if the checksum and complement stored in a ROM's header are correct.
+
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+CHECKSUM_COMPLEMENT_ADDRESS = 0x7fdc
+CHECKSUM_ADDRESS = 0x7fde
+CHECKSUM_FIELDS_END = 0x7fe0
+CHECKSUM_FIELDS_SUM = 0x1fe  # ff ff 00 00
+
+
+class TektonChecksum:
+    """Running checksum of a LoROM ROM.
+
+    The checksum is calculated once from the ROM's contents, and then kept up to date by calling update with the old and
+    new bytes of every write made to the ROM.
+
+    Attributes:
+        rom_size (int): Size of the ROM in bytes. Writes cannot change the size of the ROM.
+
+    """
+
+    def __init__(self, rom_contents):
+        """
+        Args:
+            rom_contents (bytes): Contents of the ROM. Any buffer, such as an mmap, can be used.
+
+        """
+        if len(rom_contents) < CHECKSUM_FIELDS_END:
+            raise ValueError("ROM is too small to contain a LoROM header.")
+        self.rom_size = len(rom_contents)
+        self._ranges = get_checksum_ranges(self.rom_size)
+        self._sum = _get_rom_sum(rom_contents, self._ranges)
+
+    @property
+    def checksum(self):
+        """int: The checksum of the ROM with every write so far."""
+        return self._sum & 0xffff
+
+    @property
+    def complement(self):
+        """int: The complement of the checksum."""
+        return self.checksum ^ 0xffff
+
+    @property
+    def header_bytes(self):
+        """bytes: The complement and checksum as they are stored in the ROM, starting at CHECKSUM_COMPLEMENT_ADDRESS."""
+        return self.complement.to_bytes(2, byteorder="little") + self.checksum.to_bytes(2, byteorder="little")
+
+    def update(self, address, old_data, new_data):
+        """Updates the checksum after bytes in the ROM have been overwritten.
+
+        Args:
+            address (int): PC address of the first byte written.
+            old_data (bytes): The bytes that were in the ROM before the write.
+            new_data (bytes): The bytes written. Must be the same length as old_data.
+
+        """
+        if len(old_data) != len(new_data):
+            raise ValueError("old_data and new_data must be the same length.")
+        end_address = address + len(new_data)
+        if address < 0 or end_address > self.rom_size:
+            raise ValueError("Write of {} bytes at {} is outside the ROM!".format(len(new_data), hex(address)))
+
+        old_view = memoryview(old_data)
+        new_view = memoryview(new_data)
+        for range_start, range_end, weight in self._ranges:
+            start = max(address, range_start) - address
+            end = min(end_address, range_end) - address
+            if start < end:
+                self._sum += weight * (_sum_bytes(new_view[start:end]) - _sum_bytes(old_view[start:end]))
+
+        # The checksum fields always count as ff ff 00 00, so take back any change to them
+        start = max(address, CHECKSUM_COMPLEMENT_ADDRESS) - address
+        end = min(end_address, CHECKSUM_FIELDS_END) - address
+        if start < end:
+            self._sum -= _sum_bytes(new_view[start:end]) - _sum_bytes(old_view[start:end])
+
+        self._sum &= 0xffff
+
+
+def calculate_checksum(rom_contents):
+    """Returns the checksum of a whole LoROM ROM.
+
+    Args:
+        rom_contents (bytes): Contents of the ROM. Any buffer, such as an mmap, can be used.
+
+    Returns:
+        int : The checksum, between 0 and 0xffff.
+
+    """
+    if len(rom_contents) < CHECKSUM_FIELDS_END:
+        raise ValueError("ROM is too small to contain a LoROM header.")
+    return _get_rom_sum(rom_contents, get_checksum_ranges(len(rom_contents))) & 0xffff
+
+
+def verify_checksum(rom_contents):
+    """Recalculates the checksum of a LoROM ROM and compares it with the checksum and complement stored in its header.
+
+    Args:
+        rom_contents (bytes): Contents of the ROM. Any buffer, such as an mmap, can be used.
+
+    Returns:
+        bool : True if both the stored checksum and the stored complement are correct, otherwise False.
+
+    """
+    checksum = calculate_checksum(rom_contents)
+    stored_bytes = bytes(rom_contents[CHECKSUM_COMPLEMENT_ADDRESS:CHECKSUM_FIELDS_END])
+    return stored_bytes == (checksum ^ 0xffff).to_bytes(2, byteorder="little") + checksum.to_bytes(2, byteorder="little")
+
+
+def get_checksum_ranges(rom_size):
+    """Splits a ROM into ranges of addresses which are counted the same number of times in the checksum.
+
+    The largest power of two that fits in the ROM is counted once. The rest of the ROM is mirrored to fill the same
+    amount of space again, which is done by splitting it the same way until every range is a power of two in length.
+
+    Args:
+        rom_size (int): Size of the ROM in bytes.
+
+    Returns:
+        list : (start address, end address, weight) tuples, in address order.
+
+    """
+    ranges = []
+    start_address = 0
+    length = rom_size
+    weight = 1
+    while length > 0:
+        power_of_two = 1 << (length.bit_length() - 1)
+        ranges.append((start_address, start_address + power_of_two, weight))
+        start_address += power_of_two
+        length -= power_of_two
+        if length > 0:
+            # The remainder is repeated until it fills power_of_two bytes
+            weight *= power_of_two // (1 << (length - 1).bit_length())
+    return ranges
+
+
+def _get_rom_sum(rom_contents, ranges):
+    rom_view = memoryview(rom_contents)
+    rom_sum = 0
+    for range_start, range_end, weight in ranges:
+        rom_sum += weight * _sum_bytes(rom_view[range_start:range_end])
+    rom_sum += CHECKSUM_FIELDS_SUM - _sum_bytes(rom_view[CHECKSUM_COMPLEMENT_ADDRESS:CHECKSUM_FIELDS_END])
+    return rom_sum
+
+
+def _sum_bytes(data):
+    if numpy is not None and len(data) > 0x1000:
+        return int(numpy.frombuffer(data, dtype=numpy.uint8).sum(dtype=numpy.uint64))
+    return sum(data)
@@ -19,6 +19,7 @@ Classes:
 
 """
 from enum import Enum
+from .tekton_system import TektonObservable
 
 
 class DoorBitFlag(Enum):
@@ -46,7 +47,7 @@ class DoorEjectDirection(Enum):
     UP = 0x07
 
 
-class TektonDoor:  # TODO: Probably make a superclass of Door and Launchpad
+class TektonDoor(TektonObservable):  # TODO: Probably make a superclass of Door and Launchpad
     """An object representing a single door in Super Metroid, with many modifiable attributes.
 
     Attributes:
@@ -64,6 +65,16 @@ class TektonDoor:  # TODO: Probably make a superclass of Door and Launchpad
         asm_pointer (int): PC address of special instructions to execute after Samus passes through this door.
 
     """
+    _observed_attributes = frozenset(["asm_pointer",
+                                      "bit_flag",
+                                      "data_address",
+                                      "distance_to_spawn",
+                                      "eject_direction",
+                                      "target_door_cap_col",
+                                      "target_door_cap_row",
+                                      "target_room_id",
+                                      "target_room_screen_h",
+                                      "target_room_screen_v"])
 
     def __init__(self):
         self.data_address = 0x00
@@ -165,7 +176,7 @@ class TektonDoor:  # TODO: Probably make a superclass of Door and Launchpad
         return door_string
 
 
-class TektonElevatorLaunchpad:
+class TektonElevatorLaunchpad(TektonObservable):
     """Implements a special kind of door which occupies a door slot, but serves as a platform where Samus can stand to
     activate an elevator. Has no configurable attributes.
 
@@ -174,6 +185,7 @@ class TektonElevatorLaunchpad:
         door_data (bytes): The meaning of the door data is not currently understood, so the bytes are copied exactly.
 
     """
+    _observed_attributes = frozenset(["data_address", "door_data"])
 
     def __init__(self):
         self.data_address = 0x00
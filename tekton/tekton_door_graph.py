@@ -0,0 +1,393 @@
+"""Tekton Door Graph
+
+This module implements a graph of the rooms in a TektonRoomDict, connected by their doors, for answering reachability and
+shortest path questions quickly.
+
+Rooms are numbered from 0 in header address order, and the doors leading out of each room are stored in compressed
+sparse row (CSR) arrays: the doors of node n are the edges from offsets[n] to offsets[n + 1]. Every door in a room has
+an edge, even if it leads to a room which is not in the graph (or is an elevator launchpad, which leads nowhere), so
+changing a door's target_room_id only changes one entry in the arrays instead of rebuilding them. Adding or removing
+rooms or doors, or changing a room's header, rebuilds the arrays the next time the graph is queried.
+
+Classes:
+    TektonDoorGraph: Graph of the rooms in a TektonRoomDict, with an edge for every door.
+
+"""
+
+import heapq
+from array import array
+from collections import deque
+
+
+class TektonDoorGraph:
+    """A graph of the rooms in a TektonRoomDict, with an edge from each room to the room each of its doors leads to.
+
+    The graph watches the TektonRoomDict, its rooms and their doors. Rooms that were added lazily are loaded when the
+    graph is built.
+
+    Attributes:
+        (none)
+
+    """
+
+    def __init__(self, room_dict, *, door_weight=None):
+        """
+        Args:
+            room_dict (TektonRoomDict): The rooms to build the graph from.
+            door_weight (callable): Optional. Function called with (room, door) that returns the cost of passing through
+                the door, for shortest_path and distances_from. Costs must not be negative. By default every door costs
+                1.
+
+        """
+        self._room_dict = room_dict
+        self._door_weight = door_weight
+        self._headers = []  # Node id -> header address
+        self._node_ids = {}  # Header address -> node id
+        self._offsets = array("l")  # Node id -> index of its first edge, with an extra entry for the end of the last node
+        self._targets = array("l")  # Edge -> node id of the target room, or -1 if it is not in the graph
+        self._weights = array("d")  # Edge -> cost of passing through the door
+        self._edge_sources = []  # Edge -> (room, door)
+        self._door_edges = {}  # id(door) -> edges for that door
+        self._watched_rooms = []
+        self._components = None  # Node id -> strongly connected component number, or None if it needs recalculating
+        self._stale = True
+
+        room_dict.add_observer(self._room_dict_changed)
+
+    @property
+    def node_count(self):
+        """int: The number of rooms in the graph."""
+        self._build()
+        return len(self._headers)
+
+    @property
+    def edge_count(self):
+        """int: The number of doors in the graph that lead to a room in the graph."""
+        self._build()
+        return sum(1 for target in self._targets if target >= 0)
+
+    def node_id(self, header):
+        """Returns the node id of a room.
+
+        Args:
+            header (int): Header address of the room.
+
+        Returns:
+            int : The room's node id, from 0 to node_count - 1.
+
+        """
+        self._build()
+        if header not in self._node_ids:
+            raise KeyError("There is no room with header {} in the graph!".format(hex(header)))
+        return self._node_ids[header]
+
+    def header(self, node_id):
+        """Returns the header address of the room with a node id.
+
+        Args:
+            node_id (int): Node id of the room.
+
+        Returns:
+            int : Header address of the room.
+
+        """
+        self._build()
+        return self._headers[node_id]
+
+    def neighbors(self, header):
+        """Returns the rooms that the doors of a room lead to.
+
+        Args:
+            header (int): Header address of the room.
+
+        Returns:
+            list : Header addresses of the rooms, in door order, without duplicates.
+
+        """
+        node = self.node_id(header)
+        neighbor_headers = []
+        for edge in range(self._offsets[node], self._offsets[node + 1]):
+            target = self._targets[edge]
+            if target >= 0 and self._headers[target] not in neighbor_headers:
+                neighbor_headers.append(self._headers[target])
+        return neighbor_headers
+
+    def reachable_from(self, header):
+        """Returns every room that can be reached from a room by going through doors, including the room itself.
+
+        Args:
+            header (int): Header address of the starting room.
+
+        Returns:
+            list : Header addresses of the reachable rooms, sorted.
+
+        """
+        visited = self._visit(self.node_id(header))
+        return [self._headers[node] for node in range(len(self._headers)) if visited[node]]
+
+    def unreachable_from(self, header):
+        """Returns every room that cannot be reached from a room by going through doors.
+
+        Args:
+            header (int): Header address of the starting room.
+
+        Returns:
+            list : Header addresses of the unreachable rooms, sorted.
+
+        """
+        visited = self._visit(self.node_id(header))
+        return [self._headers[node] for node in range(len(self._headers)) if not visited[node]]
+
+    def distances_from(self, header):
+        """Returns the cost of the cheapest route from a room to every room reachable from it.
+
+        Args:
+            header (int): Header address of the starting room.
+
+        Returns:
+            dict : Cost of reaching each reachable room, keyed by header address. The starting room costs 0.
+
+        """
+        distances, previous_nodes = self._find_shortest_paths(self.node_id(header))
+        return {self._headers[node]: distance for node, distance in distances.items()}
+
+    def shortest_path(self, start_header, end_header):
+        """Returns the cheapest route from one room to another. Without a door_weight function, this is the route
+        through the fewest doors.
+
+        Args:
+            start_header (int): Header address of the starting room.
+            end_header (int): Header address of the room to reach.
+
+        Returns:
+            list : Header addresses of every room on the route, from start_header to end_header, or None if there is no
+                route.
+
+        """
+        start_node = self.node_id(start_header)
+        end_node = self.node_id(end_header)
+        distances, previous_nodes = self._find_shortest_paths(start_node, end_node)
+        if end_node not in distances:
+            return None
+        path = [end_node]
+        while path[-1] != start_node:
+            path.append(previous_nodes[path[-1]])
+        return [self._headers[node] for node in reversed(path)]
+
+    def strongly_connected_components(self):
+        """Splits the rooms into groups where every room can be reached from every other room in the same group.
+
+        Returns:
+            list : Lists of header addresses, one for each group. Each list is sorted, and the lists are sorted by their
+                first header address.
+
+        """
+        components = {}
+        for node, component in enumerate(self._get_components()):
+            components.setdefault(component, []).append(self._headers[node])
+        return sorted(components.values())
+
+    def same_component(self, first_header, second_header):
+        """Returns True if each of two rooms can be reached from the other.
+
+        Args:
+            first_header (int): Header address of one room.
+            second_header (int): Header address of the other room.
+
+        Returns:
+            bool : True if the rooms are in the same strongly connected component, otherwise False.
+
+        """
+        components = self._get_components()
+        return components[self.node_id(first_header)] == components[self.node_id(second_header)]
+
+    def detach(self):
+        """Stops watching the TektonRoomDict and its rooms and doors. The graph can no longer be queried afterwards."""
+        self._unwatch()
+        self._room_dict.remove_observer(self._room_dict_changed)
+        self._room_dict = None
+
+    def _build(self):
+        if self._room_dict is None:
+            raise ValueError("This graph has been detached from its rooms.")
+        # Rooms added lazily don't notify observers, so also check that no rooms have been added since the last build
+        if not self._stale and len(self._room_dict) == len(self._headers):
+            return
+        self._unwatch()
+
+        rooms = [room for header, room in self._room_dict.items()]
+        self._headers = [room.header for room in rooms]
+        self._node_ids = {header: node for node, header in enumerate(self._headers)}
+        self._offsets = array("l", [0])
+        self._targets = array("l")
+        self._weights = array("d")
+        self._edge_sources = []
+        self._door_edges = {}
+
+        for room in rooms:
+            for door in room.doors:
+                edge = len(self._targets)
+                self._targets.append(-1)
+                self._weights.append(0.0)
+                self._edge_sources.append((room, door))
+                self._door_edges.setdefault(id(door), []).append(edge)
+                self._set_edge_target(edge)
+            self._offsets.append(len(self._targets))
+
+        for room in rooms:
+            room.add_observer(self._room_changed)
+        for door_edges in self._door_edges.values():
+            room, door = self._edge_sources[door_edges[0]]
+            door.add_observer(self._door_changed)
+        self._watched_rooms = rooms
+        self._components = None
+        self._stale = False
+
+    def _unwatch(self):
+        for room in self._watched_rooms:
+            room.remove_observer(self._room_changed)
+        for door_edges in self._door_edges.values():
+            room, door = self._edge_sources[door_edges[0]]
+            door.remove_observer(self._door_changed)
+        self._watched_rooms = []
+        self._door_edges = {}
+
+    def _set_edge_target(self, edge):
+        room, door = self._edge_sources[edge]
+        self._targets[edge] = self._node_ids.get(getattr(door, "target_room_id", None), -1)
+        if self._door_weight is not None:
+            self._weights[edge] = self._door_weight(room, door)
+
+    def _visit(self, start_node):
+        visited = bytearray(len(self._headers))
+        visited[start_node] = 1
+        queue = deque([start_node])
+        offsets = self._offsets
+        targets = self._targets
+        while queue:
+            node = queue.popleft()
+            for edge in range(offsets[node], offsets[node + 1]):
+                target = targets[edge]
+                if target >= 0 and not visited[target]:
+                    visited[target] = 1
+                    queue.append(target)
+        return visited
+
+    def _find_shortest_paths(self, start_node, end_node=None):
+        # Breadth-first search if every door costs the same, otherwise Dijkstra's algorithm. Stops early once end_node
+        # has been reached, if given.
+        if self._door_weight is None:
+            return self._find_fewest_door_paths(start_node, end_node)
+        distances = {start_node: 0}
+        previous_nodes = {}
+        finished = bytearray(len(self._headers))
+        heap = [(0, start_node)]
+        offsets = self._offsets
+        targets = self._targets
+        weights = self._weights
+        while heap:
+            distance, node = heapq.heappop(heap)
+            if finished[node]:
+                continue
+            finished[node] = 1
+            if node == end_node:
+                break
+            for edge in range(offsets[node], offsets[node + 1]):
+                target = targets[edge]
+                if target < 0:
+                    continue
+                target_distance = distance + weights[edge]
+                if target not in distances or target_distance < distances[target]:
+                    distances[target] = target_distance
+                    previous_nodes[target] = node
+                    heapq.heappush(heap, (target_distance, target))
+        return distances, previous_nodes
+
+    def _find_fewest_door_paths(self, start_node, end_node):
+        distances = {start_node: 0}
+        previous_nodes = {}
+        queue = deque([start_node])
+        offsets = self._offsets
+        targets = self._targets
+        while queue and end_node not in distances:
+            node = queue.popleft()
+            for edge in range(offsets[node], offsets[node + 1]):
+                target = targets[edge]
+                if target >= 0 and target not in distances:
+                    distances[target] = distances[node] + 1
+                    previous_nodes[target] = node
+                    queue.append(target)
+        return distances, previous_nodes
+
+    def _get_components(self):
+        self._build()
+        if self._components is not None:
+            return self._components
+
+        # Tarjan's algorithm, with an explicit stack so large graphs don't hit the recursion limit
+        node_count = len(self._headers)
+        offsets = self._offsets
+        targets = self._targets
+        indexes = [-1] * node_count
+        low_links = [0] * node_count
+        on_stack = bytearray(node_count)
+        components = [-1] * node_count
+        component_stack = []
+        next_index = 0
+        component_count = 0
+
+        for root in range(node_count):
+            if indexes[root] >= 0:
+                continue
+            call_stack = [(root, offsets[root])]
+            indexes[root] = low_links[root] = next_index
+            next_index += 1
+            component_stack.append(root)
+            on_stack[root] = 1
+            while call_stack:
+                node, edge = call_stack[-1]
+                if edge < offsets[node + 1]:
+                    call_stack[-1] = (node, edge + 1)
+                    target = targets[edge]
+                    if target < 0:
+                        continue
+                    if indexes[target] < 0:
+                        indexes[target] = low_links[target] = next_index
+                        next_index += 1
+                        component_stack.append(target)
+                        on_stack[target] = 1
+                        call_stack.append((target, offsets[target]))
+                    elif on_stack[target]:
+                        low_links[node] = min(low_links[node], indexes[target])
+                    continue
+
+                call_stack.pop()
+                if call_stack:
+                    parent = call_stack[-1][0]
+                    low_links[parent] = min(low_links[parent], low_links[node])
+                if low_links[node] == indexes[node]:
+                    while True:
+                        member = component_stack.pop()
+                        on_stack[member] = 0
+                        components[member] = component_count
+                        if member == node:
+                            break
+                    component_count += 1
+
+        self._components = components
+        return components
+
+    def _room_dict_changed(self, room_dict, attribute_name, old_value, new_value):
+        if attribute_name in ("rooms", "loaded_rooms"):
+            self._stale = True
+
+    def _room_changed(self, room, attribute_name, old_value, new_value):
+        if attribute_name in ("doors", "header"):
+            self._stale = True
+
+    def _door_changed(self, door, attribute_name, old_value, new_value):
+        if attribute_name != "target_room_id" or self._stale:
+            return
+        for edge in self._door_edges.get(id(door), []):
+            self._set_edge_target(edge)
+        self._components = None
@@ -0,0 +1,180 @@
+"""Tekton Free Space
+
+This module implements a map of the unused space in a ROM that a TektonProject is allowed to put data into, such as the
+FF-filled padding at the end of a bank or the old location of level data that has been moved somewhere else.
+
+Super Metroid reads level data through a 24-bit LoROM pointer, and a LoROM bank only covers 0x8000 bytes of the ROM, so
+a block of data must not cross from one bank into the next. Free blocks are split at bank boundaries when they are
+added, and are never merged across them.
+
+Classes:
+    TektonFreeSpace: Map of the free blocks in a ROM, which allocates space using a best-fit search.
+    OutOfFreeSpaceError: Exception raised when there is no free block large enough for an allocation.
+
+"""
+
+from bisect import bisect_left, insort
+
+LOROM_BANK_SIZE = 0x8000
+
+
+class TektonFreeSpace:
+    """Map of the free blocks in a ROM.
+
+    Free blocks are kept in two sorted lists: one ordered by address, used to merge neighboring blocks when space is
+    released, and one ordered by size, used to find the smallest block that fits an allocation. Both searches are binary
+    searches. Adding or removing a block shifts the lists, which is O(n) in the number of free blocks rather than the
+    O(log n) of an interval tree, but a ROM has at most a few hundred free blocks, where shifting a list is faster than
+    rebalancing a tree.
+
+    Attributes:
+        (none)
+
+    """
+
+    def __init__(self):
+        self._block_lengths = {}  # Start address -> length of every free block
+        self._block_starts = []  # Start addresses of free blocks, sorted
+        self._blocks_by_length = []  # (length, start address) of free blocks, sorted
+
+    def __len__(self):
+        """Returns the number of free blocks."""
+        return len(self._block_starts)
+
+    @property
+    def blocks(self):
+        """list: (PC address, length) tuples for every free block, ordered by address."""
+        return [(block_start, self._block_lengths[block_start]) for block_start in self._block_starts]
+
+    @property
+    def free_bytes(self):
+        """int: Total number of free bytes in every block."""
+        return sum(self._block_lengths.values())
+
+    def add_free_block(self, address, length):
+        """Marks a range of the ROM as free. The range may overlap blocks that are already free.
+
+        Args:
+            address (int): PC address of the first free byte.
+            length (int): Number of free bytes.
+
+        """
+        if not isinstance(address, int):
+            raise TypeError("address must be of type int!")
+        if not isinstance(length, int):
+            raise TypeError("length must be of type int!")
+        if address < 0:
+            raise ValueError("address must be 0 or greater.")
+        if length < 0:
+            raise ValueError("length must be 0 or greater.")
+
+        end_address = address + length
+        while address < end_address:
+            bank_end = (address // LOROM_BANK_SIZE + 1) * LOROM_BANK_SIZE
+            self._add_bank_block(address, min(end_address, bank_end))
+            address = bank_end
+
+    def add_padding(self, rom_contents, start_address, end_address, *, min_length=16, pad_byte=0xff):
+        """Marks runs of padding bytes in part of a ROM as free.
+
+        Compressed level data ends with an 0xff byte, so the first byte of a run of 0xff bytes is assumed to belong to
+        whatever comes before it and is left out of the free block. Only scan ranges of the ROM known to hold level data
+        or padding, since other kinds of data can contain long runs of 0xff as well.
+
+        Args:
+            rom_contents (bytes): Contents of the ROM.
+            start_address (int): PC address to start scanning at.
+            end_address (int): PC address to stop scanning at.
+            min_length (int): Optional. Shorter runs of padding are ignored. Defaults to 16.
+            pad_byte (int): Optional. Value of the padding bytes. Defaults to 0xff.
+
+        """
+        if not isinstance(min_length, int):
+            raise TypeError("min_length must be of type int!")
+        if min_length < 1:
+            raise ValueError("min_length must be 1 or greater.")
+
+        pad_run = bytes([pad_byte]) * min_length
+        search_start = start_address
+        while True:
+            run_start = rom_contents.find(pad_run, search_start, end_address)
+            if run_start < 0:
+                return
+            run_end = run_start + min_length
+            while run_end < end_address and rom_contents[run_end] == pad_byte:
+                run_end += 1
+            if run_start > 0 and rom_contents[run_start - 1] != pad_byte:
+                run_start += 1  # Keep the terminating byte of the data before the padding
+            if run_end - run_start >= min_length:
+                self.add_free_block(run_start, run_end - run_start)
+            search_start = run_end
+
+    def allocate(self, length):
+        """Takes space for length bytes out of the smallest free block that can hold them.
+
+        Args:
+            length (int): Number of bytes needed.
+
+        Returns:
+            int : PC address of the allocated space.
+
+        """
+        if not isinstance(length, int):
+            raise TypeError("length must be of type int!")
+        if length < 1:
+            raise ValueError("length must be 1 or greater.")
+
+        index = bisect_left(self._blocks_by_length, (length, -1))
+        if index == len(self._blocks_by_length):
+            raise OutOfFreeSpaceError("No free block can hold {} bytes!".format(length))
+
+        block_length, block_start = self._blocks_by_length[index]
+        self._remove_block(block_start)
+        if block_length > length:
+            self._insert_block(block_start + length, block_length - length)
+        return block_start
+
+    def release(self, address, length):
+        """Returns a block of space to the map, e.g. after the data in it has been moved. Same as add_free_block.
+
+        Args:
+            address (int): PC address of the first byte of the block.
+            length (int): Number of bytes in the block.
+
+        """
+        self.add_free_block(address, length)
+
+    def _add_bank_block(self, start, end):
+        bank_start = start - start % LOROM_BANK_SIZE
+        bank_end = bank_start + LOROM_BANK_SIZE
+
+        # Absorb every free block in the same bank that overlaps or touches the new block
+        index = bisect_left(self._block_starts, start)
+        if index > 0:
+            previous_start = self._block_starts[index - 1]
+            if previous_start >= bank_start and previous_start + self._block_lengths[previous_start] >= start:
+                index -= 1
+        while index < len(self._block_starts) and self._block_starts[index] <= end and \
+                self._block_starts[index] < bank_end:
+            block_start = self._block_starts[index]
+            start = min(start, block_start)
+            end = max(end, block_start + self._block_lengths[block_start])
+            self._remove_block(block_start)
+
+        if end > start:
+            self._insert_block(start, end - start)
+
+    def _insert_block(self, start, length):
+        self._block_lengths[start] = length
+        insort(self._block_starts, start)
+        insort(self._blocks_by_length, (length, start))
+
+    def _remove_block(self, start):
+        length = self._block_lengths.pop(start)
+        del self._block_starts[bisect_left(self._block_starts, start)]
+        del self._blocks_by_length[bisect_left(self._blocks_by_length, (length, start))]
+
+
+class OutOfFreeSpaceError(Exception):
+    """Exception raised when there is no free block large enough to hold a piece of data."""
+    pass
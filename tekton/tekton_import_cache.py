@@ -0,0 +1,108 @@
+"""Tekton Import Cache
+
+This module implements an on-disk cache of imported rooms, so processes that import rooms from the same ROM do not each
+repeat the same parsing work.
+
+Cache entries are snapshot files (see tekton_snapshot) named after a SHA-1 key. The key covers the contents of the
+source ROM, the list of room headers and names being imported, and the version of tekton doing the importing, so an
+entry is never used for a different ROM, a different header list, or by a version of tekton that would import the rooms
+differently. The key is also saved inside each entry and checked when it is loaded.
+
+Entries are written atomically, so any number of processes can share a cache directory. If two processes miss the same
+entry at once, both import the rooms and the last one to finish replaces the other's entry with an identical one.
+
+Functions:
+    get_import_cache_key: Returns the cache key for importing a list of rooms from a ROM.
+    get_tekton_version: Returns a string that identifies the tekton code currently running.
+    load_cached_rooms: Loads rooms from a cache entry, if there is a valid one.
+    save_cached_rooms: Saves imported rooms to a cache entry.
+
+"""
+
+import hashlib
+import os
+
+from .tekton_snapshot import write_snapshot, read_snapshot, read_snapshot_metadata, SnapshotFormatError
+
+IMPORT_CACHE_SUFFIX = ".tss"
+
+_tekton_version = None
+
+
+def get_tekton_version():
+    """Returns a string that identifies the tekton code currently running.
+
+    Tekton does not have release numbers, so the version is a SHA-1 digest of the source of every module in the
+    package. Any change to the code that imports rooms gives a different version.
+
+    Returns:
+        str : Hex digest identifying this version of tekton.
+
+    """
+    global _tekton_version
+    if _tekton_version is None:
+        package_dir = os.path.dirname(os.path.abspath(__file__))
+        version_hash = hashlib.sha1()
+        for filename in sorted(os.listdir(package_dir)):
+            if filename.endswith(".py"):
+                version_hash.update(filename.encode("utf-8"))
+                with open(os.path.join(package_dir, filename), "rb") as f:
+                    version_hash.update(f.read())
+        _tekton_version = version_hash.hexdigest()
+    return _tekton_version
+
+
+def get_import_cache_key(rom_contents, room_headers):
+    """Returns the cache key for importing a list of rooms from a ROM.
+
+    Args:
+        rom_contents (bytes): Contents of the source ROM.
+        room_headers (list): Dictionaries with a "header" element and optionally a "name" element, as loaded from a
+            header address file.
+
+    Returns:
+        str : Hex SHA-1 digest of the ROM's SHA-1 digest, the header list and the tekton version.
+
+    """
+    key_hash = hashlib.sha1()
+    key_hash.update(hashlib.sha1(rom_contents).digest())
+    for room_data in room_headers:
+        key_hash.update("{:x}:{!r};".format(room_data["header"], room_data.get("name")).encode("utf-8"))
+    key_hash.update(get_tekton_version().encode("utf-8"))
+    return key_hash.hexdigest()
+
+
+def load_cached_rooms(cache_dir, cache_key):
+    """Loads the rooms saved under a cache key.
+
+    An entry that is missing, unreadable, or saved under a different key than its file name says is treated as a miss.
+
+    Args:
+        cache_dir (str): Directory holding the cache entries.
+        cache_key (str): Key returned by get_import_cache_key.
+
+    Returns:
+        list : The cached TektonRooms, or None if there is no valid entry for cache_key.
+
+    """
+    cache_path = os.path.join(cache_dir, cache_key + IMPORT_CACHE_SUFFIX)
+    try:
+        if read_snapshot_metadata(cache_path) != cache_key:
+            return None
+        source_rom_path, rooms = read_snapshot(cache_path)
+    except (OSError, SnapshotFormatError):
+        return None
+    return rooms
+
+
+def save_cached_rooms(cache_dir, cache_key, rooms):
+    """Saves imported rooms under a cache key. The cache directory is created if it does not exist.
+
+    Args:
+        cache_dir (str): Directory holding the cache entries.
+        cache_key (str): Key returned by get_import_cache_key.
+        rooms (list): TektonRooms to save.
+
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    write_snapshot(os.path.join(cache_dir, cache_key + IMPORT_CACHE_SUFFIX), None, rooms, metadata=cache_key)
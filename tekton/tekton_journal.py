@@ -0,0 +1,412 @@
+"""Tekton Journal
+
+This module implements an edit journal for a TektonProject. The journal watches the project's rooms and records every
+change to them as a small delta: the before and after values of a single attribute of a room, room state, state pointer
+or door, the before and after values of the tile cells that changed in a tile grid, or a room being added to or removed
+from the project's TektonRoomDict. The memory a journal uses depends on the edits made, not on the size of the rooms.
+
+Recorded edits can be undone and redone, and saved to a JSON file which replay_journal can apply to a fresh import of
+the same ROM.
+
+Each delta locates the object that changed by the header address of a room that contains it, and its position in that
+room, e.g. ("door", 0x795d4, 1) for the second door of the room whose header is at 0x795d4. Values are saved as plain
+JSON data. Objects such as doors or room states that are assigned as a whole are saved with all of their attributes.
+
+Classes:
+    TektonEditJournal: Records the edits made to a project, and can undo, redo and save them.
+    TektonJournalEntry: Named tuple describing a single recorded edit.
+    JournalReplayError: Exception raised when a saved edit cannot be applied to a project.
+
+Functions:
+    replay_journal: Applies the edits saved in a journal file to a project.
+
+"""
+
+import json
+from collections import namedtuple
+from contextlib import contextmanager
+from enum import Enum
+
+from .tekton_door import TektonDoor, TektonElevatorLaunchpad, DoorBitFlag, DoorEjectDirection
+from .tekton_room import TektonRoom, MapArea
+from .tekton_room_state import TektonRoomState, TektonRoomEventStatePointer, TektonRoomLandingStatePointer, \
+    TektonRoomFlywayStatePointer, TileSet, SongSet, SongPlayIndex
+from .tekton_tile import TektonTile
+from .tekton_tile_grid import TektonTileGrid
+
+JOURNAL_VERSION = 1
+
+TektonJournalEntry = namedtuple("TektonJournalEntry", ["path", "attribute", "old_value", "new_value"])
+TektonJournalEntry.__doc__ = """A single edit recorded by a TektonEditJournal.
+
+Attributes:
+    path (tuple): (kind, room header address, index) locating the object that changed. kind is one of "room", "state",
+        "state_pointer", "door" or "tiles" (the tile grid of a state). index is the position of the object in the room:
+        0 for the standard state and 1 onwards for extra states, or the position in the room's extra_states or doors.
+        For rooms added to or removed from the project, the path is ("rooms", None, None).
+    attribute (str): Name of the attribute that changed.
+    old_value: The value before the edit, as plain data. For tile grids, a list of [x, y, tile] cells.
+    new_value: The value after the edit, as plain data.
+"""
+
+_enum_classes = {enum_class.__name__: enum_class for enum_class in [MapArea, TileSet, SongSet, SongPlayIndex,
+                                                                     DoorBitFlag, DoorEjectDirection]}
+_object_classes = {object_class.__name__: object_class for object_class in [TektonRoom,
+                                                                           TektonRoomState,
+                                                                           TektonRoomEventStatePointer,
+                                                                           TektonRoomLandingStatePointer,
+                                                                           TektonRoomFlywayStatePointer,
+                                                                           TektonDoor,
+                                                                           TektonElevatorLaunchpad]}
+
+# Attributes which change which objects a room contains, so the journal must find them again
+_structural_attributes = frozenset(["doors", "extra_states", "standard_state", "room_state", "tiles"])
+
+
+class TektonEditJournal:
+    """Records the edits made to the rooms of a TektonProject, and can undo and redo them.
+
+    Each edit is one undo step, unless it is made inside a group() block, which makes all of the edits inside it a
+    single step. Making a new edit after undoing clears the steps that could have been redone.
+
+    Rooms that were added lazily are watched once they are loaded. Loading a room is not an edit.
+
+    Attributes:
+        (none)
+
+    """
+
+    def __init__(self, project):
+        """
+        Args:
+            project (TektonProject): The project whose edits should be recorded, starting now.
+
+        """
+        self._project = project
+        self._undo_steps = []  # Each step is a list of (target object, TektonJournalEntry, old value, new value)
+        self._redo_steps = []
+        self._group_step = None
+        self._replaying = False
+        self._locations = {}  # id(object) -> (object, {id(room): (room, kind, index)}) for every watched object
+        self._room_objects = {}  # id(room) -> objects watched for that room
+
+        project.rooms.add_observer(self._room_dict_changed)
+        for header_address, room in project.rooms.loaded_items():
+            self._watch_room(room)
+
+    @property
+    def can_undo(self):
+        """bool: True if there is a recorded step that can be undone."""
+        return len(self._undo_steps) > 0
+
+    @property
+    def can_redo(self):
+        """bool: True if there is an undone step that can be redone."""
+        return len(self._redo_steps) > 0
+
+    @property
+    def steps(self):
+        """list: Each step that can currently be undone, oldest first, as a list of TektonJournalEntries."""
+        return [[live_entry[1] for live_entry in step] for step in self._undo_steps]
+
+    @contextmanager
+    def group(self):
+        """Context manager which records every edit made inside it as a single undo step. Groups can be nested, in which
+        case the outermost group makes the step."""
+        if self._group_step is not None:
+            yield
+            return
+        self._group_step = []
+        try:
+            yield
+        finally:
+            group_step = self._group_step
+            self._group_step = None
+            if group_step:
+                self._undo_steps.append(group_step)
+
+    def undo(self):
+        """Undoes the most recent step."""
+        if not self._undo_steps:
+            raise ValueError("There are no edits to undo!")
+        step = self._undo_steps.pop()
+        with self._replay():
+            for live_entry in reversed(step):
+                self._apply_live_entry(live_entry, undo=True)
+        self._redo_steps.append(step)
+
+    def redo(self):
+        """Redoes the most recently undone step."""
+        if not self._redo_steps:
+            raise ValueError("There are no edits to redo!")
+        step = self._redo_steps.pop()
+        with self._replay():
+            for live_entry in step:
+                self._apply_live_entry(live_entry, undo=False)
+        self._undo_steps.append(step)
+
+    def save(self, journal_path):
+        """Saves every step that can currently be undone to a JSON file, which replay_journal can apply to a project.
+
+        Args:
+            journal_path (str): Path of the file to write.
+
+        """
+        journal_data = {"version": JOURNAL_VERSION,
+                        "steps": [[{"path": list(entry.path),
+                                    "attribute": entry.attribute,
+                                    "old_value": entry.old_value,
+                                    "new_value": entry.new_value} for entry in step] for step in self.steps]}
+        with open(journal_path, "w") as f:
+            json.dump(journal_data, f)
+
+    def detach(self):
+        """Stops recording edits, and removes every observer the journal added to the project."""
+        self._project.rooms.remove_observer(self._room_dict_changed)
+        for watched_object, object_rooms in list(self._locations.values()):
+            watched_object.remove_observer(self._object_changed)
+        self._locations = {}
+        self._room_objects = {}
+
+    @contextmanager
+    def _replay(self):
+        self._replaying = True
+        try:
+            yield
+        finally:
+            self._replaying = False
+
+    def _record(self, target, entry, old_value, new_value):
+        if self._replaying:
+            return
+        self._redo_steps = []
+        live_entry = (target, entry, old_value, new_value)
+        if self._group_step is not None:
+            self._group_step.append(live_entry)
+        else:
+            self._undo_steps.append([live_entry])
+
+    def _apply_live_entry(self, live_entry, *, undo):
+        target, entry, old_value, new_value = live_entry
+        value = old_value if undo else new_value
+        if entry.path[0] == "rooms":
+            if value is None:
+                removed_room = new_value if undo else old_value
+                self._project.rooms.remove_room(removed_room.header)
+            else:
+                self._project.rooms.add_room(value)
+        elif entry.path[0] == "tiles":
+            _apply_tile_cells(target, entry.old_value if undo else entry.new_value)
+        else:
+            setattr(target, entry.attribute, value)
+
+    def _watch_room(self, room):
+        room_objects = [(room, "room", None)]
+        for i, room_state_pointer in enumerate(room.extra_states):
+            room_objects.append((room_state_pointer, "state_pointer", i))
+        room_states = [room.standard_state] + [room_state_pointer.room_state for room_state_pointer in room.extra_states]
+        for i, room_state in enumerate(room_states):
+            if room_state is None:
+                continue
+            room_objects.append((room_state, "state", i))
+            if room_state.tiles is not None:
+                room_objects.append((room_state.tiles, "tiles", i))
+        for i, door in enumerate(room.doors):
+            room_objects.append((door, "door", i))
+
+        for watched_object, kind, index in room_objects:
+            if id(watched_object) not in self._locations:
+                watched_object.add_observer(self._object_changed)
+                self._locations[id(watched_object)] = (watched_object, {})
+            self._locations[id(watched_object)][1].setdefault(id(room), (room, kind, index))
+        self._room_objects[id(room)] = [watched_object for watched_object, kind, index in room_objects]
+
+    def _unwatch_room(self, room):
+        for watched_object in self._room_objects.pop(id(room), []):
+            location = self._locations.get(id(watched_object))
+            if location is None:
+                continue
+            location[1].pop(id(room), None)
+            if not location[1]:
+                del self._locations[id(watched_object)]
+                watched_object.remove_observer(self._object_changed)
+
+    def _object_changed(self, changed_object, attribute_name, old_value, new_value):
+        location = self._locations.get(id(changed_object))
+        if location is None:
+            return
+        room, kind, index = next(iter(location[1].values()))
+        header = old_value if kind == "room" and attribute_name == "header" else room.header
+        if kind == "tiles":
+            entry = TektonJournalEntry((kind, header, index),
+                                       attribute_name,
+                                       _encode_tile_cells(old_value),
+                                       _encode_tile_cells(new_value))
+        else:
+            entry = TektonJournalEntry((kind, header, index),
+                                       attribute_name,
+                                       _encode_value(old_value, {}),
+                                       _encode_value(new_value, {}))
+        self._record(changed_object, entry, old_value, new_value)
+
+        if attribute_name in _structural_attributes and kind != "tiles":
+            for room_id, (changed_room, changed_kind, changed_index) in list(location[1].items()):
+                self._unwatch_room(changed_room)
+                self._watch_room(changed_room)
+
+    def _room_dict_changed(self, room_dict, attribute_name, old_value, new_value):
+        if old_value is not None:
+            self._unwatch_room(old_value)
+        if new_value is not None:
+            self._watch_room(new_value)
+        if attribute_name == "rooms":
+            self._record(room_dict,
+                         TektonJournalEntry(("rooms", None, None),
+                                            attribute_name,
+                                            _encode_value(old_value, {}),
+                                            _encode_value(new_value, {})),
+                         old_value,
+                         new_value)
+
+
+def replay_journal(project, journal_path):
+    """Applies the edits saved by TektonEditJournal.save to a project, e.g. one freshly imported from the same ROM.
+
+    Doors assigned by an edit reuse a door already in the project if it has the same data address and the same data,
+    so doors shared between rooms stay shared.
+
+    Args:
+        project (TektonProject): The project to apply the edits to.
+        journal_path (str): Path of the journal file.
+
+    """
+    with open(journal_path) as f:
+        journal_data = json.load(f)
+    if journal_data.get("version") != JOURNAL_VERSION:
+        raise JournalReplayError("Unsupported journal version {}!".format(journal_data.get("version")))
+
+    for step in journal_data["steps"]:
+        for entry_data in step:
+            entry = TektonJournalEntry(tuple(entry_data["path"]),
+                                       entry_data["attribute"],
+                                       entry_data["old_value"],
+                                       entry_data["new_value"])
+            _replay_entry(project, entry)
+
+
+def _replay_entry(project, entry):
+    kind, header, index = entry.path
+    if kind == "rooms":
+        if entry.new_value is None:
+            project.rooms.remove_room(entry.old_value["attributes"]["header"])
+        else:
+            project.rooms.add_room(_decode_value(entry.new_value, [], project))
+        return
+
+    room = project.rooms[header]
+    if room is None:
+        raise JournalReplayError("The project has no room with header {}!".format(hex(header)))
+    try:
+        if kind == "room":
+            target = room
+        elif kind == "state_pointer":
+            target = room.extra_states[index]
+        elif kind == "door":
+            target = room.doors[index]
+        elif kind in ("state", "tiles"):
+            target = room.standard_state if index == 0 else room.extra_states[index - 1].room_state
+            if kind == "tiles":
+                target = target.tiles
+        else:
+            raise JournalReplayError("Unknown journal path kind {}!".format(kind))
+    except IndexError:
+        raise JournalReplayError("Room {} has no {} {}!".format(hex(header), kind, index))
+
+    if kind == "tiles":
+        _apply_tile_cells(target, entry.new_value)
+    else:
+        setattr(target, entry.attribute, _decode_value(entry.new_value, [], project))
+
+
+def _encode_value(value, tile_grid_ids):
+    """Converts an attribute value into plain data which can be saved as JSON. tile_grid_ids maps the id of each tile
+    grid already encoded in this value to its position, so grids shared between states are only saved once."""
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    if isinstance(value, Enum):
+        return {"enum": type(value).__name__, "value": value.value}
+    if isinstance(value, (bytes, bytearray)):
+        return {"bytes": bytes(value).hex()}
+    if isinstance(value, list):
+        return {"list": [_encode_value(list_value, tile_grid_ids) for list_value in value]}
+    if isinstance(value, TektonTileGrid):
+        if id(value) in tile_grid_ids:
+            return {"tile_grid_ref": tile_grid_ids[id(value)]}
+        tile_grid_ids[id(value)] = len(tile_grid_ids)
+        return {"tile_grid": [value.width,
+                              value.height,
+                              [_encode_tile(value[x][y]) for y in range(value.height) for x in range(value.width)]]}
+    if type(value).__name__ in _object_classes:
+        return {"object": type(value).__name__,
+                "attributes": {attribute_name: _encode_value(getattr(value, attribute_name), tile_grid_ids)
+                               for attribute_name in sorted(type(value)._observed_attributes)
+                               if hasattr(value, attribute_name)}}
+    raise TypeError("Cannot record a value of type {}!".format(type(value).__name__))
+
+
+def _decode_value(value, tile_grids, project):
+    if not isinstance(value, dict):
+        return value
+    if "enum" in value:
+        return _enum_classes[value["enum"]](value["value"])
+    if "bytes" in value:
+        return bytes.fromhex(value["bytes"])
+    if "list" in value:
+        return [_decode_value(list_value, tile_grids, project) for list_value in value["list"]]
+    if "tile_grid_ref" in value:
+        return tile_grids[value["tile_grid_ref"]]
+    if "tile_grid" in value:
+        width, height, tiles = value["tile_grid"]
+        new_grid = TektonTileGrid(width, height)
+        for i, tile in enumerate(tiles):
+            if tile is not None:
+                new_grid[i % width][i // width] = _decode_tile(tile)
+        tile_grids.append(new_grid)
+        return new_grid
+
+    new_object = _object_classes[value["object"]]()
+    for attribute_name, attribute_value in value["attributes"].items():
+        setattr(new_object, attribute_name, _decode_value(attribute_value, tile_grids, project))
+    if isinstance(new_object, (TektonDoor, TektonElevatorLaunchpad)):
+        for reference in project.references.door_data_references(new_object.data_address):
+            if type(reference.source) is type(new_object) and reference.source.door_data == new_object.door_data:
+                return reference.source
+    return new_object
+
+
+def _encode_tile(tile):
+    if tile is None:
+        return None
+    return [tile.tileno, tile.bts_type, tile.bts_num, tile.h_mirror, tile.v_mirror]
+
+
+def _decode_tile(tile_value):
+    if tile_value is None:
+        return None
+    new_tile = TektonTile()
+    new_tile.tileno, new_tile.bts_type, new_tile.bts_num, new_tile.h_mirror, new_tile.v_mirror = tile_value
+    return new_tile
+
+
+def _encode_tile_cells(tiles):
+    return [[x, y, _encode_tile(tile)] for (x, y), tile in sorted(tiles.items())]
+
+
+def _apply_tile_cells(tile_grid, tile_cells):
+    for x, y, tile_value in tile_cells:
+        tile_grid[x][y] = _decode_tile(tile_value)
+
+
+class JournalReplayError(Exception):
+    """Exception raised when an edit saved in a journal cannot be applied to a project, e.g. because a room is missing."""
+    pass
@@ -0,0 +1,224 @@
+"""Tekton Memory Report
+
+This module implements reports of how much memory a TektonProject's rooms and build state use, split into categories,
+so it is clear which data structures are worth slimming down.
+
+Reports are made by walking the objects and adding up sys.getsizeof for each object and its attribute dict. Every
+object is counted once, however many rooms or states refer to it, so a tile grid shared between room states only counts
+towards the total once. Small objects shared by the whole interpreter, such as enum members and small ints, are not
+counted.
+
+Peak memory use while something runs is measured separately with tracemalloc. See measure_peak_memory.
+
+Classes:
+    TektonMemoryReport: Bytes used by a project's objects, by category.
+    TektonMemoryMeasurement: Named tuple describing the memory used while something ran, measured with tracemalloc.
+
+Functions:
+    measure_peak_memory: Context manager which measures the memory used while the code inside it runs.
+
+"""
+
+import os
+import sys
+import tracemalloc
+from collections import namedtuple
+from contextlib import contextmanager
+
+MEMORY_CATEGORIES = ("tile_objects",
+                     "grid_lists",
+                     "state_objects",
+                     "room_objects",
+                     "door_objects",
+                     "cached_buffers",
+                     "rom_buffers")
+
+TektonMemoryMeasurement = namedtuple("TektonMemoryMeasurement", ["peak_bytes", "retained_bytes", "top_allocations"])
+TektonMemoryMeasurement.__doc__ = """Memory used while something ran, measured with tracemalloc.
+
+Attributes:
+    peak_bytes (int): Most memory allocated at any point while it ran, above what was allocated when it started.
+    retained_bytes (int): Memory still allocated when it finished, above what was allocated when it started.
+    top_allocations (list): ("file:line", bytes) tuples for the lines in tekton which allocated the most memory that was
+        still allocated when it finished, largest first.
+"""
+
+
+class TektonMemoryReport:
+    """Bytes used by a project's objects, by category.
+
+    The categories are:
+        tile_objects: TektonTiles.
+        grid_lists: TektonTileGrids and the lists holding their columns of tiles.
+        state_objects: TektonRoomStates and the state pointers in rooms' extra_states.
+        room_objects: TektonRooms and their lists of doors and states.
+        door_objects: TektonDoors and TektonElevatorLaunchpads, including their door data.
+        cached_buffers: Bytes kept to avoid work, e.g. cached header data, compressed level data and writes, and the
+            uncompressed level data of grids whose tiles have not been created yet.
+        rom_buffers: Copies of the source and modified ROMs kept between builds.
+
+    Attributes:
+        category_bytes (dict): Bytes used by each category, keyed by category name.
+        grid_count (int): Number of different tile grids counted.
+        measurements (dict): TektonMemoryMeasurements keyed by what was measured, e.g. "import_rooms" or "build".
+        room_count (int): Number of rooms counted.
+        shared_grid_count (int): Number of tile grids used by more than one room state.
+        unloaded_room_count (int): Number of lazily imported rooms that have not been loaded, and were not counted.
+
+    """
+
+    def __init__(self):
+        self.category_bytes = {category: 0 for category in MEMORY_CATEGORIES}
+        self.grid_count = 0
+        self.measurements = {}
+        self.room_count = 0
+        self.shared_grid_count = 0
+        self.unloaded_room_count = 0
+
+        self._counted_ids = set()
+        self._grid_state_counts = {}  # id(grid) -> number of room states using it
+
+    def __str__(self):
+        total_bytes = self.total_bytes
+        report_lines = ["TektonMemoryReport: {} rooms ({} not loaded), {} tile grids ({} shared)".format(
+            self.room_count, self.unloaded_room_count, self.grid_count, self.shared_grid_count)]
+        for category in MEMORY_CATEGORIES:
+            category_bytes = self.category_bytes[category]
+            report_lines.append("  {:<16}{:>14,} bytes {:>6.1%}".format(category,
+                                                                        category_bytes,
+                                                                        category_bytes / total_bytes if total_bytes
+                                                                        else 0))
+        report_lines.append("  {:<16}{:>14,} bytes".format("total", total_bytes))
+        for name, measurement in sorted(self.measurements.items()):
+            report_lines.append("  {} peak {:,} bytes, retained {:,} bytes".format(name,
+                                                                                  measurement.peak_bytes,
+                                                                                  measurement.retained_bytes))
+            for location, allocated_bytes in measurement.top_allocations:
+                report_lines.append("    {:>14,} bytes  {}".format(allocated_bytes, location))
+        return "\n".join(report_lines)
+
+    @property
+    def total_bytes(self):
+        """int: Bytes used by every category together."""
+        return sum(self.category_bytes.values())
+
+    def add_object(self, category, counted_object):
+        """Adds the size of an object, and of its attribute dict if it has one, to a category. Objects that have
+        already been counted, and None, are skipped.
+
+        Args:
+            category (str): One of MEMORY_CATEGORIES.
+            counted_object (object): The object to count.
+
+        Returns:
+            bool : True if the object was counted, False if it was skipped.
+
+        """
+        if category not in self.category_bytes:
+            raise ValueError("category must be one of {}".format(", ".join(MEMORY_CATEGORIES)))
+        if counted_object is None or id(counted_object) in self._counted_ids:
+            return False
+        self._counted_ids.add(id(counted_object))
+        self.category_bytes[category] += _get_object_size(counted_object)
+        return True
+
+    def add_room(self, room):
+        """Counts a room, and its doors, room states and tile grids.
+
+        Args:
+            room (TektonRoom): The room to count.
+
+        """
+        if not self.add_object("room_objects", room):
+            return
+        self.room_count += 1
+        for room_attribute in ("_doors", "_extra_states", "_header_data_watched_objects", "name"):
+            self.add_object("room_objects", room.__dict__.get(room_attribute))
+        self.add_object("cached_buffers", room.__dict__.get("_header_data_cache"))
+
+        for door in room.doors:
+            if self.add_object("door_objects", door):
+                self.add_object("door_objects", door.__dict__.get("_door_data"))
+
+        room_states = [room.standard_state]
+        for room_state_pointer in room.extra_states:
+            self.add_object("state_objects", room_state_pointer)
+            room_states.append(room_state_pointer.room_state)
+        for room_state in room_states:
+            if room_state is not None and self.add_object("state_objects", room_state):
+                self._add_tile_grid(room_state.tiles)
+
+    def _add_tile_grid(self, tile_grid):
+        if tile_grid is None:
+            return
+        state_count = self._grid_state_counts.get(id(tile_grid), 0) + 1
+        self._grid_state_counts[id(tile_grid)] = state_count
+        if state_count == 2:
+            self.shared_grid_count += 1
+        if not self.add_object("grid_lists", tile_grid):
+            return
+        self.grid_count += 1
+
+        # Don't create the tiles of a grid that has not been used yet, just count the data they would be made from
+        pending_data = tile_grid.__dict__.get("_pending_data")
+        if pending_data is not None:
+            self.add_object("cached_buffers", pending_data)
+            self.add_object("cached_buffers", pending_data[2])
+            return
+
+        tile_columns = tile_grid.__dict__.get("_tiles", [])
+        self.add_object("grid_lists", tile_columns)
+        for tile_column in tile_columns:
+            self.add_object("grid_lists", tile_column)
+            for tile in tile_column:
+                self.add_object("tile_objects", tile)
+
+
+@contextmanager
+def measure_peak_memory(measurements, name, *, top_allocation_count=10):
+    """Context manager which measures the memory allocated while the code inside it runs, using tracemalloc.
+
+    tracemalloc is started if it is not already running, and stopped again afterwards. Its peak is reset on entry, so
+    measurements should not be nested. Tracing memory makes the code inside run several times slower.
+
+    Example:
+        measurements = {}
+        with measure_peak_memory(measurements, "import_rooms"):
+            project.import_rooms()
+        print(measurements["import_rooms"].peak_bytes)
+
+    Args:
+        measurements (dict): The TektonMemoryMeasurement is stored in this dict when the code inside finishes.
+        name (str): Key to store the measurement under.
+        top_allocation_count (int): Optional. Number of lines in tekton to list in top_allocations. Defaults to 10.
+
+    """
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    start_bytes, start_peak_bytes = tracemalloc.get_traced_memory()
+    try:
+        yield
+    finally:
+        end_bytes, peak_bytes = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(True, os.path.join(os.path.dirname(os.path.abspath(__file__)), "*"))])
+        if started_tracing:
+            tracemalloc.stop()
+        top_allocations = [("{}:{}".format(os.path.basename(statistic.traceback[0].filename),
+                                           statistic.traceback[0].lineno),
+                            statistic.size)
+                           for statistic in snapshot.statistics("lineno")[:top_allocation_count]]
+        measurements[name] = TektonMemoryMeasurement(peak_bytes - start_bytes, end_bytes - start_bytes, top_allocations)
+
+
+def _get_object_size(counted_object):
+    object_size = sys.getsizeof(counted_object)
+    object_dict = getattr(counted_object, "__dict__", None)
+    if object_dict is not None:
+        object_size += sys.getsizeof(object_dict)
+        observers = object_dict.get("_observers")
+        if observers is not None:
+            object_size += sys.getsizeof(observers)
+    return object_size
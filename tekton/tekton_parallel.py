@@ -0,0 +1,102 @@
+"""Tekton Parallel
+
+This module implements helpers that import rooms in worker processes. Each worker maps the source ROM file into memory
+with a read-only mmap, so the operating system shares the ROM's pages between every worker instead of each worker
+receiving its own pickled copy of the ROM. Workers send back TektonRoomRecords, which the parent process turns into
+TektonRoom objects.
+
+The helpers that split work into chunks and map a ROM file into a worker are also used by tekton_variant.
+
+Functions:
+    import_room_records: Imports a list of room headers across several worker processes and returns their records.
+    split_into_chunks: Splits a list of work items into contiguous chunks for a number of worker processes.
+    map_rom_file: Maps a ROM file into memory read-only.
+
+"""
+
+import mmap
+from concurrent.futures import ProcessPoolExecutor
+
+from .tekton_room_importer import TektonRoomImporter
+from .tekton_room_record import room_to_record
+
+_worker_rom_contents = None
+
+
+def import_room_records(source_rom_path, room_header_addresses, jobs):
+    """Imports rooms from a ROM file in several worker processes.
+
+    The header list is split into contiguous chunks which are handed to the workers. Records are returned in the same
+    order as room_header_addresses.
+
+    Args:
+        source_rom_path (str): Path to the ROM file. Every worker maps this file into memory.
+        room_header_addresses (list): PC addresses of the room headers to import.
+        jobs (int): Number of worker processes to use.
+
+    Returns:
+        list : TektonRoomRecords for each header in room_header_addresses.
+
+    """
+    if len(room_header_addresses) < 1:
+        return []
+
+    records = []
+    with ProcessPoolExecutor(max_workers=jobs,
+                             initializer=_init_import_worker,
+                             initargs=(source_rom_path,)) as executor:
+        for chunk_records in executor.map(_import_room_records_chunk, split_into_chunks(room_header_addresses, jobs)):
+            records.extend(chunk_records)
+
+    return records
+
+
+def split_into_chunks(items, jobs):
+    """Splits a list of work items into contiguous chunks to hand to worker processes.
+
+    A few chunks are made per worker, which keeps workers busy when some items take longer than others.
+
+    Args:
+        items (list): Work items to split.
+        jobs (int): Number of worker processes the chunks will be handed to.
+
+    Returns:
+        list : Lists of items, in the same order as items. Empty if items is empty.
+
+    """
+    if len(items) < 1:
+        return []
+    chunk_count = min(len(items), jobs * 4)
+    chunk_size = -(-len(items) // chunk_count)
+    return [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+
+def map_rom_file(rom_path):
+    """Maps a ROM file into memory read-only, so that every process which maps it shares the same pages.
+
+    Args:
+        rom_path (str): Path to the ROM file.
+
+    Returns:
+        mmap.mmap : The mapped contents of the file. The mapping stays valid after the file is closed.
+
+    """
+    with open(rom_path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _init_import_worker(source_rom_path):
+    global _worker_rom_contents
+    _worker_rom_contents = map_rom_file(source_rom_path)
+
+
+def _import_room_records_chunk(room_header_addresses):
+    room_importer = TektonRoomImporter()
+    room_importer.rom_contents = _worker_rom_contents
+    records = []
+    for room_header_address in room_header_addresses:
+        room_importer.room_header_address = room_header_address
+        records.append(room_to_record(room_importer.import_room_from_rom(),
+                                      state_address=room_importer.get_room_state_address))
+
+    return records
@@ -0,0 +1,290 @@
+"""Tekton Patch
+
+This module implements functions that turn a list of ROM writes into IPS and BPS patches, so a modified ROM can be
+distributed without producing the full ROM image and diffing it afterwards.
+
+Writes are (PC address, bytes, owner) tuples, the same form TektonProject generates them in. Overlapping writes are
+applied in order, so later writes win. Adjacent and overlapping writes are merged, and bytes which end up the same as
+the source ROM are left out of the patch.
+
+Functions:
+    get_patch_regions: Merges a list of writes into sorted, non-overlapping regions of bytes that differ from the source.
+    create_ips_patch: Creates an IPS patch from a list of patch regions.
+    create_bps_patch: Creates a BPS patch from a source ROM and a list of patch regions.
+
+"""
+
+import zlib
+from bisect import bisect_right
+
+
+IPS_HEADER = b'PATCH'
+IPS_FOOTER = b'EOF'
+IPS_FOOTER_ADDRESS = 0x454f46
+IPS_MAX_ADDRESS = 0xffffff
+IPS_MAX_RECORD_LENGTH = 0xffff
+IPS_RLE_MIN_LENGTH = 16  # Shorter runs are cheaper as part of a normal record than as a separate RLE record
+
+BPS_HEADER = b'BPS1'
+BPS_SOURCE_READ = 0
+BPS_TARGET_READ = 1
+BPS_SOURCE_COPY = 2
+BPS_TARGET_COPY = 3
+BPS_RLE_MIN_LENGTH = 4
+
+
+class PatchAddressError(Exception):
+    """Error raised when a write cannot be expressed in a patch, e.g. an IPS patch past the 16 MB limit of the format."""
+    pass
+
+
+def get_patch_regions(source_contents, writes, *, merge_distance=5):
+    """Merges a list of writes into the regions of the ROM that they change.
+
+    Regions which are separated by fewer than merge_distance unchanged bytes are joined into one region, since each
+    region in a patch costs a few bytes of overhead. The unchanged bytes between them are copied from the source.
+
+    Args:
+        source_contents (bytes): The unmodified ROM. Any object supporting slicing, such as an mmap, can be used, and
+            only the parts of it under a write are read.
+        writes (iterable): (PC address, bytes, owner) tuples, in the order they should be written.
+        merge_distance (int): Optional. Regions closer together than this many bytes are merged. Defaults to 5, the size
+            of an IPS record header.
+
+    Returns:
+        list : Sorted, non-overlapping (PC address, bytes) tuples containing only bytes that differ from the source.
+
+    """
+    if not isinstance(merge_distance, int):
+        raise TypeError("merge_distance must be of type int!")
+    if merge_distance < 0:
+        raise ValueError("merge_distance must be 0 or greater.")
+
+    writes = [(write_address, bytes(write_data)) for write_address, write_data, write_owner in writes
+              if len(write_data) > 0]
+    for write_address, write_data in writes:
+        if write_address < 0 or write_address + len(write_data) > len(source_contents):
+            raise PatchAddressError("Write of {} bytes at {} is outside the source ROM!".format(len(write_data),
+                                                                                               hex(write_address)))
+
+    # Group overlapping and touching writes into blocks, then replay the writes over each block in their original order
+    block_starts = []
+    block_ends = []
+    for write_address, write_data in sorted(writes, key=lambda write: write[0]):
+        write_end = write_address + len(write_data)
+        if block_ends and write_address <= block_ends[-1]:
+            block_ends[-1] = max(block_ends[-1], write_end)
+        else:
+            block_starts.append(write_address)
+            block_ends.append(write_end)
+
+    blocks = [bytearray(source_contents[start:end]) for start, end in zip(block_starts, block_ends)]
+    for write_address, write_data in writes:
+        block_index = bisect_right(block_starts, write_address) - 1
+        offset = write_address - block_starts[block_index]
+        blocks[block_index][offset:offset + len(write_data)] = write_data
+
+    regions = []
+    for block_start, block in zip(block_starts, blocks):
+        source_block = source_contents[block_start:block_start + len(block)]
+        for run_start, run_end in _get_changed_runs(block, source_block):
+            run_address = block_start + run_start
+            if regions and run_address - (regions[-1][0] + len(regions[-1][1])) < merge_distance:
+                previous_address, previous_data = regions[-1]
+                previous_end = previous_address + len(previous_data)
+                regions[-1] = (previous_address,
+                               previous_data + bytes(source_contents[previous_end:run_address]) +
+                               bytes(block[run_start:run_end]))
+            else:
+                regions.append((run_address, bytes(block[run_start:run_end])))
+
+    return regions
+
+
+def create_ips_patch(regions):
+    """Creates an IPS patch that applies a list of regions.
+
+    Long runs of a single byte are stored as RLE records. Records are split where they would be longer than the IPS
+    format allows, and a record that would start at 0x454f46 (which IPS patchers read as the end of the patch) is moved
+    back by one byte. A region that starts exactly at 0x454f46 cannot be moved back and raises PatchAddressError.
+
+    Args:
+        regions (list): Sorted, non-overlapping (PC address, bytes) tuples, as returned by get_patch_regions.
+
+    Returns:
+        bytes : The IPS patch.
+
+    """
+    patch = bytearray(IPS_HEADER)
+    for region_address, region_data in regions:
+        if region_address + len(region_data) - 1 > IPS_MAX_ADDRESS:
+            raise PatchAddressError("IPS patches cannot write past {}!".format(hex(IPS_MAX_ADDRESS)))
+
+        record_start = 0
+        run_start = 0
+        for run_value, run_length in _get_runs(region_data):
+            if run_length >= IPS_RLE_MIN_LENGTH:
+                _append_ips_records(patch, region_address, region_data, record_start, run_start)
+                _append_ips_rle_records(patch, region_address, region_data, run_start, run_start + run_length)
+                record_start = run_start + run_length
+            run_start += run_length
+        _append_ips_records(patch, region_address, region_data, record_start, len(region_data))
+
+    patch += IPS_FOOTER
+    return bytes(patch)
+
+
+def create_bps_patch(source_contents, regions):
+    """Creates a BPS patch that applies a list of regions to a source ROM.
+
+    Unchanged parts of the ROM are copied from the source with SourceRead actions. Inside each region, runs of a single
+    byte are written once and repeated with a TargetCopy action, and a region whose bytes were already written earlier
+    in the patch is copied from there with a TargetCopy action instead of being stored again.
+
+    The BPS format stores CRC32 checksums of the whole source and target ROMs, so unlike IPS patches, creating a BPS
+    patch reads the entire source ROM once.
+
+    Args:
+        source_contents (bytes): The unmodified ROM.
+        regions (list): Sorted, non-overlapping (PC address, bytes) tuples, as returned by get_patch_regions.
+
+    Returns:
+        bytes : The BPS patch.
+
+    """
+    source_size = len(source_contents)
+    patch = bytearray(BPS_HEADER)
+    patch += _encode_bps_number(source_size)
+    patch += _encode_bps_number(source_size)
+    patch += _encode_bps_number(0)  # No metadata
+
+    target_crc = 0
+    output_offset = 0
+    target_relative_offset = 0
+    written_regions = {}  # Region bytes -> target address they were first written at
+
+    for region_address, region_data in regions:
+        if region_address < output_offset or region_address + len(region_data) > source_size:
+            raise PatchAddressError("BPS patch regions must be sorted, non-overlapping and inside the source ROM!")
+        if region_address > output_offset:
+            patch += _encode_bps_action(BPS_SOURCE_READ, region_address - output_offset)
+            target_crc = zlib.crc32(source_contents[output_offset:region_address], target_crc)
+            output_offset = region_address
+
+        if len(region_data) >= BPS_RLE_MIN_LENGTH and region_data in written_regions:
+            target_relative_offset = _append_bps_target_copy(patch, target_relative_offset,
+                                                             written_regions[region_data], len(region_data))
+        else:
+            written_regions.setdefault(region_data, region_address)
+            read_start = 0
+            run_start = 0
+            for run_value, run_length in _get_runs(region_data):
+                if run_length >= BPS_RLE_MIN_LENGTH:
+                    # Write the first byte of the run, then copy it forward over the rest of the run
+                    read_end = run_start + 1
+                    patch += _encode_bps_action(BPS_TARGET_READ, read_end - read_start)
+                    patch += region_data[read_start:read_end]
+                    target_relative_offset = _append_bps_target_copy(patch, target_relative_offset,
+                                                                     region_address + run_start, run_length - 1)
+                    read_start = run_start + run_length
+                run_start += run_length
+            if read_start < len(region_data):
+                patch += _encode_bps_action(BPS_TARGET_READ, len(region_data) - read_start)
+                patch += region_data[read_start:]
+
+        target_crc = zlib.crc32(region_data, target_crc)
+        output_offset = region_address + len(region_data)
+
+    if output_offset < source_size:
+        patch += _encode_bps_action(BPS_SOURCE_READ, source_size - output_offset)
+        target_crc = zlib.crc32(source_contents[output_offset:], target_crc)
+
+    patch += zlib.crc32(source_contents).to_bytes(4, byteorder="little")
+    patch += target_crc.to_bytes(4, byteorder="little")
+    patch += zlib.crc32(patch).to_bytes(4, byteorder="little")
+    return bytes(patch)
+
+
+def _get_changed_runs(new_data, old_data):
+    """Yields (start, end) index pairs for each run of bytes that differs between two equal-length byte strings."""
+    run_start = None
+    for index in range(len(new_data)):
+        if new_data[index] != old_data[index]:
+            if run_start is None:
+                run_start = index
+        elif run_start is not None:
+            yield run_start, index
+            run_start = None
+    if run_start is not None:
+        yield run_start, len(new_data)
+
+
+def _get_runs(data):
+    """Yields (byte value, run length) for each run of repeated bytes in data."""
+    index = 0
+    while index < len(data):
+        run_end = index + 1
+        while run_end < len(data) and data[run_end] == data[index]:
+            run_end += 1
+        yield data[index], run_end - index
+        index = run_end
+
+
+def _append_ips_records(patch, address, data, start, end):
+    offset = start
+    while offset < end:
+        record_address = address + offset
+        record_length = min(end - offset, IPS_MAX_RECORD_LENGTH - 1)
+        if record_address == IPS_FOOTER_ADDRESS:
+            if offset == 0:
+                raise PatchAddressError("IPS patches cannot start a region at {}, because IPS patchers read that "
+                                        "address as the end of the patch.".format(hex(IPS_FOOTER_ADDRESS)))
+            # Start one byte early, repeating the byte before it, so the record is not mistaken for the footer
+            patch += (record_address - 1).to_bytes(3, byteorder="big")
+            patch += (record_length + 1).to_bytes(2, byteorder="big")
+            patch += data[offset - 1:offset + record_length]
+        else:
+            patch += record_address.to_bytes(3, byteorder="big")
+            patch += record_length.to_bytes(2, byteorder="big")
+            patch += data[offset:offset + record_length]
+        offset += record_length
+
+
+def _append_ips_rle_records(patch, address, data, start, end):
+    offset = start
+    while offset < end:
+        record_address = address + offset
+        if record_address == IPS_FOOTER_ADDRESS:
+            # RLE records cannot start a byte early, so write this byte as a normal record
+            _append_ips_records(patch, address, data, offset, offset + 1)
+            offset += 1
+            continue
+        record_length = min(end - offset, IPS_MAX_RECORD_LENGTH)
+        patch += record_address.to_bytes(3, byteorder="big")
+        patch += b'\x00\x00'
+        patch += record_length.to_bytes(2, byteorder="big")
+        patch += data[offset:offset + 1]
+        offset += record_length
+
+
+def _append_bps_target_copy(patch, target_relative_offset, copy_address, length):
+    patch += _encode_bps_action(BPS_TARGET_COPY, length)
+    relative_offset = copy_address - target_relative_offset
+    patch += _encode_bps_number((abs(relative_offset) << 1) | (1 if relative_offset < 0 else 0))
+    return copy_address + length
+
+
+def _encode_bps_action(action, length):
+    return _encode_bps_number(((length - 1) << 2) | action)
+
+
+def _encode_bps_number(number):
+    encoded = bytearray()
+    while True:
+        low_bits = number & 0x7f
+        number >>= 7
+        if number == 0:
+            encoded.append(0x80 | low_bits)
+            return bytes(encoded)
+        encoded.append(low_bits)
+        number -= 1
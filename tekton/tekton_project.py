@@ -9,26 +9,115 @@ Classes:
 
 """
 
+import contextlib
+import copy
+import functools
+import mmap
 import os
+import shutil
+import tempfile
 import yaml
+from bisect import bisect_left, bisect_right
 
+from .tekton_checksum import TektonChecksum, CHECKSUM_COMPLEMENT_ADDRESS, CHECKSUM_FIELDS_END
+from .tekton_door import TektonDoor, TektonElevatorLaunchpad
+from .tekton_free_space import TektonFreeSpace, OutOfFreeSpaceError
+from .tekton_import_cache import get_import_cache_key, load_cached_rooms, save_cached_rooms
+from .tekton_memory_report import TektonMemoryReport, measure_peak_memory
 from .tekton_room_importer import TektonRoomImporter
+from .tekton_room import CompressedDataTooLargeError
 from .tekton_room_dict import TektonRoomDict
-from .tekton_system import overwrite_bytes_at_index
+from .tekton_reference_index import TektonReferenceIndex
+from .tekton_room_record import room_from_record
+from .tekton_parallel import import_room_records
+from .tekton_patch import get_patch_regions, create_ips_patch, create_bps_patch
+from .tekton_snapshot import write_snapshot, read_snapshot
+from .tekton_system import overwrite_bytes_in_place, pad_bytes
+from .tekton_trace import get_tracer, trace_span
+from .tekton_write_index import TektonWriteIndex, WriteOverlapError, describe_write
 
 class TektonProject:
     """A top-level object containing abstractions for concepts Super Metroid, like rooms and tilesets. Can output
     modified ROMs based on changes made to its sub-objects.
 
     Attributes:
+        deduplicate_level_data (bool): If True, rooms whose level data compresses to the same bytes share a single copy
+            of it in the modified ROM, and the space freed is added to free_space. A room whose level data changes after
+            it was shared is moved into free_space, and OutOfFreeSpaceError is raised if it does not fit. Defaults to
+            False.
+        free_space (TektonFreeSpace): Space in the ROM that level data may be moved into when it no longer fits where it
+            is. Empty by default, so oversized level data raises CompressedDataTooLargeError.
         source_rom_path (str): Path to the original ROM used as the base for this TektonProject.
+        strict_writes (bool): If True, a build fails with WriteOverlapError if any of its writes overwrite each other
+            with different bytes. Defaults to False, so overlaps are only recorded in write_overlaps.
+        trace_memory (bool): If True, the memory allocated by import_rooms, get_modified_rom_contents and build_to is
+            measured with tracemalloc, and included in memory_report. Makes them several times slower. Defaults to
+            False.
+        references (TektonReferenceIndex): Index of the ROM addresses that the loaded rooms point at.
         rooms (TektonRoomDict): Object containing the TektonRooms which will be written to the modified ROM.
+        update_checksum (bool): If True, the internal checksum and complement in the cartridge header are updated to
+            match the modified ROM, in get_modified_rom_contents, build_to and patches. Defaults to False, so only the
+            bytes of the project's rooms are changed.
+        write_overlaps (list): TektonWriteOverlaps for every pair of writes in the last build which overwrite each other
+            with different bytes, e.g. when a header has grown into the next room's header. See tekton_write_index.
 
     """
 
     def __init__(self):
+        self.deduplicate_level_data = False
+        self.free_space = TektonFreeSpace()
         self.source_rom_path = None
+        self.strict_writes = False
         self.rooms = TektonRoomDict()
+        self.references = TektonReferenceIndex(self.rooms)
+        self.trace_memory = False
+        self.update_checksum = False
+        self.write_overlaps = []
+
+        # Build-to-build state. See get_modified_rom_contents.
+        self._build_checksum = None
+        self._build_contents = None
+        self._build_room_writes = {}
+        self._build_rooms = None
+        self._build_source_contents = None
+        self._build_serial = 0
+        self._build_source_key = None
+        self._level_data_cache = {}
+        self._memory_measurements = {}
+        self._room_write_cache = {}
+        self._source_checksum = None
+
+    @classmethod
+    def load_snapshot(cls, snapshot_path, *, memory_map=True):
+        """Creates a new TektonProject from a snapshot file written by save_snapshot.
+
+        Loading a snapshot does not read the source ROM. Tile grids are read lazily from a memory map of the snapshot
+        unless memory_map is False.
+
+        Args:
+            snapshot_path (str): Path of the snapshot file.
+            memory_map (bool): Optional. If False, the snapshot is read into memory instead. Defaults to True.
+
+        Returns:
+            TektonProject : New project containing the saved rooms and source ROM path.
+
+        """
+        new_project = cls()
+        new_project.source_rom_path, rooms = read_snapshot(snapshot_path, memory_map=memory_map)
+        for room in rooms:
+            new_project.rooms.add_room(room)
+        return new_project
+
+    def save_snapshot(self, snapshot_path):
+        """Saves the source ROM path and every room in the project to a compact binary snapshot file, which
+        load_snapshot can load much faster than importing the rooms from the ROM again. Loads any lazily imported rooms
+        which have not been loaded yet.
+
+        Args:
+            snapshot_path (str): Path of the snapshot file to write.
+
+        """
+        write_snapshot(snapshot_path, self.source_rom_path, sorted(self.rooms.values(), key=lambda room: room.header))
 
     def get_source_rom_contents(self):
         """Returns the byte string contained in the self.source_rom_path file
@@ -45,29 +134,222 @@ class TektonProject:
     def get_modified_rom_contents(self):
         """Returns the source ROM modified with any changes to the rooms, tilesets, or other parts of the TektonProject.
 
+        Every change is written into a single bytearray copy of the source ROM, which is converted to bytes once at the
+        end.
+
+        The project keeps the modified ROM between calls. As long as the source ROM file has not changed, later calls
+        only write the rooms that are new or dirty (see TektonRoom.dirty), and only compress level data again if the
+        room's tiles have changed. Rooms are marked clean once they have been written. The bytes written by rooms that
+        have since been removed from self.rooms are put back to the source ROM's bytes.
+
+        Level data that has grown past its room's level_data_length is moved into self.free_space first, and identical
+        level data may be shared between rooms. See _place_level_data.
+
+        If self.update_checksum is True, the checksum is kept up to date from the old and new bytes of each write, rather
+        than by summing the whole ROM again. See tekton_checksum.
+
+        Every build checks all of its writes for overlaps and records them in self.write_overlaps. If self.strict_writes
+        is True and any are found, WriteOverlapError is raised before anything is written.
+
         Returns:
             bytes : The binary data of the modified ROM. (This can then be written to a file.)
 
         """
-        modified_rom_contents = self.get_source_rom_contents()
+        with trace_span("get_modified_rom_contents") as span, self._measure_memory("build"):
+            return self._get_modified_rom_contents(span)
+
+    def _get_modified_rom_contents(self, span):
+        """Builds the modified ROM for get_modified_rom_contents, and records the number of rooms built on span."""
+        self._place_level_data()
+
+        source_key = self._get_source_rom_key()
+        if self._build_source_key != source_key or self._build_rooms is not self.rooms:
+            self._build_source_contents = self.get_source_rom_contents()
+            self._build_contents = bytearray(self._build_source_contents)
+            self._build_room_writes = {}
+            self._build_rooms = self.rooms
+            self._build_source_key = source_key
+            self._build_checksum = None
+
+        if self.update_checksum and self._build_checksum is None:
+            self._build_checksum = TektonChecksum(self._build_contents)
+        elif not self.update_checksum and self._build_checksum is not None:
+            self._build_checksum = None
+            overwrite_bytes_in_place(self._build_contents,
+                                     self._build_source_contents[CHECKSUM_COMPLEMENT_ADDRESS:CHECKSUM_FIELDS_END],
+                                     CHECKSUM_COMPLEMENT_ADDRESS)
+
+        loaded_rooms = [room for header_address, room in self.rooms.loaded_items()]
+        changed_rooms = [room for room in loaded_rooms if id(room) not in self._build_room_writes or room.dirty]
+        changed_room_writes = [self._get_room_writes(room) for room in changed_rooms]
+        loaded_room_ids = set(id(room) for room in loaded_rooms)
+        removed_room_ids = [room_id for room_id in self._build_room_writes if room_id not in loaded_room_ids]
+        span.set(room_count=len(loaded_rooms),
+                 changed_rooms=len(changed_rooms),
+                 removed_rooms=len(removed_room_ids))
+
+        changed_writes_by_id = {id(room): room_writes for room, room_writes in zip(changed_rooms, changed_room_writes)}
+        build_writes = []
+        for room in loaded_rooms:
+            room_writes = changed_writes_by_id.get(id(room))
+            build_writes.extend(self._build_room_writes[id(room)][1] if room_writes is None else room_writes)
+        self._check_writes(build_writes)
+
+        # Put back the source ROM's bytes wherever a changed or removed room wrote last time, in case it now writes
+        # elsewhere (or nowhere)
+        restored_starts = []
+        restored_ends = []
+        for room_id in [id(room) for room in changed_rooms] + removed_room_ids:
+            previous_room, previous_writes = self._build_room_writes.get(room_id, (None, []))
+            for write_address, write_data, write_owner in previous_writes:
+                self._write_build_bytes(self._build_source_contents[write_address:write_address + len(write_data)],
+                                        write_address)
+                restored_starts.append(write_address)
+                restored_ends.append(write_address + len(write_data))
+        for room_id in removed_room_ids:
+            del self._build_room_writes[room_id]
+        self._prune_room_caches(loaded_room_ids)
+
+        # Rooms that did not change may have written to some of the same places, e.g. shared doors or level data
+        if restored_starts:
+            restored_starts.sort()
+            restored_ends.sort()
+            changed_room_ids = set(id(room) for room in changed_rooms)
+            for room_id, (room, room_writes) in self._build_room_writes.items():
+                if room_id in changed_room_ids:
+                    continue
+                for write_address, write_data, write_owner in room_writes:
+                    # Some restored range starts before this write ends and ends after this write starts
+                    write_end = write_address + len(write_data)
+                    if bisect_left(restored_starts, write_end) > bisect_right(restored_ends, write_address):
+                        self._write_build_bytes(write_data, write_address)
+
+        # Only make a span for each write while tracing, since there can be thousands of them
+        tracing = get_tracer() is not None
+        for room, room_writes in zip(changed_rooms, changed_room_writes):
+            for write_address, write_data, write_owner in room_writes:
+                if tracing:
+                    with trace_span("write", address=write_address, bytes=len(write_data),
+                                    owner=type(write_owner).__name__):
+                        self._write_build_bytes(write_data, write_address)
+                else:
+                    self._write_build_bytes(write_data, write_address)
+            self._build_room_writes[id(room)] = (room, room_writes)
+
+        if self._build_checksum is not None:
+            overwrite_bytes_in_place(self._build_contents, self._build_checksum.header_bytes, CHECKSUM_COMPLEMENT_ADDRESS)
+
+        for room in changed_rooms:
+            room.mark_clean()
+
+        return bytes(self._build_contents)
+
+    def build_to(self, output_rom_path):
+        """Writes the modified ROM straight to a file, without holding the whole ROM in memory.
+
+        The source ROM is copied to output_rom_path by the operating system (with os.copy_file_range or os.sendfile
+        where they are available), and then each write is made at its offset in the output file with a positioned
+        write. Memory use depends on the size of the largest write rather than the size of the ROM.
+
+        The ROM is written to a temporary file next to output_rom_path, which then replaces output_rom_path, so an
+        existing file at output_rom_path is left as it was if the build fails.
+
+        This does not use or update the build state kept by get_modified_rom_contents, so rooms are not marked clean.
 
-        for header_address, room in self.rooms.items():
-            modified_rom_contents = overwrite_bytes_at_index(modified_rom_contents,
-                                                             room.header_data,
-                                                             header_address)
+        Args:
+            output_rom_path (str): Path to write the modified ROM to. Any existing file at this path is replaced.
 
-            if room.write_level_data:
-                modified_rom_contents = overwrite_bytes_at_index(modified_rom_contents,
-                                                                 room.compressed_level_data(room.standard_state),
-                                                                 room.standard_state.level_data_address)
-            for door in room.doors:
-                modified_rom_contents = overwrite_bytes_at_index(modified_rom_contents,
-                                                                 door.door_data,
-                                                                 door.data_address)
+        """
+        if os.path.exists(output_rom_path) and os.path.samefile(self.source_rom_path, output_rom_path):
+            raise ValueError("output_rom_path must not be the source ROM!")
+
+        with open(self.source_rom_path, "rb") as source_file, self._measure_memory("build"):
+            rom_size = os.fstat(source_file.fileno()).st_size
+            with mmap.mmap(source_file.fileno(), 0, access=mmap.ACCESS_READ) as source_contents:
+                rom_writes = self._get_output_writes(source_contents)
+
+            for write_address, write_data, write_owner in rom_writes:
+                if write_address < 0 or write_address + len(write_data) > rom_size:
+                    raise ValueError("Write of {} bytes at {} is outside the source ROM!".format(len(write_data),
+                                                                                                hex(write_address)))
+
+            temporary_fd, temporary_path = tempfile.mkstemp(prefix=os.path.basename(output_rom_path) + ".",
+                                                            suffix=".tmp",
+                                                            dir=os.path.dirname(os.path.abspath(output_rom_path)))
+            try:
+                with os.fdopen(temporary_fd, "wb") as output_file:
+                    _copy_file_contents(source_file, output_file, rom_size)
+                    for write_address, write_data, write_owner in rom_writes:
+                        _write_at_offset(output_file, write_data, write_address)
+                os.replace(temporary_path, output_rom_path)
+            finally:
+                if os.path.exists(temporary_path):
+                    os.remove(temporary_path)
+
+    def get_ips_patch(self):
+        """Returns an IPS patch that turns the source ROM into the modified ROM.
+
+        The patch is generated straight from the writes the project would make, without building the modified ROM. The
+        source ROM is mapped into memory and only read where a write lands, so the time taken depends on the number of
+        writes rather than the size of the ROM.
+
+        Returns:
+            bytes : The binary data of the IPS patch.
+
+        """
+        with open(self.source_rom_path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as source_contents:
+                return create_ips_patch(get_patch_regions(source_contents, self._get_output_writes(source_contents)))
+
+    def get_bps_patch(self):
+        """Returns a BPS patch that turns the source ROM into the modified ROM.
 
-        return modified_rom_contents
+        Like get_ips_patch, the patch is generated from the project's writes, but the BPS format also records checksums
+        of the whole source and modified ROMs.
 
-    def import_rooms(self, header_address_file=None):
+        Returns:
+            bytes : The binary data of the BPS patch.
+
+        """
+        with open(self.source_rom_path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as source_contents:
+                return create_bps_patch(source_contents,
+                                        get_patch_regions(source_contents, self._get_output_writes(source_contents)))
+
+    def memory_report(self):
+        """Returns how much memory the project's rooms and build state are using, by category: tile objects, grid
+        lists, room state objects, rooms, doors, cached buffers and ROM buffers. See TektonMemoryReport.
+
+        Objects shared between rooms, such as tile grids used by several room states, are counted once. Lazily imported
+        rooms that have not been loaded are not loaded or counted.
+
+        If self.trace_memory is True, the report also includes the memory measured during the last import_rooms (as
+        "import_rooms") and the last build (as "build"), including its peak and the lines in tekton that allocated the
+        most memory that was kept.
+
+        Returns:
+            TektonMemoryReport : The report. Print it for a summary.
+
+        """
+        report = TektonMemoryReport()
+        report.measurements = dict(self._memory_measurements)
+        for header_address, room in self.rooms.loaded_items():
+            report.add_room(room)
+        report.unloaded_room_count = len(self.rooms) - report.room_count
+
+        for cached_room, level_data_key, build_serial, level_data in self._level_data_cache.values():
+            report.add_object("cached_buffers", level_data)
+        for write_cache in (self._room_write_cache, self._build_room_writes):
+            for cached_room, room_writes in write_cache.values():
+                if report.add_object("cached_buffers", room_writes):
+                    for write_address, write_data, write_owner in room_writes:
+                        report.add_object("cached_buffers", write_data)
+
+        report.add_object("rom_buffers", self._build_source_contents)
+        report.add_object("rom_buffers", self._build_contents)
+        return report
+
+    def import_rooms(self, header_address_file=None, *, jobs=1, lazy=False, cache_dir=None):
         """Imports all rooms from the source ROM file. Can optionally accept a path to a json file of header addresses.
 
         Header address files should be json files. The top element should be a list, sub-elements should be dictionaries
@@ -78,10 +360,32 @@ class TektonProject:
         If no header file is specified, this function will try to import rooms from all of the standard header addresses
         in a Super Metroid ROM.
 
+        If jobs is greater than 1, the header list is split between that many worker processes. Each worker maps the
+        source ROM file into memory rather than receiving its own copy of the ROM.
+
+        If lazy is True, no rooms are parsed during the import. Each room is parsed from the source ROM the first time it
+        is looked up in self.rooms, and rooms that are never looked up are not written by get_modified_rom_contents.
+
+        If cache_dir is given, the imported rooms are saved in that directory, keyed by the SHA-1 of the source ROM, the
+        header list and the tekton version. Later imports of the same rooms from the same ROM, from any process, load
+        the saved rooms instead of parsing the ROM again. See tekton_import_cache.
+
         Args:
             header_address_file (str): Optional. The path to a json file containing room header addresses and names.
+            jobs (int): Optional. Number of worker processes used to import rooms. Defaults to 1 (no worker processes.)
+            lazy (bool): Optional. If True, defer parsing each room until it is first looked up. Defaults to False.
+            cache_dir (str): Optional. Directory of the import cache. Defaults to None (no cache.)
 
         """
+        if not isinstance(jobs, int) or isinstance(jobs, bool):
+            raise TypeError("jobs must be of type int!")
+        if jobs < 1:
+            raise ValueError("jobs must be 1 or greater.")
+        if lazy and jobs > 1:
+            raise ValueError("Lazy imports do not parse any rooms up front, so they cannot use jobs.")
+        if lazy and cache_dir is not None:
+            raise ValueError("Lazy imports do not parse any rooms up front, so they cannot use an import cache.")
+
         default_header_address_file = os.path.join(os.path.dirname(os.path.abspath(__file__)),
                                                 "data",
                                                 "default_room_imports.yaml")
@@ -92,16 +396,379 @@ class TektonProject:
         with open(header_address_file) as f:
             room_headers = yaml.full_load(f)
 
-        rom_contents = self.get_source_rom_contents()
-
-        for room_data in room_headers:
+        with trace_span("import_rooms", room_count=len(room_headers), jobs=jobs, lazy=lazy) as span, \
+                self._measure_memory("import_rooms"):
+            self._import_rooms(room_headers, jobs, lazy, cache_dir, span)
+
+    def _import_rooms(self, room_headers, jobs, lazy, cache_dir, span):
+        """Imports rooms for import_rooms, and records whether the import cache was used on span."""
+        rom_contents = self.get_source_rom_contents() if cache_dir is not None or jobs == 1 else None
+
+        if cache_dir is not None:
+            cache_key = get_import_cache_key(rom_contents, room_headers)
+            cached_rooms = load_cached_rooms(cache_dir, cache_key)
+            span.set(cache_hit=cached_rooms is not None)
+            if cached_rooms is not None:
+                for room in cached_rooms:
+                    self.rooms.add_room(room)
+                return
+
+        new_rooms = []
+        if jobs > 1:
+            room_records = import_room_records(self.source_rom_path,
+                                               [room_data["header"] for room_data in room_headers],
+                                               jobs)
+            interned_doors = {}
+            interned_room_states = {}
+            for room_data, room_record in zip(room_headers, room_records):
+                new_room = room_from_record(room_record, interned_doors, interned_room_states)
+                new_room.name = room_data["name"]
+                new_rooms.append(new_room)
+        else:
+            # One importer for the whole import, so doors and room states seen more than once are only parsed once
             room_importer = TektonRoomImporter()
             room_importer.rom_contents = rom_contents
-            room_importer.room_header_address = room_data["header"]
-            new_room = room_importer.import_room_from_rom()
-            new_room.name = room_data["name"]
+
+            for room_data in room_headers:
+                if lazy:
+                    self.rooms.add_lazy_room(room_data["header"],
+                                             functools.partial(self._import_room, room_importer, room_data))
+                else:
+                    new_rooms.append(self._import_room(room_importer, room_data))
+
+        if cache_dir is not None:
+            save_cached_rooms(cache_dir, cache_key, new_rooms)
+        for new_room in new_rooms:
             self.rooms.add_room(new_room)
 
+    def _get_rom_writes(self):
+        """Generates every write needed to turn the source ROM into the modified ROM.
+
+        Returns:
+            iterable : Iterator yielding (PC address, bytes, owner) tuples, in the order they should be written. owner is
+                the TektonRoom, TektonRoomState, TektonDoor or TektonElevatorLaunchpad the bytes were generated from.
+
+        """
+        self._place_level_data()
+        written_doors = set()  # Doors shared between rooms only need to be written once
+        loaded_rooms = [room for header_address, room in self.rooms.loaded_items()]
+        self._prune_room_caches(set(id(room) for room in loaded_rooms))
+
+        for room in loaded_rooms:
+            for write_address, write_data, write_owner in self._get_room_writes(room):
+                if isinstance(write_owner, (TektonDoor, TektonElevatorLaunchpad)):
+                    if id(write_owner) in written_doors:
+                        continue
+                    written_doors.add(id(write_owner))
+                yield write_address, write_data, write_owner
+
+    def _get_output_writes(self, source_contents):
+        """Returns every write needed to turn the source ROM into the modified ROM, followed by a write of the updated
+        checksum if self.update_checksum is True. The owner of the checksum write is None.
+
+        The writes are checked for overlaps, as in get_modified_rom_contents. The checksum is calculated from the source
+        ROM and the bytes that the other writes change. The source ROM is only summed again when its path, size or
+        modification time changes.
 
+        Args:
+            source_contents (bytes): Contents of the source ROM. Any buffer, such as an mmap, can be used.
 
+        Returns:
+            list : (PC address, bytes, owner) tuples, in the order they should be written.
 
+        """
+        rom_writes = list(self._get_rom_writes())
+        self._check_writes(rom_writes)
+        if not self.update_checksum:
+            return rom_writes
+
+        source_key = self._get_source_rom_key()
+        if self._source_checksum is None or self._source_checksum[0] != source_key:
+            self._source_checksum = (source_key, TektonChecksum(source_contents))
+        checksum = copy.copy(self._source_checksum[1])
+        for region_address, region_data in get_patch_regions(source_contents, rom_writes, merge_distance=0):
+            checksum.update(region_address,
+                            source_contents[region_address:region_address + len(region_data)],
+                            region_data)
+        rom_writes.append((CHECKSUM_COMPLEMENT_ADDRESS, checksum.header_bytes, None))
+        return rom_writes
+
+    def _check_writes(self, rom_writes):
+        """Records every pair of writes that overwrite each other with different bytes in self.write_overlaps, and raises
+        WriteOverlapError if there are any and self.strict_writes is True."""
+        self.write_overlaps = TektonWriteIndex(rom_writes).find_overlaps()
+        if self.write_overlaps and self.strict_writes:
+            overlap_descriptions = ["{} and {} overlap at {}-{}".format(describe_write(overlap.first_write),
+                                                                        describe_write(overlap.second_write),
+                                                                        hex(overlap.start),
+                                                                        hex(overlap.end - 1))
+                                    for overlap in self.write_overlaps[:5]]
+            if len(self.write_overlaps) > 5:
+                overlap_descriptions.append("and {} more".format(len(self.write_overlaps) - 5))
+            raise WriteOverlapError("Build contains overlapping writes: " + "; ".join(overlap_descriptions))
+
+    def _prune_room_caches(self, loaded_room_ids):
+        """Drops cached writes and level data for rooms which are no longer in self.rooms, so that they can be freed.
+
+        Args:
+            loaded_room_ids (set): id() of every loaded room in self.rooms.
+
+        """
+        for room_cache in (self._room_write_cache, self._level_data_cache):
+            for room_id in [room_id for room_id in room_cache if room_id not in loaded_room_ids]:
+                del room_cache[room_id]
+
+    def _get_room_writes(self, room):
+        """Returns the writes for a single room: its header data, its level data and its doors.
+
+        Writes for a clean room are reused from the last time they were generated. Level data is only compressed again
+        if the room's tiles, size or level data length have changed.
+
+        Args:
+            room (TektonRoom): The room to generate writes for.
+
+        Returns:
+            list : (PC address, bytes, owner) tuples.
+
+        """
+        cached_room, room_writes = self._room_write_cache.get(id(room), (room, None))
+        if cached_room is room and room_writes is not None and not room.dirty:
+            return room_writes
+
+        room_writes = [(room.header, room.header_data, room)]
+
+        if room.write_level_data:
+            level_data = self._get_compressed_level_data(room)
+            if 0 < room.level_data_length < len(level_data):
+                raise CompressedDataTooLargeError(
+                    "Compressed data is {0} bytes, but max size is {1} bytes!".format(len(level_data),
+                                                                                      room.level_data_length))
+            room_writes.append((room.standard_state.level_data_address,
+                                pad_bytes(level_data, room.level_data_length, b'\xff'),
+                                room.standard_state))
+
+        for door in room.doors:
+            room_writes.append((door.data_address, door.door_data, door))
+
+        self._room_write_cache[id(room)] = (room, room_writes)
+        return room_writes
+
+    def _get_compressed_level_data(self, room):
+        """Returns a room's compressed level data, without any padding.
+
+        The data is cached, and only compressed again if the room's tiles or size have changed. Tiles stay dirty until
+        the room is marked clean, so data compressed earlier in the same build is also reused.
+
+        Args:
+            room (TektonRoom): The room whose standard state's tiles should be compressed.
+
+        Returns:
+            bytes : Compressed level data.
+
+        """
+        standard_state = room.standard_state
+        level_data_key = (id(standard_state.tiles), room.width_screens, room.height_screens)
+        cached_room, cached_key, cached_serial, level_data = self._level_data_cache.get(id(room),
+                                                                                        (None, None, None, None))
+        with trace_span("get_compressed_level_data", header=room.header) as span:
+            if cached_room is room and cached_key == level_data_key and \
+                    (cached_serial == self._build_serial or not standard_state.tiles.dirty):
+                span.set(cache_hit=True, bytes=len(level_data))
+                return level_data
+
+            level_data = room.compressed_level_data(standard_state, fit_to_length=False)
+            self._level_data_cache[id(room)] = (room, level_data_key, self._build_serial, level_data)
+            span.set(cache_hit=False, bytes=len(level_data))
+            return level_data
+
+    def _place_level_data(self):
+        """Decides where each room's level data will be written, before any writes are generated.
+
+        Level data that has grown past its room's level_data_length is moved into self.free_space. If
+        self.deduplicate_level_data is True, rooms whose level data compresses to the same bytes are then pointed at a
+        single copy, and the space the other copies used is released into self.free_space.
+
+        Starts a new build, so level data compressed before this call is compressed again if its tiles are dirty.
+
+        """
+        self._build_serial += 1
+        self._relocate_oversized_level_data()
+        if self.deduplicate_level_data:
+            self._deduplicate_level_data()
+
+    def _relocate_oversized_level_data(self):
+        """Moves any level data that has grown past its room's level_data_length into self.free_space.
+
+        Every room state that pointed at the old location (including states in other rooms) is pointed at the new
+        location, the rooms' level_data_length is set to the new size, and the old location is released into
+        self.free_space so it can be reused, unless some rooms have not been loaded (see _release_level_data).
+
+        """
+        for header_address, room in self.rooms.loaded_items():
+            if not room.write_level_data or room.level_data_length <= 0:
+                continue
+            level_data = self._get_compressed_level_data(room)
+            if len(level_data) <= room.level_data_length:
+                continue
+
+            old_address = room.standard_state.level_data_address
+            old_length = room.level_data_length
+            self._move_level_data(room, old_address, self._allocate_level_data(room, level_data), len(level_data))
+            self._release_level_data(old_address, old_length)
+
+    def _release_level_data(self, level_data_address, length):
+        """Releases the space used by level data that no loaded room state points at any more into self.free_space.
+
+        Rooms imported lazily which have not been loaded yet are not moved with the rooms that are loaded, and may still
+        point at the level data, so nothing is released while any room has not been loaded. The old level data then
+        stays where it is in the modified ROM.
+
+        Args:
+            level_data_address (int): PC address of the level data.
+            length (int): Number of bytes to release.
+
+        """
+        if any(not self.rooms.is_loaded(header) for header in self.rooms.keys()):
+            return
+        self.free_space.release(level_data_address, length)
+
+    def _deduplicate_level_data(self):
+        """Points rooms with identical compressed level data at a single copy of it.
+
+        The first room (in header order) to write a piece of level data keeps its location. Other rooms writing the same
+        bytes, and every room state that pointed at their copies, are pointed at that location, and the space their
+        copies used is released into self.free_space.
+
+        A room that shared a copy in an earlier build but whose level data has since changed is given space of its own
+        from self.free_space.
+
+        """
+        rooms_by_address = self._get_level_data_writers()
+        for level_data_address, rooms in rooms_by_address.items():
+            shared_level_data = self._get_compressed_level_data(rooms[0])
+            for room in rooms[1:]:
+                level_data = self._get_compressed_level_data(room)
+                if level_data != shared_level_data:
+                    try:
+                        new_address = self.free_space.allocate(len(level_data))
+                    except OutOfFreeSpaceError:
+                        raise OutOfFreeSpaceError(
+                            "Level data of room {0} no longer matches the level data it shares, and there is no free "
+                            "block that can hold its {1} bytes!".format(hex(room.header), len(level_data)))
+                    self._move_level_data(room, level_data_address, new_address, len(level_data), only_room=True)
+
+        level_data_copies = {}  # Compressed level data -> room whose copy of it is kept
+        for level_data_address, rooms in self._get_level_data_writers().items():
+            level_data = self._get_compressed_level_data(rooms[0])
+            kept_room = level_data_copies.setdefault(level_data, rooms[0])
+            if kept_room is rooms[0]:
+                continue
+            released_length = max(room.level_data_length for room in rooms)
+            for room in rooms:
+                self._move_level_data(room,
+                                      level_data_address,
+                                      kept_room.standard_state.level_data_address,
+                                      kept_room.level_data_length)
+            if released_length > 0:
+                self._release_level_data(level_data_address, released_length)
+
+    def _get_level_data_writers(self):
+        """Returns a dict of level data address -> list of the rooms that write level data there, in header order."""
+        rooms_by_address = {}
+        for header_address, room in self.rooms.loaded_items():
+            if room.write_level_data:
+                rooms_by_address.setdefault(room.standard_state.level_data_address, []).append(room)
+        return rooms_by_address
+
+    def _allocate_level_data(self, room, level_data):
+        try:
+            return self.free_space.allocate(len(level_data))
+        except OutOfFreeSpaceError:
+            raise CompressedDataTooLargeError(
+                "Compressed data is {0} bytes, but max size is {1} bytes, and there is no free space large enough "
+                "to move it to!".format(len(level_data), room.level_data_length))
+
+    def _move_level_data(self, room, old_address, new_address, new_length, *, only_room=False):
+        """Points a room's standard state, and every other room state that pointed at old_address, at new_address.
+
+        Args:
+            room (TektonRoom): Room whose level data is being moved. Its level_data_length is set to new_length.
+            old_address (int): PC address the level data is being moved from.
+            new_address (int): PC address the level data is being moved to.
+            new_length (int): Maximum length of the level data at new_address.
+            only_room (bool): Optional. If True, states in other rooms that point at old_address are left alone.
+
+        """
+        for reference in self.references.level_data_references(old_address):
+            if only_room and reference.room is not room:
+                continue
+            reference.source.level_data_address = new_address
+            if reference.source is reference.room.standard_state:
+                reference.room.level_data_length = new_length
+        room.standard_state.level_data_address = new_address
+        room.level_data_length = new_length
+
+    def _write_build_bytes(self, write_data, write_address):
+        """Writes bytes into the modified ROM kept between builds, updating the checksum if it is being kept."""
+        if self._build_checksum is None:
+            overwrite_bytes_in_place(self._build_contents, write_data, write_address)
+            return
+        old_data = bytes(self._build_contents[write_address:write_address + len(write_data)])
+        overwrite_bytes_in_place(self._build_contents, write_data, write_address)
+        self._build_checksum.update(write_address, old_data, write_data)
+
+    def _measure_memory(self, name):
+        """Returns a context manager which records the memory used inside it under name if self.trace_memory is True,
+        and does nothing otherwise."""
+        if not self.trace_memory:
+            return contextlib.nullcontext()
+        return measure_peak_memory(self._memory_measurements, name)
+
+    def _get_source_rom_key(self):
+        source_rom_stat = os.stat(self.source_rom_path)
+        return os.path.abspath(self.source_rom_path), source_rom_stat.st_size, source_rom_stat.st_mtime_ns
+
+    def _import_room(self, room_importer, room_data):
+        room_importer.room_header_address = room_data["header"]
+        new_room = room_importer.import_room_from_rom()
+        new_room.name = room_data["name"]
+        return new_room
+
+
+def _copy_file_contents(source_file, output_file, length):
+    """Copies length bytes from one open file to another, inside the kernel where the platform allows it."""
+    source_fd = source_file.fileno()
+    output_fd = output_file.fileno()
+    copied = 0
+    try:
+        if hasattr(os, "copy_file_range"):
+            while copied < length:
+                chunk_length = os.copy_file_range(source_fd, output_fd, length - copied, copied, copied)
+                if chunk_length == 0:
+                    break
+                copied += chunk_length
+        elif hasattr(os, "sendfile"):
+            while copied < length:
+                chunk_length = os.sendfile(output_fd, source_fd, copied, length - copied)
+                if chunk_length == 0:
+                    break
+                copied += chunk_length
+    except OSError:
+        pass  # e.g. copying between filesystems that do not support it. Fall back to a normal copy.
+
+    if copied < length:
+        source_file.seek(copied)
+        output_file.seek(copied)
+        shutil.copyfileobj(source_file, output_file)
+    output_file.flush()
+
+
+def _write_at_offset(output_file, data, offset):
+    if hasattr(os, "pwrite"):
+        written = 0
+        while written < len(data):
+            written += os.pwrite(output_file.fileno(), data[written:], offset + written)
+    else:
+        output_file.seek(offset)
+        output_file.write(data)
+        output_file.flush()
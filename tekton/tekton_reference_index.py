@@ -0,0 +1,262 @@
+"""Tekton Reference Index
+
+This module implements an index of the pointers between the rooms in a TektonRoomDict and the ROM addresses they point
+at. It answers questions like "which room states use the level data at this address?" or "which doors lead to this
+room?" without scanning every room, which is useful before relocating anything in the ROM.
+
+The index watches the rooms it contains, and the states and doors inside them, and updates itself when a header address,
+level data address, door data address, door target, state or door list changes. Changing a single pointer only moves the
+references from that pointer; the room is reindexed only when its states or doors are replaced.
+
+Classes:
+    TektonReference: Named tuple describing a single pointer from an object in a room to a ROM address.
+    TektonReferenceIndex: Index of TektonReferences, keyed by the address they point at.
+
+"""
+
+from bisect import bisect_left
+from collections import namedtuple
+
+
+TektonReference = namedtuple("TektonReference", ["kind", "address", "room", "source"])
+TektonReference.__doc__ = """A pointer from an object in a room to a PC address in the ROM.
+
+Attributes:
+    kind (str): What the address holds. One of TektonReferenceIndex.LEVEL_DATA, DOOR_DATA, ROOM_HEADER or ROOM_STATE.
+    address (int): PC address being pointed at.
+    room (TektonRoom): The room that contains the pointer.
+    source: The object the pointer belongs to. A TektonRoomState for level data and room states, a TektonDoor or
+        TektonElevatorLaunchpad for door data, and a TektonDoor for room headers.
+"""
+
+
+class TektonReferenceIndex:
+    """An index of every pointer from a set of rooms into the ROM, with constant time lookups by address.
+
+    Rooms are added automatically when they are added to (or loaded by) the TektonRoomDict the index was created with, and
+    removed when they are removed from it. Rooms that were added lazily and never loaded are not in the index.
+
+    Class Attributes:
+        LEVEL_DATA (str): Kind of reference from a room state to its level data.
+        DOOR_DATA (str): Kind of reference from a room's door list to a door's data.
+        ROOM_HEADER (str): Kind of reference from a door to the header of the room it leads to.
+        ROOM_STATE (str): Kind of reference from a room header to one of its room states.
+
+    Attributes:
+        (none)
+
+    """
+    LEVEL_DATA = "level_data"
+    DOOR_DATA = "door_data"
+    ROOM_HEADER = "room_header"
+    ROOM_STATE = "room_state"
+
+    # Attributes which replace the states or doors in a room, so the whole room has to be reindexed
+    _structure_attributes = frozenset(["standard_state", "extra_states", "doors", "room_state"])
+    # Pointer attributes, and the kind of reference they make
+    _pointer_attributes = {"header": ROOM_STATE,
+                           "level_data_address": LEVEL_DATA,
+                           "data_address": DOOR_DATA,
+                           "target_room_id": ROOM_HEADER}
+
+    def __init__(self, room_dict=None):
+        self._references = {self.LEVEL_DATA: {},
+                            self.DOOR_DATA: {},
+                            self.ROOM_HEADER: {},
+                            self.ROOM_STATE: {}}
+        self._room_references = {}  # id(room) -> list of TektonReferences added for that room
+        self._rooms = {}  # id(room) -> room
+        self._watched_objects = {}  # id(room) -> objects inside that room this index observes
+        self._object_rooms = {}  # id(observed object) -> {id(room): room} for every room containing it
+        self._sorted_addresses = None
+
+        if room_dict is not None:
+            for header, room in room_dict.loaded_items():
+                self.add_room(room)
+            room_dict.add_observer(self._room_dict_changed)
+
+    def add_room(self, room):
+        """Adds every pointer in a room to the index, and starts watching the room for changes.
+
+        Args:
+            room (TektonRoom): The room to index.
+
+        """
+        if id(room) in self._rooms:
+            return
+        self._rooms[id(room)] = room
+        room.add_observer(self._object_changed)
+        self._index_room(room)
+
+    def remove_room(self, room):
+        """Removes every pointer in a room from the index, and stops watching the room.
+
+        Args:
+            room (TektonRoom): The room to remove.
+
+        """
+        if id(room) not in self._rooms:
+            return
+        self._unindex_room(room)
+        room.remove_observer(self._object_changed)
+        del self._rooms[id(room)]
+
+    def reindex_room(self, room):
+        """Rebuilds the index entries for a single room. Only needed if the room was changed in a way the index cannot
+        observe, such as editing a list of doors that has been replaced by a plain list outside of the room.
+
+        Args:
+            room (TektonRoom): The room to reindex.
+
+        """
+        if id(room) in self._rooms:
+            self._unindex_room(room)
+            self._index_room(room)
+
+    def get_references(self, kind, address):
+        """Returns every reference of one kind to a single address.
+
+        Args:
+            kind (str): One of LEVEL_DATA, DOOR_DATA, ROOM_HEADER or ROOM_STATE.
+            address (int): PC address being pointed at.
+
+        Returns:
+            list : TektonReferences of the given kind pointing at address.
+
+        """
+        if kind not in self._references:
+            raise ValueError("kind must be one of {}".format(", ".join(self._references.keys())))
+        return list(self._references[kind].get(address, {}).values())
+
+    def level_data_references(self, level_data_address):
+        """list: TektonReferences from room states whose level data is at level_data_address."""
+        return self.get_references(self.LEVEL_DATA, level_data_address)
+
+    def door_data_references(self, door_data_address):
+        """list: TektonReferences from rooms whose door list includes the door data at door_data_address."""
+        return self.get_references(self.DOOR_DATA, door_data_address)
+
+    def room_header_references(self, room_header_address):
+        """list: TektonReferences from doors whose target room has its header at room_header_address."""
+        return self.get_references(self.ROOM_HEADER, room_header_address)
+
+    def room_state_references(self, room_state_address):
+        """list: TektonReferences from room headers to the room state data at room_state_address."""
+        return self.get_references(self.ROOM_STATE, room_state_address)
+
+    def references_in_range(self, start_address, end_address):
+        """Returns every reference of any kind to an address in a range, ordered by address.
+
+        Args:
+            start_address (int): First PC address of the range.
+            end_address (int): PC address just past the end of the range.
+
+        Returns:
+            list : TektonReferences pointing at addresses between start_address and end_address.
+
+        """
+        if self._sorted_addresses is None:
+            all_addresses = set()
+            for references_by_address in self._references.values():
+                all_addresses.update(references_by_address.keys())
+            self._sorted_addresses = sorted(all_addresses)
+
+        range_references = []
+        index = bisect_left(self._sorted_addresses, start_address)
+        while index < len(self._sorted_addresses) and self._sorted_addresses[index] < end_address:
+            address = self._sorted_addresses[index]
+            for references_by_address in self._references.values():
+                range_references.extend(references_by_address.get(address, {}).values())
+            index += 1
+        return range_references
+
+    def _index_room(self, room):
+        room_references = []
+        watched_objects = []
+
+        for room_state_address, room_state in room.room_state_addresses:
+            room_references.append(TektonReference(self.ROOM_STATE, room_state_address, room, room_state))
+            if room_state is not None:
+                room_references.append(TektonReference(self.LEVEL_DATA, room_state.level_data_address,
+                                                       room, room_state))
+                watched_objects.append(room_state)
+        for room_state_pointer in room.extra_states:
+            watched_objects.append(room_state_pointer)
+        for door in room.doors:
+            room_references.append(TektonReference(self.DOOR_DATA, door.data_address, room, door))
+            if hasattr(door, "target_room_id"):
+                room_references.append(TektonReference(self.ROOM_HEADER, door.target_room_id, room, door))
+            watched_objects.append(door)
+
+        for reference in room_references:
+            self._references[reference.kind].setdefault(reference.address, {})[id(reference)] = reference
+        for watched_object in watched_objects:
+            object_rooms = self._object_rooms.setdefault(id(watched_object), {})
+            if not object_rooms:
+                watched_object.add_observer(self._object_changed)
+            object_rooms[id(room)] = room
+
+        self._room_references[id(room)] = room_references
+        self._watched_objects[id(room)] = watched_objects
+        self._sorted_addresses = None
+
+    def _unindex_room(self, room):
+        for reference in self._room_references.pop(id(room), []):
+            references_at_address = self._references[reference.kind][reference.address]
+            del references_at_address[id(reference)]
+            if not references_at_address:
+                del self._references[reference.kind][reference.address]
+        for watched_object in self._watched_objects.pop(id(room), []):
+            object_rooms = self._object_rooms.get(id(watched_object))
+            if object_rooms is None:
+                continue
+            object_rooms.pop(id(room), None)
+            if not object_rooms:
+                del self._object_rooms[id(watched_object)]
+                watched_object.remove_observer(self._object_changed)
+        self._sorted_addresses = None
+
+    def _object_changed(self, changed_object, attribute_name, old_value, new_value):
+        if attribute_name in self._pointer_attributes and old_value is not None and new_value is not None:
+            if old_value != new_value:
+                self._move_references(changed_object, self._pointer_attributes[attribute_name], old_value, new_value)
+            return
+        if attribute_name not in self._structure_attributes and attribute_name not in self._pointer_attributes:
+            return
+        if id(changed_object) in self._rooms:
+            self.reindex_room(changed_object)
+            return
+        for room in list(self._object_rooms.get(id(changed_object), {}).values()):
+            self.reindex_room(room)
+
+    def _move_references(self, changed_object, kind, old_address, new_address):
+        if id(changed_object) in self._rooms:
+            # Room states are stored right after the header, so they all move with it
+            rooms = [changed_object]
+            address_offset = new_address - old_address
+        else:
+            rooms = list(self._object_rooms.get(id(changed_object), {}).values())
+            address_offset = None
+        references_of_kind = self._references[kind]
+        for room in rooms:
+            room_references = self._room_references.get(id(room), [])
+            for i, reference in enumerate(room_references):
+                if reference.kind != kind or (address_offset is None and reference.source is not changed_object):
+                    continue
+                references_at_address = references_of_kind[reference.address]
+                del references_at_address[id(reference)]
+                if not references_at_address:
+                    del references_of_kind[reference.address]
+                moved_reference = reference._replace(address=new_address if address_offset is None
+                                                     else reference.address + address_offset)
+                references_of_kind.setdefault(moved_reference.address, {})[id(moved_reference)] = moved_reference
+                room_references[i] = moved_reference
+        self._sorted_addresses = None
+
+    def _room_dict_changed(self, room_dict, attribute_name, old_value, new_value):
+        if attribute_name not in ("rooms", "loaded_rooms"):
+            return
+        if old_value is not None:
+            self.remove_room(old_value)
+        if new_value is not None:
+            self.add_room(new_value)
@@ -14,7 +14,8 @@ from enum import Enum
 from .tekton_tile import TektonTile
 from .tekton_tile_grid import TektonTileGrid
 from .tekton_compressor import TektonCompressionMapper
-from .tekton_system import pad_bytes, pc_to_lorom
+from .tekton_system import pad_bytes, pc_to_lorom, TektonObservable, TektonObservableList
+from .tekton_trace import trace_span
 from .tekton_room_state import TektonRoomState, TektonRoomLandingStatePointer
 
 
@@ -30,11 +31,15 @@ class MapArea(Enum):
     DEBUG = 0x07
 
 
-class TektonRoom:
+class TektonRoom(TektonObservable):
     """An object representing a single room in Super Metroid, with many different modifiable attributes.
 
+    header_data is cached. While a cached copy exists, the room observes itself and its states, state pointers and doors,
+    and drops the cached copy as soon as anything that is written to the header data changes.
+
     Attributes:
         doors (list): List of TektonDoors objects representing the doors in the room
+        extra_states (list): List of room state pointers for the room's states other than the standard state.
         height_screens (int): The height (in screens) of the room. One screen is 16 tiles.
         level_data_length (int): The maximum length in bytes of this room's compressed level data.
         name (str): The nickname for this room. (This data is not copied to the ROM.)
@@ -43,6 +48,60 @@ class TektonRoom:
         write_level_data (bool): If True, writes data in tiles to modified ROM. If False, does not modify level data.
 
     """
+    _observed_attributes = frozenset(["doors",
+                                      "down_scroller",
+                                      "extra_states",
+                                      "header",
+                                      "height_screens",
+                                      "level_data_length",
+                                      "map_area",
+                                      "minimap_x_coord",
+                                      "minimap_y_coord",
+                                      "name",
+                                      "room_index",
+                                      "special_graphics_bitflag",
+                                      "standard_state",
+                                      "up_scroller",
+                                      "width_screens",
+                                      "write_level_data"])
+
+    # Copies are not in the room dicts this room is in, and do not share its header data cache
+    _uncopied_attributes = TektonObservable._uncopied_attributes | frozenset(["_header_checks",
+                                                                             "_header_data_cache",
+                                                                             "_header_data_watched_objects"])
+
+    # Attributes of the room, its states, state pointers and doors which are written to the header data
+    _header_data_attributes = frozenset(["background_pointer",
+                                         "background_x_scroll",
+                                         "background_y_scroll",
+                                         "data_address",
+                                         "doors",
+                                         "down_scroller",
+                                         "enemy_gfx_pointer",
+                                         "enemy_set_pointer",
+                                         "event_value",
+                                         "extra_states",
+                                         "fx_pointer",
+                                         "header",
+                                         "height_screens",
+                                         "level_data_address",
+                                         "main_asm_pointer",
+                                         "map_area",
+                                         "minimap_x_coord",
+                                         "minimap_y_coord",
+                                         "plm_set_pointer",
+                                         "room_index",
+                                         "room_scrolls_pointer",
+                                         "room_state",
+                                         "setup_asm_pointer",
+                                         "song_play_index",
+                                         "songset",
+                                         "special_graphics_bitflag",
+                                         "standard_state",
+                                         "tileset",
+                                         "unused_pointer",
+                                         "up_scroller",
+                                         "width_screens"])
 
     def __init__(self, width=1, height=1):
         self.doors = []
@@ -62,6 +121,8 @@ class TektonRoom:
         self.write_level_data = True
 
         self._header = 0x00
+        self._header_data_cache = None
+        self._header_data_watched_objects = []
 
     @property
     def header(self):
@@ -76,63 +137,110 @@ class TektonRoom:
             )
         if new_header < 0:
             raise ValueError("Room header address must be a positive number.")
+        # Set by each TektonRoomDict containing this room, so a header already in use is refused before it is assigned
+        for header_check in self.__dict__.get("_header_checks", ()):
+            header_check(self, new_header)
         self._header = new_header
 
     @property
-    def tiles(self):
-        raise ValueError("This attribute has been removed.")
+    def doors(self):
+        """list: Get or set the TektonDoor and TektonElevatorLaunchpad objects for the doors in this room."""
+        return self._doors
 
-    @property
-    def header_data(self):
-        header_bytes = self.room_index.to_bytes(1, byteorder="little")
-        header_bytes += self.map_area.value.to_bytes(1, byteorder="little")
-        header_bytes += self.minimap_x_coord.to_bytes(1, byteorder="little")
-        header_bytes += self.minimap_y_coord.to_bytes(1, byteorder="little")
-        header_bytes += self.width_screens.to_bytes(1, byteorder="little")
-        header_bytes += self.height_screens.to_bytes(1, byteorder="little")
-        header_bytes += self.up_scroller.to_bytes(1, byteorder="little")
-        header_bytes += self.down_scroller.to_bytes(1, byteorder="little")
-        header_bytes += self.special_graphics_bitflag.to_bytes(1, byteorder="little")
-        header_bytes += (self._get_door_pointer_list_address() % 0x10000).to_bytes(2, byteorder="little")
-
-
-        for room_state_pointer in self.extra_states:
-            header_bytes += room_state_pointer.pointer_code
-            if not isinstance(room_state_pointer, TektonRoomLandingStatePointer):
-                header_bytes += room_state_pointer.event_value.to_bytes(1, byteorder="little")
-            header_bytes += (self._get_room_state_address(room_state_pointer) % 0x10000).to_bytes(2, byteorder="little")
+    @doors.setter
+    def doors(self, new_doors):
+        self._doors = TektonObservableList(self, "doors", new_doors)
 
-        header_bytes += b'\xe6\xe5'
-        header_bytes += self._get_room_state_header_data(self.standard_state)
-
-        for room_state_pointer in self.extra_states:
-            header_bytes += self._get_room_state_header_data(room_state_pointer.room_state)
+    @property
+    def extra_states(self):
+        """list: Get or set the room state pointers for this room's states, other than the standard state."""
+        return self._extra_states
 
+    @extra_states.setter
+    def extra_states(self, new_extra_states):
+        self._extra_states = TektonObservableList(self, "extra_states", new_extra_states)
 
+    @property
+    def tiles(self):
+        raise ValueError("This attribute has been removed.")
 
-        for door in self.doors:
-            header_bytes += (door.data_address % 0x10000).to_bytes(2, byteorder="little")
+    @property
+    def dirty(self):
+        """bool: True if this room, or any of its states, state pointers, doors or tile grids, has changed since the last
+        call to mark_clean."""
+        if super(TektonRoom, self).dirty:
+            return True
+        return any(tracked_object.dirty for tracked_object in self._get_tracked_objects())
+
+    def mark_clean(self):
+        """Clears the dirty flag on this room and on all of its states, state pointers, doors and tile grids."""
+        super(TektonRoom, self).mark_clean()
+        for tracked_object in self._get_tracked_objects():
+            tracked_object.mark_clean()
 
-        return header_bytes
+    @property
+    def header_data(self):
+        """bytes: The room's header data as it is written to the ROM at its header address, including every state and the
+        door pointer list."""
+        header_data_cache = self.__dict__.get("_header_data_cache")
+        if header_data_cache is None:
+            header_data_cache = self._get_header_data()
+            self._header_data_cache = header_data_cache
+            self._watch_header_data_objects()
+        return header_data_cache
 
-    def compressed_level_data(self, room_state):
+    @property
+    def room_state_addresses(self):
+        """list: (PC address, TektonRoomState) tuples giving where each of this room's states is written in the header
+        data, starting with the standard state."""
+        standard_state_address = self.header + 11 + self._get_room_state_pointers_list_length() + 2
+        state_addresses = [(standard_state_address, self.standard_state)]
+        for i, room_state_pointer in enumerate(self.extra_states):
+            state_addresses.append((standard_state_address + 26 + (i * 26), room_state_pointer.room_state))
+        return state_addresses
+
+    def compressed_level_data(self, room_state, *, fit_to_length=True):
         """Returns compressed level data which the Super Metroid ROM can understand.
 
+        Args:
+            room_state (TektonRoomState): The room state whose tiles should be compressed.
+            fit_to_length (bool): Optional. If False, the compressed data is returned as-is, without being padded to or
+                checked against level_data_length. Defaults to True.
+
         Returns:
             bytes : The string of compressed level data representing the room's tiles.
 
         """
-        compressor = TektonCompressionMapper()
-        compressor.width_screens = self.width_screens
-        compressor.height_screens = self.height_screens
-        compressor.uncompressed_data = room_state.tiles.uncompressed_data
-        compressed_data = compressor.compressed_data
+        with trace_span("compressed_level_data", header=self.header) as span:
+            compressor = TektonCompressionMapper()
+            compressor.width_screens = self.width_screens
+            compressor.height_screens = self.height_screens
+            compressor.uncompressed_data = room_state.tiles.uncompressed_data
+            compressed_data = compressor.compressed_data
+            span.set(uncompressed_bytes=len(compressor.uncompressed_data), compressed_bytes=len(compressed_data))
+        if not fit_to_length:
+            return compressed_data
         if 0 < self.level_data_length < len(compressed_data):
             raise CompressedDataTooLargeError(
                 "Compressed data is {0} bytes, but max size is {1} bytes!".format(len(compressed_data),
                                                                                   self.level_data_length))
         return pad_bytes(compressed_data, self.level_data_length, b'\xff')
 
+    def _get_tracked_objects(self):
+        tracked_objects = []
+        room_states = [self.standard_state]
+        for room_state_pointer in self.extra_states:
+            tracked_objects.append(room_state_pointer)
+            room_states.append(room_state_pointer.room_state)
+        for room_state in room_states:
+            if room_state is None:
+                continue
+            tracked_objects.append(room_state)
+            if room_state.tiles is not None:
+                tracked_objects.append(room_state.tiles)
+        tracked_objects.extend(self.doors)
+        return tracked_objects
+
     def _get_room_state_pointers_list_length(self):
         room_state_pointers_length = 0
         for room_state_pointer in self.extra_states:
@@ -143,18 +251,61 @@ class TektonRoom:
 
         return room_state_pointers_length
 
-    def _get_room_state_address(self, room_state_pointer):
-        state_pointer_number = 0
-        for i in range(len(self.extra_states)):
-            if self.extra_states[i] == room_state_pointer:
-                state_pointer_number = i
-                break;
-
-        return self.header + 11 + self._get_room_state_pointers_list_length() + 28 + ((state_pointer_number) * 26)
-
     def _get_door_pointer_list_address(self):
         return self.header + 11 + self._get_room_state_pointers_list_length() + 28 + (len(self.extra_states) * 26)
 
+    def _get_header_data(self):
+        # The standard state follows the state pointer list and its $E5E6 terminator, each extra state follows the one
+        # before it, and the door pointer list follows the last state.
+        standard_state_address = self.header + 11 + self._get_room_state_pointers_list_length() + 2
+        door_pointer_list_address = standard_state_address + 26 * (len(self.extra_states) + 1)
+
+        header_parts = [bytes([self.room_index,
+                               self.map_area.value,
+                               self.minimap_x_coord,
+                               self.minimap_y_coord,
+                               self.width_screens,
+                               self.height_screens,
+                               self.up_scroller,
+                               self.down_scroller,
+                               self.special_graphics_bitflag]),
+                        (door_pointer_list_address % 0x10000).to_bytes(2, byteorder="little")]
+
+        for i, room_state_pointer in enumerate(self.extra_states):
+            header_parts.append(room_state_pointer.pointer_code)
+            if not isinstance(room_state_pointer, TektonRoomLandingStatePointer):
+                header_parts.append(room_state_pointer.event_value.to_bytes(1, byteorder="little"))
+            room_state_address = standard_state_address + 26 * (i + 1)
+            header_parts.append((room_state_address % 0x10000).to_bytes(2, byteorder="little"))
+
+        header_parts.append(b'\xe6\xe5')
+        header_parts.append(self._get_room_state_header_data(self.standard_state))
+        for room_state_pointer in self.extra_states:
+            header_parts.append(self._get_room_state_header_data(room_state_pointer.room_state))
+
+        for door in self.doors:
+            header_parts.append((door.data_address % 0x10000).to_bytes(2, byteorder="little"))
+
+        return b''.join(header_parts)
+
+    def _watch_header_data_objects(self):
+        watched_objects = [self, self.standard_state]
+        for room_state_pointer in self.extra_states:
+            watched_objects.append(room_state_pointer)
+            watched_objects.append(room_state_pointer.room_state)
+        watched_objects.extend(self.doors)
+        for watched_object in watched_objects:
+            watched_object.add_observer(self._header_data_object_changed)
+        self._header_data_watched_objects = watched_objects
+
+    def _header_data_object_changed(self, changed_object, attribute_name, old_value, new_value):
+        if attribute_name not in self._header_data_attributes:
+            return
+        for watched_object in self.__dict__.get("_header_data_watched_objects", []):
+            watched_object.remove_observer(self._header_data_object_changed)
+        self._header_data_watched_objects = []
+        self._header_data_cache = None
+
     def _get_room_state_header_data(self, room_state):
         room_state_header_data = pc_to_lorom(room_state.level_data_address, byteorder="little")
         room_state_header_data += room_state.tileset.value.to_bytes(1, byteorder="little")
@@ -3,25 +3,63 @@
 This module implements an object that stores and organizes the rooms in a Tekton project. Rooms are indexed by their
 header addresses. For convenience, you can add a room without explicitly referencing its index.
 
+Rooms can also be added lazily, as a header address and a function that creates the room. The room is only created the
+first time it is looked up, so rooms that are never used are never parsed.
+
+The rooms are also indexed by map area, name, and the tilesets and songsets of all their states, so the rooms matching
+several of these can be found with query without checking every room and state.
+
 Classes:
     TektonRoomDict: Dictionary-like object that sorts and organizes TektonRoom objects.
     DuplicateRoomError: Exception raised when the user tries to add a new room whose header already exists
 
 """
 
-class TektonRoomDict:
+from .tekton_system import TektonObservable
+
+
+class TektonRoomDict(TektonObservable):
     """A dictionary-like object that sorts and organizes TektonRoom objects.
 
+    Rooms are kept in a dict keyed by header address, so looking up, adding and removing a room take constant time. The
+    sorted list of header addresses is only rebuilt when a room is added or removed, or a room's header changes. The
+    TektonRoomDict watches each room's header attribute, so a room whose header is changed after it is added can be
+    looked up by its new header. Setting a room's header to one already used by another room in the TektonRoomDict
+    raises DuplicateRoomError, and leaves the header unchanged.
+
+    Loaded rooms are also indexed by the fields in INDEXED_FIELDS. A room is indexed under the tileset and songset of its
+    standard state and of every extra state. The indexes are updated when a room is added, removed or loaded, and when
+    an indexed field, a room's states, or a state pointer's state changes.
+
+    Observers added with add_observer are called with (room_dict, "rooms", None, new_room) whenever a room is added, with
+    (room_dict, "rooms", old_room, None) whenever a room is removed, and with (room_dict, "loaded_rooms", None, new_room)
+    whenever a lazily added room is loaded.
+
+    Class Attributes:
+        INDEXED_FIELDS (tuple): Names of the fields that can be passed to query.
+
     Attributes:
         (none)
     """
+    INDEXED_FIELDS = ("map_area", "name", "songset", "tileset")
+
+    _indexed_room_attributes = frozenset(["extra_states", "map_area", "name", "standard_state"])
+    _indexed_state_attributes = frozenset(["room_state", "songset", "tileset"])
 
     def __init__(self):
-        self._rooms = []
+        self._rooms = {}  # Header address -> TektonRoom, for every loaded room
+        self._room_loaders = {}  # Header address -> room loader, for every room which has not been loaded yet
+        self._sorted_keys = None  # Sorted header addresses of every room, or None if they need sorting again
+        self._indexes = {field: {} for field in self.INDEXED_FIELDS}  # Field -> value -> {id(room): room}
+        self._room_index_values = {}  # id(room) -> {field: set of values the room is indexed under}
+        self._watched_states = {}  # id(room) -> states and state pointers in that room this dict observes
+        self._state_rooms = {}  # id(state or state pointer) -> {id(room): room} for every room containing it
 
     def __getitem__(self, item):
         """Returns a TektonRoom whose header attribute matches the item arg, or None if no such room exists.
 
+        If the room was added with add_lazy_room and has not been loaded yet, it is loaded now.
+
         Args:
             item (int): Header address of the room you want.
 
@@ -30,11 +68,21 @@ class TektonRoomDict:
 
         """
 
-        for room in self._rooms:
-            if room.header == item:
-                return room
+        room = self._rooms.get(item)
+        if room is not None:
+            return room
+        if item in self._room_loaders:
+            return self._load_room(item)
         return None
 
+    def __contains__(self, item):
+        """Returns True if there is a room with the header address item, whether or not it has been loaded."""
+        return item in self._rooms or item in self._room_loaders
+
+    def __len__(self):
+        """Returns the number of rooms, including rooms which have not been loaded yet."""
+        return len(self._rooms) + len(self._room_loaders)
+
     def add_room(self, new_room):
         """Adds a room to the TektonRoomDict.
 
@@ -46,20 +94,81 @@ class TektonRoomDict:
 
         """
 
-        if new_room.header in self.keys():
+        if new_room.header in self:
             raise DuplicateRoomError(
                 "There is already a room with header {} in the project!".format(hex(new_room.header))
             )
-        self._rooms.append(new_room)
+        self._insert_room(new_room)
+        self._sorted_keys = None
+        self._notify_observers("rooms", None, new_room)
+
+    def remove_room(self, header):
+        """Removes a room from the TektonRoomDict. Rooms which were added lazily and never loaded are removed without
+        being loaded.
+
+        Args:
+            header (int): Header address of the room to remove.
+
+        Returns:
+            TektonRoom : The room that was removed, or None if it had not been loaded.
+
+        """
+
+        if header in self._room_loaders:
+            del self._room_loaders[header]
+            self._sorted_keys = None
+            return None
+        if header not in self._rooms:
+            raise KeyError("There is no room with header {} in the project!".format(hex(header)))
+        room = self._rooms.pop(header)
+        room.remove_observer(self._room_changed)
+        room.__dict__["_header_checks"].remove(self._check_header)
+        self._unindex_room(room)
+        self._sorted_keys = None
+        self._notify_observers("rooms", room, None)
+        return room
+
+    def add_lazy_room(self, header, room_loader):
+        """Adds a room to the TektonRoomDict without creating it.
+
+        room_loader is called with no arguments the first time the room is looked up, and must return a TektonRoom whose
+        header matches the header arg. If the TektonRoomDict already contains a room with the same header address, this
+        function will raise a DuplicateRoomError.
+
+        Args:
+            header (int): Header address of the room.
+            room_loader (callable): Function that returns the TektonRoom for this header.
+
+        """
+
+        if header in self:
+            raise DuplicateRoomError(
+                "There is already a room with header {} in the project!".format(hex(header))
+            )
+        self._room_loaders[header] = room_loader
+        self._sorted_keys = None
+
+    def is_loaded(self, header):
+        """Returns True if the room with this header address has been created, otherwise False.
+
+        Args:
+            header (int): Header address of the room.
+
+        Returns:
+            bool : False if the room was added with add_lazy_room and has not been looked up yet, otherwise True.
+        """
+
+        return header not in self._room_loaders
 
     def keys(self):
-        """Returns a sorted list of header addresses for rooms in this TektonRoomDict.
+        """Returns a sorted list of header addresses for rooms in this TektonRoomDict, including rooms that have not been
+        loaded yet.
 
         Returns:
             list : Header addresses of all the rooms in this TektonRoomDict.
         """
 
-        return sorted([room.header for room in self._rooms])
+        return list(self._get_sorted_keys())
 
     def items(self):
         """Returns the header addresses and TektonRoom objects from this dict as key-value pairs.
@@ -68,17 +177,159 @@ class TektonRoomDict:
             iterable : Iterator yielding a typle of (header address, TektonRoom object)
         """
 
-        for key in self.keys():
+        for key in self._get_sorted_keys():
             yield key, self[key]
 
+    def loaded_items(self):
+        """Returns the header addresses and TektonRoom objects of rooms which have already been loaded, without loading
+        any others.
+
+        Returns:
+            iterable : Iterator yielding a tuple of (header address, TektonRoom object), sorted by header address.
+        """
+
+        for key in self._get_sorted_keys():
+            room = self._rooms.get(key)
+            if room is not None:
+                yield key, room
+
     def values(self):
-        """Returns the TektonRoom objects from this dict as a list of values.
+        """Returns the TektonRoom objects from this dict as a list of values. Loads any rooms which have not been loaded
+        yet.
 
         Returns:
             list : List containing all the TektonRoom objects in this TektonRoomDict.
         """
 
-        return self._rooms
+        self._load_all_rooms()
+        return list(self._rooms.values())
+
+    def query(self, **criteria):
+        """Returns the rooms that match every criterion, using the indexes instead of checking every room. Loads any
+        rooms which have not been loaded yet.
+
+        For example, query(map_area=MapArea.NORFAIR, tileset=TileSet.NORFAIR_RED_RIDLEY) returns the Norfair rooms
+        with at least one state that uses the NORFAIR_RED_RIDLEY tileset.
+
+        Args:
+            **criteria: Values to match, keyed by field name. Each field must be one of INDEXED_FIELDS. A room matches
+                tileset or songset if any of its states uses that value.
+
+        Returns:
+            list : Matching TektonRoom objects, sorted by header address. If no criteria are given, every room.
+        """
+
+        for field in criteria.keys():
+            if field not in self.INDEXED_FIELDS:
+                raise ValueError("Query fields must be one of {}".format(", ".join(self.INDEXED_FIELDS)))
+        self._load_all_rooms()
+
+        if not criteria:
+            return [room for key, room in self.loaded_items()]
+        matches = sorted([self._indexes[field].get(value, {}) for field, value in criteria.items()], key=len)
+        matching_ids = set(matches[0].keys()).intersection(*matches[1:])
+        return sorted([matches[0][room_id] for room_id in matching_ids], key=lambda room: room.header)
+
+    def _get_sorted_keys(self):
+        if self._sorted_keys is None:
+            self._sorted_keys = sorted(list(self._rooms.keys()) + list(self._room_loaders.keys()))
+        return self._sorted_keys
+
+    def _insert_room(self, room):
+        self._rooms[room.header] = room
+        room.add_observer(self._room_changed)
+        room.__dict__.setdefault("_header_checks", []).append(self._check_header)
+        self._index_room(room)
+
+    def _load_all_rooms(self):
+        for header in list(self._room_loaders.keys()):
+            self._load_room(header)
+
+    def _index_room(self, room):
+        index_values = {"map_area": {room.map_area},
+                        "name": {room.name},
+                        "songset": set(),
+                        "tileset": set()}
+        watched_states = []
+
+        room_states = []
+        if room.standard_state is not None:
+            room_states.append(room.standard_state)
+        for room_state_pointer in room.extra_states:
+            watched_states.append(room_state_pointer)
+            if room_state_pointer.room_state is not None:
+                room_states.append(room_state_pointer.room_state)
+        for room_state in room_states:
+            index_values["songset"].add(room_state.songset)
+            index_values["tileset"].add(room_state.tileset)
+            watched_states.append(room_state)
+
+        for field, values in index_values.items():
+            for value in values:
+                self._indexes[field].setdefault(value, {})[id(room)] = room
+        for watched_state in watched_states:
+            state_rooms = self._state_rooms.setdefault(id(watched_state), {})
+            if not state_rooms:
+                watched_state.add_observer(self._state_changed)
+            state_rooms[id(room)] = room
+
+        self._room_index_values[id(room)] = index_values
+        self._watched_states[id(room)] = watched_states
+
+    def _unindex_room(self, room):
+        for field, values in self._room_index_values.pop(id(room), {}).items():
+            for value in values:
+                rooms_with_value = self._indexes[field][value]
+                del rooms_with_value[id(room)]
+                if not rooms_with_value:
+                    del self._indexes[field][value]
+        for watched_state in self._watched_states.pop(id(room), []):
+            state_rooms = self._state_rooms.get(id(watched_state))
+            if state_rooms is None:
+                continue
+            state_rooms.pop(id(room), None)
+            if not state_rooms:
+                del self._state_rooms[id(watched_state)]
+                watched_state.remove_observer(self._state_changed)
+
+    def _reindex_room(self, room):
+        self._unindex_room(room)
+        self._index_room(room)
+
+    def _load_room(self, header):
+        new_room = self._room_loaders[header]()
+        # The sorted keys already include this header, so they stay correct as long as the room really uses it
+        if new_room.header != header:
+            raise ValueError("Room loader for header {} returned a room with header {}.".format(hex(header),
+                                                                                          hex(new_room.header)))
+        del self._room_loaders[header]
+        self._insert_room(new_room)
+        self._notify_observers("loaded_rooms", None, new_room)
+        return new_room
+
+    def _room_changed(self, room, attribute_name, old_value, new_value):
+        if attribute_name in self._indexed_room_attributes:
+            self._reindex_room(room)
+            return
+        if attribute_name != "header" or self._rooms.get(old_value) is not room:
+            return
+        del self._rooms[old_value]
+        self._rooms[new_value] = room
+        self._sorted_keys = None
+
+    def _check_header(self, room, new_header):
+        """Called by a room in this dict before its header is changed. Raises DuplicateRoomError if another room in
+        this dict already uses new_header."""
+        if new_header != room.header and new_header in self:
+            raise DuplicateRoomError(
+                "There is already a room with header {} in the project!".format(hex(new_header))
+            )
+
+    def _state_changed(self, changed_state, attribute_name, old_value, new_value):
+        if attribute_name not in self._indexed_state_attributes:
+            return
+        for room in list(self._state_rooms.get(id(changed_state), {}).values()):
+            self._reindex_room(room)
 
 
 class DuplicateRoomError(Exception):
@@ -3,18 +3,23 @@
 This module implements functions which can read room data from the Super Metroid ROM and populate TektonRoom objects
 with that data.
 
+A TektonRoomImporter keeps every door and room state it parses, keyed by ROM address. Importing several rooms with the
+same importer returns the same object each time an address is seen again, instead of parsing it again.
+
 Functions:
     import_room_from_rom: Populates a TektonRoom object using the ROM contents and a level header address
     import_door: Reads door data from ROM contents and returns an object populated with the door's attributes.
+    get_room_state_address: Returns the address a room state was parsed from.
 
 """
 
+from .tekton_address_space import get_address_space
 from .tekton_room import TektonRoom, MapArea
-from .tekton_system import lorom_to_pc
 from .tekton_door import TektonDoor, TektonElevatorLaunchpad, DoorBitFlag, DoorEjectDirection
 from .tekton_room_state import TektonRoomState, TektonRoomEventStatePointer, TektonRoomLandingStatePointer, \
     TektonRoomFlywayStatePointer, TileSet, SongSet, SongPlayIndex
 from .tekton_tile_grid import TektonTileGrid
+from .tekton_trace import get_tracer, trace_span
 
 
 class TektonRoomImporter:
@@ -25,10 +30,14 @@ class TektonRoomImporter:
 
     def __init__(self):
         self.rom_contents = b''
-        
+
+        self._address_space = get_address_space()
+        self._door_cache = {}
         self._level_data_addresses = {}
         self._room_header_address = 0
         self._room_height_screens = 1
+        self._room_state_addresses = {}  # id(room state) -> address it was parsed from
+        self._room_state_cache = {}
         self._room_width_screens = 1
 
     @property
@@ -55,6 +64,21 @@ class TektonRoomImporter:
             raise TypeError("Room header address must be of type int. "
                             "You can specify it in hex notation, e.g. 0x795d4")
 
+        if get_tracer() is None:
+            return self._read_room_from_rom()
+
+        with trace_span("import_room_from_rom", header=self.room_header_address) as span:
+            cached_door_count = len(self._door_cache)
+            cached_room_state_count = len(self._room_state_cache)
+            new_room = self._read_room_from_rom()
+            span.set(state_count=len(new_room.extra_states) + 1,
+                     door_count=len(new_room.doors),
+                     door_cache_hits=len(new_room.doors) - (len(self._door_cache) - cached_door_count),
+                     room_state_cache_hits=len(new_room.extra_states) + 1 -
+                     (len(self._room_state_cache) - cached_room_state_count))
+        return new_room
+
+    def _read_room_from_rom(self):
         self._room_width_screens = self._get_int_from_rom(self.room_header_address + 4, 1)
         self._room_height_screens = self._get_int_from_rom(self.room_header_address + 5, 1)
 
@@ -108,6 +132,8 @@ class TektonRoomImporter:
         Args:
             door_info_address (int): The PC address in rom_contents where the door data begins
 
+        If this importer has already imported a door at door_info_address, the same object is returned again.
+
         Returns:
             Mixed : TektonDoor or TektonElevatorLaunchpad object representing all the attributes of the specified door.
 
@@ -119,12 +145,36 @@ class TektonRoomImporter:
         if door_info_address < 0:
             raise ValueError("door_info_address must be a positive integer.")
 
+        if door_info_address in self._door_cache:
+            return self._door_cache[door_info_address]
+
         door_target_room_id_bytes = self.rom_contents[door_info_address:door_info_address + 2]
 
         if door_target_room_id_bytes == b'\x00\x00':  # Special "doors" with no targets are used for elevators to rest on
-            return self._import_elevator_launchpad(door_info_address)
+            new_door = self._import_elevator_launchpad(door_info_address)
+        else:
+            new_door = self._import_simple_door(door_info_address)
+
+        self._door_cache[door_info_address] = new_door
+        return new_door
+
+    def clear_cache(self):
+        """Forgets every door and room state this importer has parsed, so the next import parses them again."""
+        self._door_cache = {}
+        self._room_state_addresses = {}
+        self._room_state_cache = {}
 
-        return self._import_simple_door(door_info_address)
+    def get_room_state_address(self, room_state):
+        """Returns the PC address a room state was parsed from by this importer.
+
+        Args:
+            room_state (TektonRoomState): A room state returned by this importer.
+
+        Returns:
+            int : PC address of the room state's data, or None if this importer did not parse it.
+
+        """
+        return self._room_state_addresses.get(id(room_state))
 
     def _get_door_data_addresses(self):
         door_pointer_list_address = int.from_bytes(
@@ -132,24 +182,16 @@ class TektonRoomImporter:
             byteorder="little"
         )
         door_pointer_list_address += 0x70000  # Door pointer list is always in bank $8E
-        door_addresses = []
+        door_pointer_addresses = []
 
         for offset in range(0, 16, 2):
             start_pos = door_pointer_list_address + offset
-            end_pos = start_pos + 2
-            current_door_bytes = self.rom_contents[start_pos:end_pos]
-            if current_door_bytes == b'\x00\x00':
-                break
-            current_door_bytes += b'\x83'  # Super Metroid assumes all door data lives in bank $83.
-            try:
-                pc_door_data_address = lorom_to_pc(current_door_bytes, byteorder="little")
-            except ValueError:
+            if self.rom_contents[start_pos:start_pos + 2] == b'\x00\x00':
                 break
-            except Exception as e:
-                raise e
-            door_addresses.append(pc_door_data_address)
+            door_pointer_addresses.append(start_pos)
 
-        return door_addresses
+        # Super Metroid assumes all door data lives in bank $83.
+        return self._address_space.read_pointers(self.rom_contents, door_pointer_addresses, bank=0x83)
 
     def _get_room_state_pointer_at_address(self, room_state_pointer_address):
         new_state_pointer = None
@@ -190,11 +232,15 @@ class TektonRoomImporter:
         return new_flyway_state_pointer
 
     def _get_room_state_at_address(self, room_state_address):
+        if room_state_address in self._room_state_cache:
+            cached_state = self._room_state_cache[room_state_address]
+            self._level_data_addresses.setdefault(cached_state.level_data_address, cached_state.tiles)
+            return cached_state
+
         new_state = TektonRoomState()
 
         # Level data addresses are stored in LoROM and are little endian
-        level_lorom_address = self.rom_contents[room_state_address + 0:room_state_address + 3]
-        new_state.level_data_address = lorom_to_pc(level_lorom_address, byteorder="little")
+        new_state.level_data_address = self._address_space.lorom_to_pc(self._get_int_from_rom(room_state_address, 3))
 
         new_state.tileset = TileSet(self._get_int_from_rom(room_state_address+3, 1))
         new_state.songset = SongSet(self._get_int_from_rom(room_state_address+4, 1))
@@ -217,6 +263,8 @@ class TektonRoomImporter:
             new_state.tiles = self._get_empty_tile_data_for_room()
             self._level_data_addresses[new_state.level_data_address] = new_state.tiles
 
+        self._room_state_cache[room_state_address] = new_state
+        self._room_state_addresses[id(new_state)] = room_state_address
         return new_state
 
     def _get_empty_tile_data_for_room(self):
@@ -234,9 +282,8 @@ class TektonRoomImporter:
             int : PC address of the farside room's level header data.
 
         """
-        target_room_id_address = self.rom_contents[door_info_address:door_info_address + 2]
-        target_room_id_address += b'\x8f'  # Super Metroid assumes all target rooms will have headers in bank $8F.
-        return lorom_to_pc(target_room_id_address, byteorder="little")
+        # Super Metroid assumes all target rooms will have headers in bank $8F.
+        return self._address_space.bank_pointer_to_pc(self._get_int_from_rom(door_info_address, 2), 0x8f)
 
     def _import_simple_door(self, door_info_address):
         """Reads door info data from the source ROM and converts it into a TektonDoor object.
@@ -0,0 +1,320 @@
+"""Tekton Room Record
+
+This module implements compact, plain-data records for TektonRoom objects, and functions to convert rooms to and from
+those records. Records contain only ints, bytes, strings and tuples, so they are cheap to send between processes and
+contain nothing that needs pickle-specific support.
+
+Records do not contain tile data. When a room is rebuilt from a record, each distinct level data address gets a single
+empty TektonTileGrid, the same way TektonRoomImporter shares grids between room states.
+
+Classes:
+    TektonRoomRecord: Named tuple holding the attributes of a TektonRoom.
+    TektonRoomStateRecord: Named tuple holding the attributes of a TektonRoomState.
+    TektonRoomStatePointerRecord: Named tuple holding the kind and event value of a room state pointer.
+    TektonDoorRecord: Named tuple holding the attributes of a TektonDoor or TektonElevatorLaunchpad.
+
+Functions:
+    room_to_record: Converts a TektonRoom into a TektonRoomRecord.
+    room_from_record: Converts a TektonRoomRecord into a new TektonRoom.
+    copy_room: Creates a copy of a TektonRoom which shares the original's tile grids.
+    copy_door: Creates a copy of a TektonDoor or TektonElevatorLaunchpad.
+
+"""
+
+from collections import namedtuple
+
+from .tekton_room import TektonRoom, MapArea
+from .tekton_door import TektonDoor, TektonElevatorLaunchpad, DoorBitFlag, DoorEjectDirection
+from .tekton_room_state import TektonRoomState, TektonRoomEventStatePointer, TektonRoomLandingStatePointer, \
+    TektonRoomFlywayStatePointer, TileSet, SongSet, SongPlayIndex
+from .tekton_tile_grid import TektonTileGrid
+
+
+TektonRoomRecord = namedtuple("TektonRoomRecord", ["header",
+                                                   "name",
+                                                   "room_index",
+                                                   "map_area",
+                                                   "minimap_x_coord",
+                                                   "minimap_y_coord",
+                                                   "width_screens",
+                                                   "height_screens",
+                                                   "up_scroller",
+                                                   "down_scroller",
+                                                   "special_graphics_bitflag",
+                                                   "level_data_length",
+                                                   "write_level_data",
+                                                   "standard_state",
+                                                   "extra_states",
+                                                   "doors"])
+
+TektonRoomStateRecord = namedtuple("TektonRoomStateRecord", ["level_data_address",
+                                                             "tileset",
+                                                             "songset",
+                                                             "song_play_index",
+                                                             "fx_pointer",
+                                                             "enemy_set_pointer",
+                                                             "enemy_gfx_pointer",
+                                                             "background_x_scroll",
+                                                             "background_y_scroll",
+                                                             "room_scrolls_pointer",
+                                                             "unused_pointer",
+                                                             "main_asm_pointer",
+                                                             "plm_set_pointer",
+                                                             "background_pointer",
+                                                             "setup_asm_pointer",
+                                                             "data_address"],
+                                   defaults=(None,))
+
+TektonRoomStatePointerRecord = namedtuple("TektonRoomStatePointerRecord", ["pointer_code",
+                                                                           "event_value",
+                                                                           "room_state"])
+
+TektonDoorRecord = namedtuple("TektonDoorRecord", ["data_address",
+                                                   "target_room_id",
+                                                   "bit_flag",
+                                                   "eject_direction",
+                                                   "target_door_cap_col",
+                                                   "target_door_cap_row",
+                                                   "target_room_screen_h",
+                                                   "target_room_screen_v",
+                                                   "distance_to_spawn",
+                                                   "asm_pointer",
+                                                   "launchpad_data"])
+
+_state_pointer_classes = {b'\x12\xe6': TektonRoomEventStatePointer,
+                          b'\x69\xe6': TektonRoomLandingStatePointer,
+                          b'\x29\xe6': TektonRoomFlywayStatePointer}
+
+
+def room_to_record(room, *, state_address=None):
+    """Converts a TektonRoom into a TektonRoomRecord containing only plain values.
+
+    Args:
+        room (TektonRoom): The room to convert.
+        state_address (callable): Optional. Function called with each TektonRoomState that returns the PC address it
+            was read from, or None, e.g. TektonRoomImporter.get_room_state_address. The address is stored in the state's
+            record so room_from_record can intern the state.
+
+    Returns:
+        TektonRoomRecord : Record holding every attribute of the room except its tile data.
+
+    """
+    extra_states = []
+    for room_state_pointer in room.extra_states:
+        extra_states.append(TektonRoomStatePointerRecord(room_state_pointer.pointer_code,
+                                                         getattr(room_state_pointer, "event_value", None),
+                                                         _room_state_to_record(room_state_pointer.room_state,
+                                                                               state_address)))
+
+    return TektonRoomRecord(room.header,
+                            room.name,
+                            room.room_index,
+                            room.map_area.value,
+                            room.minimap_x_coord,
+                            room.minimap_y_coord,
+                            room.width_screens,
+                            room.height_screens,
+                            room.up_scroller,
+                            room.down_scroller,
+                            room.special_graphics_bitflag,
+                            room.level_data_length,
+                            room.write_level_data,
+                            _room_state_to_record(room.standard_state, state_address),
+                            tuple(extra_states),
+                            tuple(_door_to_record(door) for door in room.doors))
+
+
+def room_from_record(record, interned_doors=None, interned_room_states=None):
+    """Creates a new TektonRoom from a TektonRoomRecord.
+
+    Room states which share a level data address also share a single, empty TektonTileGrid.
+
+    If interned_doors is given, it is used as a table of doors keyed by data address. Doors whose address is already in
+    the table are reused rather than created again, and new doors are added to it. Passing the same table to several
+    calls gives one door object per ROM location across all of those rooms.
+
+    interned_room_states works the same way for room states whose records have a data_address (see room_to_record), so
+    a set of rooms rebuilt from records shares room states the same way as rooms imported by one TektonRoomImporter.
+
+    Args:
+        record (TektonRoomRecord): The record to convert.
+        interned_doors (dict): Optional. Doors already created, keyed by data address.
+        interned_room_states (dict): Optional. Room states already created, keyed by data address.
+
+    Returns:
+        TektonRoom : New room populated with the values in the record.
+
+    """
+    return _room_from_record(record, interned_doors, {}, interned_room_states)
+
+
+def copy_room(room, interned_doors=None):
+    """Creates a copy of a TektonRoom, its states and its doors, which can be changed without changing the original.
+
+    Tile grids are not copied. Each state of the copy uses the same TektonTileGrid as the matching state of the original,
+    so assign a new grid to a state before changing its tiles. The copy has no observers.
+
+    Args:
+        room (TektonRoom): The room to copy.
+        interned_doors (dict): Optional. Doors already created, keyed by data address. See room_from_record.
+
+    Returns:
+        TektonRoom : The new copy of room.
+
+    """
+    room_states = _get_room_states(room)
+    new_room = _room_from_record(room_to_record(room),
+                                 interned_doors,
+                                 {room_state.level_data_address: room_state.tiles for room_state in room_states})
+    for new_state, room_state in zip(_get_room_states(new_room), room_states):
+        new_state.tiles = room_state.tiles
+    return new_room
+
+
+def copy_door(door):
+    """Creates a copy of a TektonDoor or TektonElevatorLaunchpad, which has no observers.
+
+    Args:
+        door (TektonDoor): The door to copy.
+
+    Returns:
+        TektonDoor : The new copy of door.
+
+    """
+    return _door_from_record(_door_to_record(door))
+
+
+def _room_from_record(record, interned_doors, tile_grids, interned_room_states=None):
+    new_room = TektonRoom(record.width_screens, record.height_screens)
+    new_room.header = record.header
+    new_room.name = record.name
+    new_room.room_index = record.room_index
+    new_room.map_area = MapArea(record.map_area)
+    new_room.minimap_x_coord = record.minimap_x_coord
+    new_room.minimap_y_coord = record.minimap_y_coord
+    new_room.up_scroller = record.up_scroller
+    new_room.down_scroller = record.down_scroller
+    new_room.special_graphics_bitflag = record.special_graphics_bitflag
+    new_room.level_data_length = record.level_data_length
+    new_room.write_level_data = record.write_level_data
+
+    new_room.standard_state = _interned_room_state_from_record(record.standard_state, record, tile_grids,
+                                                               interned_room_states)
+    for pointer_record in record.extra_states:
+        new_pointer = _state_pointer_classes[pointer_record.pointer_code]()
+        if pointer_record.event_value is not None:
+            new_pointer.event_value = pointer_record.event_value
+        new_pointer.room_state = _interned_room_state_from_record(pointer_record.room_state, record, tile_grids,
+                                                                  interned_room_states)
+        new_room.extra_states.append(new_pointer)
+
+    for door_record in record.doors:
+        if interned_doors is None:
+            new_room.doors.append(_door_from_record(door_record))
+            continue
+        if door_record.data_address not in interned_doors:
+            interned_doors[door_record.data_address] = _door_from_record(door_record)
+        new_room.doors.append(interned_doors[door_record.data_address])
+
+    return new_room
+
+
+def _get_room_states(room):
+    return [room.standard_state] + [room_state_pointer.room_state for room_state_pointer in room.extra_states]
+
+
+def _room_state_to_record(room_state, state_address=None):
+    return TektonRoomStateRecord(room_state.level_data_address,
+                                 room_state.tileset.value,
+                                 room_state.songset.value,
+                                 room_state.song_play_index.value,
+                                 room_state.fx_pointer,
+                                 room_state.enemy_set_pointer,
+                                 room_state.enemy_gfx_pointer,
+                                 room_state.background_x_scroll,
+                                 room_state.background_y_scroll,
+                                 room_state.room_scrolls_pointer,
+                                 room_state.unused_pointer,
+                                 room_state.main_asm_pointer,
+                                 room_state.plm_set_pointer,
+                                 room_state.background_pointer,
+                                 room_state.setup_asm_pointer,
+                                 None if state_address is None else state_address(room_state))
+
+
+def _interned_room_state_from_record(state_record, room_record, tile_grids, interned_room_states):
+    if interned_room_states is None or state_record.data_address is None:
+        return _room_state_from_record(state_record, room_record, tile_grids)
+    interned_state = interned_room_states.get(state_record.data_address)
+    if interned_state is None:
+        interned_state = _room_state_from_record(state_record, room_record, tile_grids)
+        interned_room_states[state_record.data_address] = interned_state
+    else:
+        # As in TektonRoomImporter, later states of this room with the same level data use the interned state's grid
+        tile_grids.setdefault(interned_state.level_data_address, interned_state.tiles)
+    return interned_state
+
+
+def _room_state_from_record(state_record, room_record, tile_grids):
+    new_state = TektonRoomState()
+    new_state.level_data_address = state_record.level_data_address
+    new_state.tileset = TileSet(state_record.tileset)
+    new_state.songset = SongSet(state_record.songset)
+    new_state.song_play_index = SongPlayIndex(state_record.song_play_index)
+    new_state.fx_pointer = state_record.fx_pointer
+    new_state.enemy_set_pointer = state_record.enemy_set_pointer
+    new_state.enemy_gfx_pointer = state_record.enemy_gfx_pointer
+    new_state.background_x_scroll = state_record.background_x_scroll
+    new_state.background_y_scroll = state_record.background_y_scroll
+    new_state.room_scrolls_pointer = state_record.room_scrolls_pointer
+    new_state.unused_pointer = state_record.unused_pointer
+    new_state.main_asm_pointer = state_record.main_asm_pointer
+    new_state.plm_set_pointer = state_record.plm_set_pointer
+    new_state.background_pointer = state_record.background_pointer
+    new_state.setup_asm_pointer = state_record.setup_asm_pointer
+
+    if state_record.level_data_address not in tile_grids:
+        new_grid = TektonTileGrid(room_record.width_screens * 16, room_record.height_screens * 16)
+        new_grid.fill()
+        tile_grids[state_record.level_data_address] = new_grid
+    new_state.tiles = tile_grids[state_record.level_data_address]
+
+    return new_state
+
+
+def _door_to_record(door):
+    if isinstance(door, TektonElevatorLaunchpad):
+        return TektonDoorRecord(door.data_address, None, None, None, None, None, None, None, None, None,
+                                door.door_data)
+    return TektonDoorRecord(door.data_address,
+                            door.target_room_id,
+                            door.bit_flag.value,
+                            door.eject_direction.value,
+                            door.target_door_cap_col,
+                            door.target_door_cap_row,
+                            door.target_room_screen_h,
+                            door.target_room_screen_v,
+                            door.distance_to_spawn,
+                            door.asm_pointer,
+                            None)
+
+
+def _door_from_record(door_record):
+    if door_record.launchpad_data is not None:
+        new_launchpad = TektonElevatorLaunchpad()
+        new_launchpad.data_address = door_record.data_address
+        new_launchpad.door_data = door_record.launchpad_data
+        return new_launchpad
+
+    new_door = TektonDoor()
+    new_door.data_address = door_record.data_address
+    new_door.target_room_id = door_record.target_room_id
+    new_door.bit_flag = DoorBitFlag(door_record.bit_flag)
+    new_door.eject_direction = DoorEjectDirection(door_record.eject_direction)
+    new_door.target_door_cap_col = door_record.target_door_cap_col
+    new_door.target_door_cap_row = door_record.target_door_cap_row
+    new_door.target_room_screen_h = door_record.target_room_screen_h
+    new_door.target_room_screen_v = door_record.target_room_screen_v
+    new_door.distance_to_spawn = door_record.distance_to_spawn
+    new_door.asm_pointer = door_record.asm_pointer
+    return new_door
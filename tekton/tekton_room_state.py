@@ -10,6 +10,7 @@ Classes:
 """
 
 from enum import Enum
+from .tekton_system import TektonObservable
 
 class TileSet(Enum):
     CRATERIA_CAVE = 0x00
@@ -83,7 +84,7 @@ class SongPlayIndex(Enum):
     STOP_MUSIC = 0x80
 
 
-class TektonRoomStatePointer:
+class TektonRoomStatePointer(TektonObservable):
     """A superclass for pointers representing different kinds of room states. Room header data contains zero or more
         pointers to special room states that are not the standard room state.
 
@@ -91,6 +92,8 @@ class TektonRoomStatePointer:
 
 
     """
+    _observed_attributes = frozenset(["event_value", "room_state"])
+
     def __init__(self):
         pass
 
@@ -153,7 +156,7 @@ class TektonRoomFlywayStatePointer(TektonRoomStatePointer):
         return b'\x29\xe6'
 
 
-class TektonRoomState:
+class TektonRoomState(TektonObservable):
     """An object that holds information about a single state for a room. This includes things like what tileset it uses,
         what music plays in the room, the scroll speed of the background, etc.
 
@@ -174,6 +177,23 @@ class TektonRoomState:
         tiles (TektonTileGrid): Level data when room is in this state.
 
     """
+    _observed_attributes = frozenset(["background_pointer",
+                                      "background_x_scroll",
+                                      "background_y_scroll",
+                                      "enemy_gfx_pointer",
+                                      "enemy_set_pointer",
+                                      "fx_pointer",
+                                      "level_data_address",
+                                      "main_asm_pointer",
+                                      "plm_set_pointer",
+                                      "room_scrolls_pointer",
+                                      "setup_asm_pointer",
+                                      "song_play_index",
+                                      "songset",
+                                      "tiles",
+                                      "tileset",
+                                      "unused_pointer"])
+
     def __init__(self):
         self.tileset = TileSet.CRATERIA_CAVE
         self.songset = SongSet.INTRO
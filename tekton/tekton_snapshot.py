@@ -0,0 +1,438 @@
+"""Tekton Snapshot
+
+This module implements a compact binary file format for saving the rooms of a TektonProject and loading them again,
+without parsing the ROM or any YAML.
+
+A snapshot holds a header, a string table, and one packed array each for rooms, room states, room state pointers,
+doors and tile grids. Objects shared between rooms, such as doors or room states imported from the same ROM address,
+are stored once and shared again on load. Tile grids are stored as raw layer 1 and BTS buffers in the same format as
+TektonTileGrid.uncompressed_data, aligned so the file can be memory-mapped. On load, each grid keeps a view into the
+mapped file and only creates its TektonTile objects when its tiles are first used.
+
+Snapshots contain only integers, strings and bytes, and never use pickle.
+
+Classes:
+    SnapshotFormatError: Exception raised when a file is not a snapshot or uses an unsupported version of the format.
+
+Functions:
+    write_snapshot: Writes rooms and a source ROM path to a snapshot file.
+    read_snapshot: Reads the rooms and source ROM path from a snapshot file.
+    read_snapshot_metadata: Reads only the metadata string saved with a snapshot.
+
+"""
+
+import mmap
+import os
+import struct
+import tempfile
+
+from .tekton_room import TektonRoom, MapArea
+from .tekton_door import TektonDoor, TektonElevatorLaunchpad, DoorBitFlag, DoorEjectDirection
+from .tekton_room_state import TektonRoomState, TektonRoomEventStatePointer, TektonRoomLandingStatePointer, \
+    TektonRoomFlywayStatePointer, TileSet, SongSet, SongPlayIndex
+from .tekton_tile_grid import TektonTileGrid
+
+
+SNAPSHOT_MAGIC = b'TEKTONSS'
+SNAPSHOT_VERSION = 2
+
+NO_INDEX = 0xffffffff
+
+_header_struct = struct.Struct("<8sHHIIIIIIIIIIQ")
+_room_struct = struct.Struct("<IIBBBBBBBBBIBIIHIH")
+_state_struct = struct.Struct("<IBBBHHHBBHHHHHHI")
+_pointer_struct = struct.Struct("<BBI")
+_door_struct = struct.Struct("<BIIBBBBBBHH12s")
+_door_index_struct = struct.Struct("<I")
+_grid_struct = struct.Struct("<HHBQ")
+
+_pointer_classes = [TektonRoomEventStatePointer, TektonRoomLandingStatePointer, TektonRoomFlywayStatePointer]
+
+_GRID_HAS_MASK = 0x01  # Grid has empty (None) positions, and a byte per tile saying which positions hold a tile
+_GRID_DATA_ALIGNMENT = 8
+_DOOR = 0
+_ELEVATOR_LAUNCHPAD = 1
+
+
+def write_snapshot(snapshot_path, source_rom_path, rooms, *, metadata=None):
+    """Writes rooms to a snapshot file.
+
+    The snapshot is written to a temporary file in the same directory first and then moved into place, so a reader
+    never sees a partially written snapshot, even if several processes write the same snapshot at once.
+
+    Args:
+        snapshot_path (str): Path of the snapshot file to write.
+        source_rom_path (str): Path of the project's source ROM, or None.
+        rooms (iterable): TektonRoom objects to save.
+        metadata (str): Optional. Any string to save with the snapshot, which read_snapshot_metadata can read back
+            without loading any rooms.
+
+    """
+    strings = _SnapshotTable()
+    states = _SnapshotTable()
+    pointers = []
+    doors = _SnapshotTable()
+    grids = _SnapshotTable()
+    room_entries = []
+    door_indexes = []
+
+    for room in rooms:
+        first_pointer = len(pointers)
+        for room_state_pointer in room.extra_states:
+            pointers.append(_pointer_struct.pack(_pointer_classes.index(type(room_state_pointer)),
+                                                 getattr(room_state_pointer, "event_value", 0),
+                                                 states.index_of(room_state_pointer.room_state)))
+        first_door_index = len(door_indexes)
+        for door in room.doors:
+            door_indexes.append(_door_index_struct.pack(doors.index_of(door)))
+
+        room_entries.append(_room_struct.pack(room.header,
+                                              NO_INDEX if room.name is None else strings.index_of(room.name),
+                                              room.room_index,
+                                              room.map_area.value,
+                                              room.minimap_x_coord,
+                                              room.minimap_y_coord,
+                                              room.width_screens,
+                                              room.height_screens,
+                                              room.up_scroller,
+                                              room.down_scroller,
+                                              room.special_graphics_bitflag,
+                                              room.level_data_length,
+                                              1 if room.write_level_data else 0,
+                                              states.index_of(room.standard_state),
+                                              first_pointer,
+                                              len(room.extra_states),
+                                              first_door_index,
+                                              len(room.doors)))
+
+    source_rom_index = NO_INDEX if source_rom_path is None else strings.index_of(source_rom_path)
+    metadata_index = NO_INDEX if metadata is None else strings.index_of(metadata)
+    string_data = b''.join(_pack_string(string) for string in strings.objects)
+    state_data = b''.join(_pack_state(room_state, grids) for room_state in states.objects)
+    door_data = b''.join(_pack_door(door) for door in doors.objects)
+
+    grid_entries = []
+    grid_buffers = []
+    grid_data_length = 0
+    for grid in grids.objects:
+        grid_buffer, flags = _get_grid_buffer(grid)
+        grid_entries.append(_grid_struct.pack(grid.width, grid.height, flags, grid_data_length))
+        padding = -len(grid_buffer) % _GRID_DATA_ALIGNMENT
+        grid_buffers.append(grid_buffer + b'\x00' * padding)
+        grid_data_length += len(grid_buffer) + padding
+
+    sections = [string_data,
+                b''.join(room_entries),
+                state_data,
+                b''.join(pointers),
+                door_data,
+                b''.join(door_indexes),
+                b''.join(grid_entries)]
+    tables_length = _header_struct.size + sum(len(section) for section in sections)
+    grid_data_offset = tables_length + (-tables_length % _GRID_DATA_ALIGNMENT)
+
+    header = _header_struct.pack(SNAPSHOT_MAGIC,
+                                 SNAPSHOT_VERSION,
+                                 0,
+                                 source_rom_index,
+                                 metadata_index,
+                                 len(strings.objects),
+                                 len(string_data),
+                                 len(room_entries),
+                                 len(states.objects),
+                                 len(pointers),
+                                 len(doors.objects),
+                                 len(door_indexes),
+                                 len(grids.objects),
+                                 grid_data_offset)
+
+    temporary_fd, temporary_path = tempfile.mkstemp(prefix=os.path.basename(snapshot_path) + ".",
+                                                    suffix=".tmp",
+                                                    dir=os.path.dirname(os.path.abspath(snapshot_path)))
+    try:
+        with os.fdopen(temporary_fd, "wb") as f:
+            f.write(header)
+            for section in sections:
+                f.write(section)
+            f.write(b'\x00' * (grid_data_offset - tables_length))
+            for grid_buffer in grid_buffers:
+                f.write(grid_buffer)
+        os.replace(temporary_path, snapshot_path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+
+def read_snapshot(snapshot_path, *, memory_map=True):
+    """Reads the rooms saved in a snapshot file.
+
+    The memory map is never closed explicitly. Each tile grid whose tiles have not been created yet keeps a view into
+    it, and the file stays mapped until the last of those grids creates its tiles or is garbage collected. On Windows,
+    a mapped file cannot be replaced, so pass memory_map=False if the same snapshot will be written again while the rooms
+    read from it are in use.
+
+    Args:
+        snapshot_path (str): Path of the snapshot file to read.
+        memory_map (bool): Optional. If True, tile grids are read through a read-only memory map of the file, so tile
+            data is only read from disk when it is used. If False, the whole file is read into memory. Defaults to True.
+
+    Returns:
+        tuple : (source ROM path, list of TektonRooms). The source ROM path is None if none was saved.
+
+    """
+    with open(snapshot_path, "rb") as f:
+        if memory_map and os.fstat(f.fileno()).st_size > 0:
+            # The mapping stays valid after the file is closed, and is unmapped once no grid has a view into it
+            snapshot_contents = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        else:
+            snapshot_contents = memoryview(f.read())
+
+    try:
+        return _read_snapshot_contents(snapshot_path, snapshot_contents)
+    except (struct.error, IndexError, ValueError) as error:
+        raise SnapshotFormatError("{} is truncated or corrupt: {}".format(snapshot_path, error))
+
+
+def read_snapshot_metadata(snapshot_path):
+    """Reads the metadata string saved with a snapshot, without loading any rooms.
+
+    Args:
+        snapshot_path (str): Path of the snapshot file to read.
+
+    Returns:
+        str : The metadata passed to write_snapshot, or None if there was none.
+
+    """
+    with open(snapshot_path, "rb") as f:
+        snapshot_contents = f.read(_header_struct.size)
+        header = _unpack_header(snapshot_path, snapshot_contents)
+        metadata_index, string_data_length = header[1], header[3]
+        if metadata_index == NO_INDEX:
+            return None
+        string_data = f.read(string_data_length)
+
+    try:
+        return _unpack_strings(string_data, metadata_index + 1)[metadata_index]
+    except (IndexError, ValueError) as error:
+        raise SnapshotFormatError("{} is truncated or corrupt: {}".format(snapshot_path, error))
+
+
+def _unpack_header(snapshot_path, snapshot_contents):
+    """Checks a snapshot's header and returns its fields, after the magic number and version."""
+    if len(snapshot_contents) < _header_struct.size:
+        raise SnapshotFormatError("{} is not a Tekton snapshot!".format(snapshot_path))
+    header = _header_struct.unpack_from(snapshot_contents, 0)
+    magic, version, flags = header[0:3]
+    if magic != SNAPSHOT_MAGIC:
+        raise SnapshotFormatError("{} is not a Tekton snapshot!".format(snapshot_path))
+    if version != SNAPSHOT_VERSION:
+        raise SnapshotFormatError("{} uses snapshot version {}, but only version {} is supported!".format(
+            snapshot_path, version, SNAPSHOT_VERSION))
+    return header[3:]
+
+
+def _unpack_strings(string_data, string_count):
+    strings = []
+    offset = 0
+    for i in range(string_count):
+        if offset + 4 > len(string_data):
+            raise ValueError("string table is too short")
+        string_length = int.from_bytes(string_data[offset:offset + 4], byteorder="little")
+        strings.append(str(string_data[offset + 4:offset + 4 + string_length], "utf-8"))
+        offset += 4 + string_length
+    return strings
+
+
+def _read_snapshot_contents(snapshot_path, snapshot_contents):
+    source_rom_index, metadata_index, string_count, string_data_length, room_count, state_count, pointer_count, \
+        door_count, door_index_count, grid_count, grid_data_offset = _unpack_header(snapshot_path, snapshot_contents)
+
+    offset = _header_struct.size
+    strings = _unpack_strings(snapshot_contents[offset:offset + string_data_length], string_count)
+    offset += string_data_length
+
+    room_entries, offset = _unpack_array(_room_struct, snapshot_contents, offset, room_count)
+    state_entries, offset = _unpack_array(_state_struct, snapshot_contents, offset, state_count)
+    pointer_entries, offset = _unpack_array(_pointer_struct, snapshot_contents, offset, pointer_count)
+    door_entries, offset = _unpack_array(_door_struct, snapshot_contents, offset, door_count)
+    door_indexes, offset = _unpack_array(_door_index_struct, snapshot_contents, offset, door_index_count)
+    grid_entries, offset = _unpack_array(_grid_struct, snapshot_contents, offset, grid_count)
+
+    if grid_entries:
+        width, height, flags, data_offset = grid_entries[-1]
+        if grid_data_offset + data_offset + width * height * 3 > len(snapshot_contents):
+            raise ValueError("tile data is too short")
+    grids = [_unpack_grid(grid_entry, snapshot_contents, grid_data_offset) for grid_entry in grid_entries]
+    states = [_unpack_state(state_entry, grids) for state_entry in state_entries]
+    doors = [_unpack_door(door_entry) for door_entry in door_entries]
+
+    rooms = []
+    for room_entry in room_entries:
+        header, name_index, room_index, map_area, minimap_x_coord, minimap_y_coord, width_screens, height_screens, \
+            up_scroller, down_scroller, special_graphics_bitflag, level_data_length, write_level_data, \
+            standard_state_index, first_pointer, pointer_count, first_door_index, room_door_count = room_entry
+
+        new_room = TektonRoom(width_screens, height_screens)
+        new_room.header = header
+        new_room.name = None if name_index == NO_INDEX else strings[name_index]
+        new_room.room_index = room_index
+        new_room.map_area = MapArea(map_area)
+        new_room.minimap_x_coord = minimap_x_coord
+        new_room.minimap_y_coord = minimap_y_coord
+        new_room.up_scroller = up_scroller
+        new_room.down_scroller = down_scroller
+        new_room.special_graphics_bitflag = special_graphics_bitflag
+        new_room.level_data_length = level_data_length
+        new_room.write_level_data = bool(write_level_data)
+        new_room.standard_state = states[standard_state_index]
+
+        extra_states = []
+        for pointer_class_index, event_value, state_index in pointer_entries[first_pointer:first_pointer +
+                                                                                           pointer_count]:
+            new_pointer = _pointer_classes[pointer_class_index]()
+            if hasattr(new_pointer, "event_value"):
+                new_pointer.event_value = event_value
+            new_pointer.room_state = states[state_index]
+            extra_states.append(new_pointer)
+        new_room.extra_states = extra_states
+        new_room.doors = [doors[door_index[0]]
+                          for door_index in door_indexes[first_door_index:first_door_index + room_door_count]]
+        rooms.append(new_room)
+
+    source_rom_path = None if source_rom_index == NO_INDEX else strings[source_rom_index]
+    return source_rom_path, rooms
+
+
+class _SnapshotTable:
+    """Assigns each distinct object an index, in the order the objects are first seen."""
+
+    def __init__(self):
+        self.objects = []
+        self._indexes = {}
+
+    def index_of(self, table_object):
+        key = table_object if isinstance(table_object, str) else id(table_object)
+        if key not in self._indexes:
+            self._indexes[key] = len(self.objects)
+            self.objects.append(table_object)
+        return self._indexes[key]
+
+
+def _pack_string(string):
+    encoded_string = string.encode("utf-8")
+    return len(encoded_string).to_bytes(4, byteorder="little") + encoded_string
+
+
+def _pack_state(room_state, grids):
+    return _state_struct.pack(room_state.level_data_address,
+                              room_state.tileset.value,
+                              room_state.songset.value,
+                              room_state.song_play_index.value,
+                              room_state.fx_pointer,
+                              room_state.enemy_set_pointer,
+                              room_state.enemy_gfx_pointer,
+                              room_state.background_x_scroll,
+                              room_state.background_y_scroll,
+                              room_state.room_scrolls_pointer,
+                              room_state.unused_pointer,
+                              room_state.main_asm_pointer,
+                              room_state.plm_set_pointer,
+                              room_state.background_pointer,
+                              room_state.setup_asm_pointer,
+                              NO_INDEX if room_state.tiles is None else grids.index_of(room_state.tiles))
+
+
+def _unpack_state(state_entry, grids):
+    new_state = TektonRoomState()
+    new_state.level_data_address = state_entry[0]
+    new_state.tileset = TileSet(state_entry[1])
+    new_state.songset = SongSet(state_entry[2])
+    new_state.song_play_index = SongPlayIndex(state_entry[3])
+    new_state.fx_pointer, new_state.enemy_set_pointer, new_state.enemy_gfx_pointer, \
+        new_state.background_x_scroll, new_state.background_y_scroll, new_state.room_scrolls_pointer, \
+        new_state.unused_pointer, new_state.main_asm_pointer, new_state.plm_set_pointer, \
+        new_state.background_pointer, new_state.setup_asm_pointer = state_entry[4:15]
+    new_state.tiles = None if state_entry[15] == NO_INDEX else grids[state_entry[15]]
+    return new_state
+
+
+def _pack_door(door):
+    if isinstance(door, TektonElevatorLaunchpad):
+        return _door_struct.pack(_ELEVATOR_LAUNCHPAD, door.data_address, 0, 0, 0, 0, 0, 0, 0, 0, 0, door.door_data)
+    return _door_struct.pack(_DOOR,
+                             door.data_address,
+                             door.target_room_id,
+                             door.bit_flag.value,
+                             door.eject_direction.value,
+                             door.target_door_cap_col,
+                             door.target_door_cap_row,
+                             door.target_room_screen_h,
+                             door.target_room_screen_v,
+                             door.distance_to_spawn,
+                             door.asm_pointer,
+                             b'\x00' * 12)
+
+
+def _unpack_door(door_entry):
+    if door_entry[0] == _ELEVATOR_LAUNCHPAD:
+        new_launchpad = TektonElevatorLaunchpad()
+        new_launchpad.data_address = door_entry[1]
+        new_launchpad.door_data = door_entry[11]
+        return new_launchpad
+
+    new_door = TektonDoor()
+    new_door.data_address = door_entry[1]
+    new_door.target_room_id = door_entry[2]
+    new_door.bit_flag = DoorBitFlag(door_entry[3])
+    new_door.eject_direction = DoorEjectDirection(door_entry[4])
+    new_door.target_door_cap_col, new_door.target_door_cap_row, new_door.target_room_screen_h, \
+        new_door.target_room_screen_v, new_door.distance_to_spawn, new_door.asm_pointer = door_entry[5:11]
+    return new_door
+
+
+def _get_grid_buffer(grid):
+    """Returns (buffer, flags) for a tile grid. Empty positions are stored as default tiles plus a mask.
+
+    Grids whose tiles have not been created yet have no empty positions, and their data is saved without creating them.
+    """
+    pending_data = grid.__dict__.get("_pending_data")
+    if pending_data is not None:
+        return bytes(pending_data[2]), 0
+    if all(grid[x][y] is not None for x in range(grid.width) for y in range(grid.height)):
+        return grid.uncompressed_data, 0
+
+    l1_data = bytearray()
+    bts_data = bytearray()
+    mask = bytearray()
+    for y in range(grid.height):
+        for x in range(grid.width):
+            tile = grid[x][y]
+            mask.append(0 if tile is None else 1)
+            l1_data += b'\x00\x00' if tile is None else tile.l1_attributes_bytes
+            bts_data += b'\x00' if tile is None else tile.bts_number_byte
+    return bytes(l1_data + bts_data + mask), _GRID_HAS_MASK
+
+
+def _unpack_grid(grid_entry, snapshot_contents, grid_data_offset):
+    width, height, flags, data_offset = grid_entry
+    data_start = grid_data_offset + data_offset
+    data_end = data_start + width * height * 3
+    if not flags & _GRID_HAS_MASK:
+        return TektonTileGrid.from_uncompressed_data(width, height, snapshot_contents[data_start:data_end])
+
+    new_grid = TektonTileGrid.from_uncompressed_data(width, height, bytes(snapshot_contents[data_start:data_end]))
+    mask = snapshot_contents[data_end:data_end + width * height]
+    for index in range(width * height):
+        if not mask[index]:
+            new_grid[index % width][index // width] = None
+    return new_grid
+
+
+def _unpack_array(array_struct, contents, offset, count):
+    end_offset = offset + array_struct.size * count
+    return list(array_struct.iter_unpack(contents[offset:end_offset])), end_offset
+
+
+class SnapshotFormatError(Exception):
+    """Exception raised when a file is not a Tekton snapshot, or was written with an unsupported version of the format."""
+    pass
@@ -0,0 +1,261 @@
+"""Tekton Synthetic ROM
+
+This module generates ROM images laid out like Super Metroid, for testing and benchmarking without the original ROM.
+
+A synthetic ROM contains no game code or graphics, only what tekton reads: room headers and state blocks in bank $8F,
+door data in bank $83, and compressed level data starting in bank $C2, with door pointer lists, state pointers and level
+data pointers that point at each other the same way they do in the original ROM. Every door leads to another room in the
+ROM. The rest of the ROM is filled with FF, and the cartridge header has a valid checksum.
+
+Rooms are generated from a seed, so the same arguments always produce the same ROM. Level data is compressed with
+TektonCompressionMapper, once for each room size and tile pattern, so even a 4 MB ROM is generated in well under a
+second.
+
+Classes:
+    TektonSyntheticROM: Named tuple holding a generated ROM and the header addresses of its rooms.
+
+Functions:
+    clear_cache: Forgets the level data compressed so far, so the next ROM is generated from a cold start.
+    generate_synthetic_rom: Generates a synthetic ROM.
+    write_synthetic_rom: Generates a synthetic ROM and writes it to a file, with a header address file for
+        TektonProject.import_rooms.
+
+"""
+
+import random
+import struct
+from collections import namedtuple
+from functools import lru_cache
+
+import yaml
+
+from .tekton_address_space import LOROM_BANK_SIZE, get_address_space
+from .tekton_checksum import CHECKSUM_COMPLEMENT_ADDRESS, calculate_checksum
+from .tekton_compressor import TektonCompressionMapper
+from .tekton_door import DoorBitFlag, DoorEjectDirection
+from .tekton_room import MapArea
+from .tekton_room_state import TileSet, SongSet, SongPlayIndex
+
+ROOM_HEADERS_START = 0x791f8  # Header of the first room in the original ROM
+ROOM_HEADERS_END = 0x80000  # End of bank $8F
+DOOR_DATA_START = 0x18000  # Start of bank $83
+DOOR_DATA_END = 0x20000
+LEVEL_DATA_START = 0x210000  # Start of bank $C2
+CARTRIDGE_HEADER_ADDRESS = 0x7fc0
+
+TektonSyntheticROM = namedtuple("TektonSyntheticROM", ["rom_contents", "room_headers"])
+TektonSyntheticROM.__doc__ = """A generated ROM.
+
+Attributes:
+    rom_contents (bytes): Contents of the ROM.
+    room_headers (list): PC addresses of the headers of every room in the ROM, in address order.
+"""
+
+_STATE_POINTER_CODES = [(b'\x12\xe6', True),  # Event state: code, event value, state pointer
+                        (b'\x69\xe6', False),  # Landing state: code, state pointer
+                        (b'\x29\xe6', True)]  # Flyway state: code, event value, state pointer
+_LEVEL_DATA_PATTERNS = 4
+
+
+def generate_synthetic_rom(room_count=260, *, rom_size=0x400000, max_width_screens=4, max_height_screens=3,
+                           max_extra_states=2, max_doors=4, seed=0):
+    """Generates a ROM laid out like Super Metroid, containing generated rooms.
+
+    Args:
+        room_count (int): Optional. Number of rooms. Defaults to 260, about as many as the original ROM.
+        rom_size (int): Optional. Size of the ROM in bytes. Defaults to 4 MB.
+        max_width_screens (int): Optional. Largest room width in screens. Defaults to 4.
+        max_height_screens (int): Optional. Largest room height in screens. Defaults to 3.
+        max_extra_states (int): Optional. Largest number of states per room besides the standard state. Defaults to 2.
+        max_doors (int): Optional. Largest number of doors per room. Every room has at least one. Defaults to 4.
+        seed (int): Optional. Seed for the random choices. Defaults to 0.
+
+    Returns:
+        TektonSyntheticROM : The ROM and the header addresses of its rooms.
+
+    """
+    for argument_name, argument_value in [("room_count", room_count),
+                                          ("rom_size", rom_size),
+                                          ("max_width_screens", max_width_screens),
+                                          ("max_height_screens", max_height_screens),
+                                          ("max_extra_states", max_extra_states),
+                                          ("max_doors", max_doors)]:
+        if not isinstance(argument_value, int):
+            raise TypeError("{} must be of type int!".format(argument_name))
+    if room_count < 1:
+        raise ValueError("room_count must be 1 or greater.")
+    if rom_size <= LEVEL_DATA_START or rom_size > 0x400000:
+        raise ValueError("rom_size must be greater than {} and no more than 0x400000".format(hex(LEVEL_DATA_START)))
+    if max_width_screens < 1 or max_height_screens < 1 or max_width_screens * max_height_screens > 50:
+        raise ValueError("Rooms must be at least 1x1 screens and must not contain more than 50 screens!")
+    if max_extra_states < 0 or max_doors < 1 or max_doors > 8:
+        raise ValueError("max_extra_states must be 0 or greater, and max_doors must be between 1 and 8.")
+
+    rng = random.Random(seed)
+    address_space = get_address_space(rom_size)
+    rom_contents = bytearray(b'\xff' * rom_size)
+
+    # Choose every room's shape first, so that headers can be placed before doors point at them
+    room_layouts = []
+    header_address = ROOM_HEADERS_START
+    for room_number in range(room_count):
+        extra_state_codes = [rng.choice(_STATE_POINTER_CODES) for i in range(rng.randint(0, max_extra_states))]
+        door_count = rng.randint(1, max_doors)
+        header_length = 11 + sum(5 if has_event else 4 for code, has_event in extra_state_codes) + 2 + \
+            26 * (len(extra_state_codes) + 1) + 2 * door_count
+        room_layouts.append((header_address, extra_state_codes, door_count))
+        header_address += header_length + 2  # 00 00 after the door pointer list ends it
+    if header_address > ROOM_HEADERS_END:
+        raise ValueError("{} rooms do not fit in bank $8F!".format(room_count))
+    room_headers = [layout[0] for layout in room_layouts]
+    room_areas = [rng.choice(list(MapArea)) for room_number in range(room_count)]
+
+    door_address = DOOR_DATA_START
+    level_data_address = LEVEL_DATA_START
+    for room_number, (header_address, extra_state_codes, door_count) in enumerate(room_layouts):
+        width_screens = rng.randint(1, max_width_screens)
+        height_screens = rng.randint(1, max_height_screens)
+
+        # Doors: the first leads to the next room, so every room can be reached; the rest lead anywhere
+        door_addresses = []
+        for door_number in range(door_count):
+            if door_address + 12 > DOOR_DATA_END:
+                raise ValueError("The doors of {} rooms do not fit in bank $83!".format(room_count))
+            if door_number == 0:
+                target_number = (room_number + 1) % room_count
+            else:
+                target_number = rng.randrange(room_count)
+            bit_flag = DoorBitFlag.DOOR_SAME_AREA if room_areas[target_number] == room_areas[room_number] \
+                else DoorBitFlag.DOOR_AREA_CHANGE
+            rom_contents[door_address:door_address + 12] = struct.pack("<HBBBBBBHH",
+                                                                       room_headers[target_number] & 0xffff,
+                                                                       bit_flag.value,
+                                                                       rng.choice(list(DoorEjectDirection)).value,
+                                                                       rng.randrange(0x10),
+                                                                       rng.randrange(0x10),
+                                                                       rng.randrange(4),
+                                                                       rng.randrange(3),
+                                                                       0x8000,
+                                                                       0x0000)
+            door_addresses.append(door_address)
+            door_address += 12
+
+        # Level data: extra states either share the standard state's level data or have their own
+        level_data_addresses = []
+        for state_number in range(len(extra_state_codes) + 1):
+            if state_number > 0 and rng.random() < 0.5:
+                level_data_addresses.append(level_data_addresses[0])
+                continue
+            level_data = _get_compressed_level_data(width_screens, height_screens,
+                                                    rng.randrange(_LEVEL_DATA_PATTERNS))
+            if level_data_address // LOROM_BANK_SIZE != (level_data_address + len(level_data) - 1) // LOROM_BANK_SIZE:
+                level_data_address = (level_data_address // LOROM_BANK_SIZE + 1) * LOROM_BANK_SIZE
+            if level_data_address + len(level_data) > rom_size:
+                raise ValueError("The level data of {} rooms does not fit in {} bytes!".format(room_count,
+                                                                                             hex(rom_size)))
+            rom_contents[level_data_address:level_data_address + len(level_data)] = level_data
+            level_data_addresses.append(level_data_address)
+            level_data_address += len(level_data)
+
+        header_parts = [struct.pack("<BBBBBBBBB",
+                                    room_number % 0x100,
+                                    room_areas[room_number].value,
+                                    rng.randrange(0x40),
+                                    rng.randrange(0x20),
+                                    width_screens,
+                                    height_screens,
+                                    0x70,
+                                    0xa0,
+                                    0x00)]
+        standard_state_address = header_address + 11 + \
+            sum(5 if has_event else 4 for code, has_event in extra_state_codes) + 2
+        door_pointer_list_address = standard_state_address + 26 * (len(extra_state_codes) + 1)
+        header_parts.append(struct.pack("<H", door_pointer_list_address & 0xffff))
+        for state_number, (pointer_code, has_event) in enumerate(extra_state_codes):
+            header_parts.append(pointer_code)
+            if has_event:
+                header_parts.append(bytes([rng.randrange(1, 0x100)]))
+            header_parts.append(struct.pack("<H", (standard_state_address + 26 * (state_number + 1)) & 0xffff))
+        header_parts.append(b'\xe6\xe5')
+        for state_level_data_address in level_data_addresses:
+            header_parts.append(address_space.pointer_bytes(state_level_data_address))
+            header_parts.append(struct.pack("<BBBHHHBBHHHHHH",
+                                            rng.choice(list(TileSet)).value,
+                                            rng.choice(list(SongSet)).value,
+                                            rng.choice(list(SongPlayIndex)).value,
+                                            0x8000 + rng.randrange(0x8000),
+                                            0x8000 + rng.randrange(0x8000),
+                                            0x8000 + rng.randrange(0x8000),
+                                            0x00,
+                                            0x00,
+                                            0x8000 + rng.randrange(0x8000),
+                                            0x0000,
+                                            0x0000,
+                                            0x8000 + rng.randrange(0x8000),
+                                            0x0000,
+                                            0x0000))
+        for door_data_address in door_addresses:
+            header_parts.append(address_space.pointer_bytes(door_data_address, length=2))
+        header_parts.append(b'\x00\x00')
+        header_data = b''.join(header_parts)
+        rom_contents[header_address:header_address + len(header_data)] = header_data
+
+    _write_cartridge_header(rom_contents)
+    return TektonSyntheticROM(bytes(rom_contents), room_headers)
+
+
+def write_synthetic_rom(rom_path, header_address_file=None, **options):
+    """Generates a synthetic ROM and writes it to a file.
+
+    Args:
+        rom_path (str): Path to write the ROM to.
+        header_address_file (str): Optional. Path to write a header address file to, listing every room, which can be
+            passed to TektonProject.import_rooms.
+        **options: Arguments for generate_synthetic_rom.
+
+    Returns:
+        TektonSyntheticROM : The ROM and the header addresses of its rooms.
+
+    """
+    synthetic_rom = generate_synthetic_rom(**options)
+    with open(rom_path, "wb") as f:
+        f.write(synthetic_rom.rom_contents)
+    if header_address_file is not None:
+        with open(header_address_file, "w") as f:
+            yaml.dump([{"header": room_header, "name": "Synthetic Room {}".format(room_number)}
+                       for room_number, room_header in enumerate(synthetic_rom.room_headers)], f)
+    return synthetic_rom
+
+
+def clear_cache():
+    """Forgets the level data compressed for every room size and tile pattern so far, so the next call to
+    generate_synthetic_rom compresses it again, e.g. to time generating a ROM from a cold start."""
+    _get_compressed_level_data.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def _get_compressed_level_data(width_screens, height_screens, pattern):
+    # Floors, walls and runs of air, as in most rooms. Each pattern is a different arrangement.
+    rng = random.Random(width_screens * 10000 + height_screens * 100 + pattern)
+    tile_count = width_screens * height_screens * 256
+    layer_1 = bytearray()
+    bts = bytearray()
+    while len(bts) < tile_count:
+        run_length = min(rng.randrange(1, 64), tile_count - len(bts))
+        layer_1 += bytes([rng.choice([0x00, 0x5f, 0xff]), rng.choice([0x00, 0x80, 0x84])]) * run_length
+        bts += bytes([rng.choice([0x00, 0x00, 0x01])]) * run_length
+
+    compressor = TektonCompressionMapper()
+    compressor.width_screens = width_screens
+    compressor.height_screens = height_screens
+    compressor.uncompressed_data = bytes(layer_1 + bts)
+    return compressor.compressed_data
+
+
+def _write_cartridge_header(rom_contents):
+    rom_size_exponent = max(0, (len(rom_contents) - 1).bit_length() - 10)  # ROM size is 2 ** n KB
+    rom_contents[CARTRIDGE_HEADER_ADDRESS:CHECKSUM_COMPLEMENT_ADDRESS] = \
+        b'TEKTON SYNTHETIC ROM ' + bytes([0x20, 0x02, rom_size_exponent, 0x03, 0x01, 0x01, 0x00])
+    checksum = calculate_checksum(rom_contents)
+    rom_contents[CHECKSUM_COMPLEMENT_ADDRESS:CHECKSUM_COMPLEMENT_ADDRESS + 4] = \
+        struct.pack("<HH", checksum ^ 0xffff, checksum)
@@ -2,12 +2,167 @@
 
 This module implements utility classes and functions that various other modules can use.
 
+Classes:
+    TektonObservable: Mixin that calls observer functions when certain attributes of an object are assigned.
+    TektonObservableList: List that reports changes to its contents to the object that owns it.
+
 Functions:
     lorom_to_pc: Converts a LoROM address to a PC address
     overwrite_bytes_at_index: Replaces bytes in an input string with a new string of bytes
+    overwrite_bytes_in_place: Replaces bytes in a bytearray with a new string of bytes, without copying the bytearray
+    pc_to_lorom: Converts a PC address to a LoROM address
 
 """
 
+import copy
+
+
+class TektonObservable:
+    """Mixin for objects whose attribute changes can be watched by other objects, such as indexes over a project.
+
+    Subclasses list the attributes that should be watched in _observed_attributes. Whenever one of those attributes is
+    assigned, the object is marked dirty and each observer is called with (changed_object, attribute_name, old_value,
+    new_value). Objects without any observers pay only for a set lookup on assignment.
+
+    New objects start out dirty. Builds use the dirty flag to skip objects which have not changed since they were last
+    written, and call mark_clean once they have written an object.
+
+    Copies made with copy.copy or copy.deepcopy have no observers, and get their own TektonObservableLists. Subclasses
+    list any other attributes that tie an object to its observers or caches in _uncopied_attributes.
+
+    Class Attributes:
+        _observed_attributes (frozenset): Names of the attributes whose assignment is reported to observers.
+        _uncopied_attributes (frozenset): Names of the attributes which copies of the object are made without.
+
+    """
+    _observed_attributes = frozenset()
+    _uncopied_attributes = frozenset(["_observers"])
+
+    def __setattr__(self, name, value):
+        if name not in self._observed_attributes:
+            object.__setattr__(self, name, value)
+            return
+        if not self.__dict__.get("_observers"):
+            object.__setattr__(self, name, value)
+            self.__dict__["_dirty"] = True
+            return
+        old_value = getattr(self, name, None)
+        object.__setattr__(self, name, value)
+        self.__dict__["_dirty"] = True
+        self._notify_observers(name, old_value, getattr(self, name))
+
+    @property
+    def dirty(self):
+        """bool: True if an observed attribute has changed since the last call to mark_clean, otherwise False."""
+        return self.__dict__.get("_dirty", True)
+
+    def mark_clean(self):
+        """Clears the dirty flag, e.g. after the object has been written to a ROM."""
+        self.__dict__["_dirty"] = False
+
+    def mark_dirty(self):
+        """Sets the dirty flag. Useful after changing the object in a way that is not observed."""
+        self.__dict__["_dirty"] = True
+
+    def add_observer(self, observer):
+        """Registers a function to be called whenever an observed attribute of this object changes.
+
+        Args:
+            observer (callable): Function accepting (changed_object, attribute_name, old_value, new_value).
+
+        """
+        if "_observers" not in self.__dict__:
+            object.__setattr__(self, "_observers", [])
+        if observer not in self._observers:
+            self._observers.append(observer)
+
+    def remove_observer(self, observer):
+        """Stops calling a function previously registered with add_observer. Does nothing if it is not registered.
+
+        Args:
+            observer (callable): The function to remove.
+
+        """
+        observers = self.__dict__.get("_observers")
+        if observers and observer in observers:
+            observers.remove(observer)
+
+    def __copy__(self):
+        new_object = type(self).__new__(type(self))
+        new_object.__dict__.update(self._get_copied_attributes(new_object, lambda value: value))
+        return new_object
+
+    def __deepcopy__(self, memo):
+        new_object = type(self).__new__(type(self))
+        memo[id(self)] = new_object
+        new_object.__dict__.update(self._get_copied_attributes(new_object, lambda value: copy.deepcopy(value, memo)))
+        return new_object
+
+    def _get_copied_attributes(self, new_object, copy_value):
+        """Yields (name, value) for each attribute a copy of this object should have, using copy_value to copy values."""
+        for name, value in self.__dict__.items():
+            if name in self._uncopied_attributes:
+                continue
+            if isinstance(value, TektonObservableList):
+                yield name, TektonObservableList(new_object, value._attribute_name, copy_value(list(value)))
+            else:
+                yield name, copy_value(value)
+
+    def _notify_observers(self, name, old_value, new_value):
+        for observer in list(self.__dict__.get("_observers", ())):
+            observer(self, name, old_value, new_value)
+
+
+class TektonObservableList(list):
+    """A list that reports changes to its contents to the TektonObservable object that owns it.
+
+    Every change marks the owner dirty, and is reported to the owner's observers as a change to the owner's attribute,
+    with a copy of the list's contents before the change as the old value and a copy of its contents after the change as
+    the new value.
+
+    Attributes:
+        (none)
+
+    """
+
+    def __init__(self, owner, attribute_name, iterable=()):
+        super(TektonObservableList, self).__init__(iterable)
+        self._owner = owner
+        self._attribute_name = attribute_name
+
+    def __reduce_ex__(self, protocol):
+        # Copies and pickles are plain lists; the new owner wraps them again when they are assigned.
+        return list, (list(self),)
+
+    def _changed(method_name):
+        list_method = getattr(list, method_name)
+
+        def observed_method(self, *args, **kwargs):
+            self._owner.__dict__["_dirty"] = True
+            if not self._owner.__dict__.get("_observers"):
+                return list_method(self, *args, **kwargs)
+            old_contents = list(self)
+            result = list_method(self, *args, **kwargs)
+            self._owner._notify_observers(self._attribute_name, old_contents, list(self))
+            return result
+
+        observed_method.__name__ = method_name
+        observed_method.__doc__ = list_method.__doc__
+        return observed_method
+
+    append = _changed("append")
+    extend = _changed("extend")
+    insert = _changed("insert")
+    remove = _changed("remove")
+    pop = _changed("pop")
+    clear = _changed("clear")
+    sort = _changed("sort")
+    reverse = _changed("reverse")
+    __setitem__ = _changed("__setitem__")
+    __delitem__ = _changed("__delitem__")
+    __iadd__ = _changed("__iadd__")
+    del _changed
+
 
 def lorom_to_pc(lorom_string, *, byteorder):
     """Converts SNES LoROM addresses into normal PC hex addresses.
@@ -52,7 +207,20 @@ def lorom_to_pc(lorom_string, *, byteorder):
     return pc_value
 
 def pc_to_lorom(pc_address, *, byteorder):
-    lorom_address = pc_address % 0x010000
+    """Converts a normal PC address into a SNES LoROM address.
+
+    Each LoROM bank holds 0x8000 bytes of the ROM at addresses $8000-$FFFF, so PC address 0x000000 is $80:8000 and PC
+    address 0x008000 is $81:8000.
+
+    Args:
+        pc_address (int): PC address to convert.
+        byteorder (str): Byte order (endianess) of the returned bytes. Must be "little" or "big".
+
+    Returns:
+        bytes : Three-byte LoROM address, including the bank.
+
+    """
+    lorom_address = (pc_address % 0x008000) + 0x8000
     lorom_bank = ((pc_address // 0x008000) + 0x80) * 0x10000
 
     return (lorom_bank + lorom_address).to_bytes(3, byteorder=byteorder)
@@ -82,6 +250,26 @@ def overwrite_bytes_at_index(original_string, replace_string, replace_start_inde
     return output_string
 
 
+def overwrite_bytes_in_place(buffer, replace_string, replace_start_index):
+    """Replaces bytes in a writable buffer with a different string, starting at a specific index.
+
+    Unlike overwrite_bytes_at_index, the buffer is modified directly instead of building a new bytes string, so the cost
+    of each write depends on the length of replace_string rather than the length of the buffer. This makes it suitable
+    for applying many small writes to a full ROM.
+
+    Args:
+        buffer (bytearray): The buffer to modify. Any writable buffer, such as a writable mmap, also works.
+        replace_string (bytes): The string of bytes used to overwrite the buffer
+        replace_start_index (int): The index of the buffer where the overwrite should start
+
+    """
+    replace_end_index = replace_start_index + len(replace_string)
+    if replace_start_index < 0 or replace_end_index > len(buffer):
+        raise ValueError("Cannot write {} bytes at index {}, buffer is only {} bytes long.".format(
+            len(replace_string), hex(replace_start_index), len(buffer)))
+    buffer[replace_start_index:replace_end_index] = replace_string
+
+
 def pad_bytes(input_string, min_length, pad_byte):
     """Appends bytes to the end of a input_string to ensure it contains at least min_length bytes. Does not modify the
     string if it is already longer than min_length.
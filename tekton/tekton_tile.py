@@ -16,6 +16,9 @@ class TektonTile:
     considered equivalent. When copying a TektonTile (such as when you are filling a room with the same time) you should
     use the copy() function to create unique TektonTile objects for each tile you need.
 
+    A tile that has been placed in a TektonTileGrid remembers its position in that grid, and reports changes to its
+    attributes to the grid, so the grid knows it needs to be written again.
+
     Attributes:
         bts_type (int): The BTS number of the tile.
         tileno (int): The number of the tile in the tileset graphics (i.e., what the tile looks like)
@@ -33,6 +36,15 @@ class TektonTile:
 
         self._tileno = 0x00
 
+    def __setattr__(self, name, value):
+        grid = self.__dict__.get("_grid")
+        if grid is None or name.startswith("_"):
+            object.__setattr__(self, name, value)
+            return
+        old_tile = self.copy() if grid.__dict__.get("_observers") else None
+        object.__setattr__(self, name, value)
+        grid._tile_changed(self, old_tile)
+
     def __repr__(self):
         """Returns a textual representation of the TektonTile and its properties.
 
@@ -125,10 +137,10 @@ class TektonTile:
             TektonTile : A new instance containing the same attribute values as the original TektonTile.
 
         """
-        copied = TektonTile()
-        copied._tileno = self._tileno
-        copied.bts_type = self.bts_type
-        copied.bts_num = self.bts_num
-        copied.h_mirror = self.h_mirror
-        copied.v_mirror = self.v_mirror
+        copied = TektonTile.__new__(TektonTile)
+        copied.__dict__.update(bts_type=self.bts_type,
+                               bts_num=self.bts_num,
+                               h_mirror=self.h_mirror,
+                               v_mirror=self.v_mirror,
+                               _tileno=self._tileno)
         return copied
@@ -7,21 +7,64 @@ Classes:
     GenerateUncompressedDataFromNoneError: Exception raised when the TileGrid contains one or more None values and
         the uncompressed_data property is called."""
 
+import struct
+
 from .tekton_tile import TektonTile
+from .tekton_system import TektonObservable
+from .tekton_trace import trace_span
 
 
-class TektonTileGrid:
+class TektonTileGrid(TektonObservable):
     """A two-dimensional list for storing and organizing TektonTile objects.
 
     TektonTileGrids contain no TektonTile objects when instantiated, see the fill() function.
 
+    A tile can only be in one place in one grid, so that changes to it are reported to the right grid. Placing a tile
+    which is already in a grid (this one or another) places a copy of it instead.
+
+    The grid is marked dirty whenever a tile is placed in it or a tile in it is changed. Observers added with
+    add_observer are called with (grid, "tiles", old_tiles, new_tiles), where old_tiles and new_tiles are dicts mapping
+    (x, y) coordinates to copies of the tiles at those coordinates before and after the change.
+
     Attributes:
         (none)
 
     """
 
     def __init__(self, width, height):
-        self._tiles = [[None for row in range(height)] for col in range(width)]
+        self._tiles = [_TektonTileColumn(self, col, [None for row in range(height)]) for col in range(width)]
+
+    def __getattr__(self, name):
+        # Only called for attributes that are not set. Grids made by from_uncompressed_data create their tiles here.
+        if name == "_tiles" and "_pending_data" in self.__dict__:
+            self._load_pending_data()
+            return self.__dict__["_tiles"]
+        raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+
+    @classmethod
+    def from_uncompressed_data(cls, width, height, uncompressed_data):
+        """Creates a TektonTileGrid from uncompressed level data, in the same format as the uncompressed_data property.
+
+        The TektonTile objects are not created until the grid's tiles are first used. Until then the grid keeps a
+        reference to uncompressed_data, which can be any buffer, such as a slice of a memory-mapped file.
+
+        Args:
+            width (int): Number of columns in the grid.
+            height (int): Number of rows in the grid.
+            uncompressed_data (bytes): Two bytes of layer 1 data for each tile, followed by one BTS byte for each tile,
+                each in row-major order.
+
+        Returns:
+            TektonTileGrid : New grid containing the tiles described by uncompressed_data.
+
+        """
+        if len(uncompressed_data) != width * height * 3:
+            raise ValueError("Uncompressed data for a {}x{} grid must be {} bytes long!".format(width,
+                                                                                             height,
+                                                                                             width * height * 3))
+        new_grid = cls.__new__(cls)
+        new_grid.__dict__["_pending_data"] = (width, height, uncompressed_data)
+        return new_grid
 
     def __repr__(self):
         return self.__str__()
@@ -59,17 +102,26 @@ class TektonTileGrid:
     @property
     def width(self):
         """int: Number of columns contained in the TektonTileGrid."""
+        pending_data = self.__dict__.get("_pending_data")
+        if pending_data is not None:
+            return pending_data[0]
         return len(self._tiles)
 
     @property
     def height(self):
         """int: Number of rows contained in the TektonTileGrid."""
+        pending_data = self.__dict__.get("_pending_data")
+        if pending_data is not None:
+            return pending_data[1]
         return len(self._tiles[0])
 
     @property
     def uncompressed_data(self):
         """bytes: String of uncompressed data, matching what the level data looks like in game RAM."""
-        return_string = b''
+        pending_data = self.__dict__.get("_pending_data")
+        if pending_data is not None:
+            return bytes(pending_data[2])
+        return_string = bytearray()
         for y in range(self.height):
             for x in range(self.width):
                 if self._tiles[x][y] is None:
@@ -79,7 +131,7 @@ class TektonTileGrid:
             for x in range(self.width):
                 return_string += self._tiles[x][y].bts_number_byte
 
-        return return_string
+        return bytes(return_string)
 
     def fill(self, fill_tile=None):
         """Fills every column/row in the TektonTileGrid with a TektonTile object.
@@ -91,9 +143,28 @@ class TektonTileGrid:
         """
         if fill_tile is None:
             fill_tile = TektonTile()
-        for row in range(self.height):
-            for col in range(self.width):
-                self._tiles[col][row] = fill_tile.copy()
+        old_tiles = self._get_tile_copies() if self.__dict__.get("_observers") else None
+        for col in range(self.width):
+            column = self._tiles[col]
+            for row in range(len(column)):
+                new_tile = fill_tile.copy()
+                new_tile.__dict__.update(_grid=self, _col=col, _row=row)
+                list.__setitem__(column, row, new_tile)
+        self.mark_dirty()
+        if old_tiles is not None:
+            self._notify_observers("tiles", old_tiles, self._get_tile_copies())
+
+    def set_tile(self, x, y, new_tile):
+        """Places a tile at a single position in the grid. Equivalent to grid[x][y] = new_tile. If new_tile is already in a
+        grid, a copy of it is placed instead.
+
+        Args:
+            x (int): Column (x-coordinate) of the position.
+            y (int): Row (y-coordinate) of the position.
+            new_tile (TektonTile): The tile to place, or None to empty the position.
+
+        """
+        self._tiles[x][y] = new_tile
 
     def overwrite_with(self, new_tile_grid, left_coord=0, top_coord=0):
         """Overwrites some or all of the tile grid with tiles from new_tile_grid. Will not copy any elements of
@@ -112,6 +183,96 @@ class TektonTileGrid:
                     if new_tile_grid[col][row] is not None:
                         self._tiles[col + left_coord][row + top_coord] = new_tile_grid[col][row].copy()
 
+    def _load_pending_data(self):
+        width, height, uncompressed_data = self.__dict__.pop("_pending_data")
+        tile_count = width * height
+        with trace_span("load_tiles", width=width, height=height, uncompressed_bytes=len(uncompressed_data)):
+            l1_words = struct.unpack_from("<{}H".format(tile_count), uncompressed_data, 0)
+            bts_numbers = bytes(uncompressed_data[tile_count * 2:tile_count * 3])
+
+            tiles = [_TektonTileColumn(self, col, [None for row in range(height)]) for col in range(width)]
+            for index in range(tile_count):
+                l1_word = l1_words[index]
+                new_tile = TektonTile.__new__(TektonTile)
+                new_tile.__dict__.update(bts_type=l1_word >> 12,
+                                         bts_num=bts_numbers[index],
+                                         h_mirror=bool(l1_word & 0b0000010000000000),
+                                         v_mirror=bool(l1_word & 0b0000100000000000),
+                                         _tileno=l1_word & 0x3ff,
+                                         _grid=self,
+                                         _col=index % width,
+                                         _row=index // width)
+                list.__setitem__(tiles[index % width], index // width, new_tile)
+            self.__dict__["_tiles"] = tiles
+
+    def _get_tile_copies(self):
+        tile_copies = {}
+        for col in range(len(self._tiles)):
+            for row, tile in enumerate(self._tiles[col]):
+                tile_copies[(col, row)] = None if tile is None else tile.copy()
+        return tile_copies
+
+    def _get_placeable_tile(self, tile, col, row):
+        """Returns tile, or a copy of it if it is already in a grid anywhere other than at (col, row) in this grid."""
+        if tile is None:
+            return None
+        tile_grid = tile.__dict__.get("_grid")
+        if tile_grid is None or (tile_grid is self and tile.__dict__["_col"] == col and tile.__dict__["_row"] == row):
+            return tile
+        return tile.copy()
+
+    def _tiles_placed(self, col, rows, old_tiles, new_tiles):
+        """Called by a column after tiles have been assigned to it."""
+        for old_tile in old_tiles:
+            if old_tile is not None and old_tile.__dict__.get("_grid") is self:
+                for tile_attribute in ("_grid", "_col", "_row"):
+                    del old_tile.__dict__[tile_attribute]
+        for row, new_tile in zip(rows, new_tiles):
+            if new_tile is not None:
+                new_tile.__dict__.update(_grid=self, _col=col, _row=row)
+        self.mark_dirty()
+        if self.__dict__.get("_observers"):
+            self._notify_observers("tiles",
+                                   {(col, row): None if tile is None else tile.copy()
+                                    for row, tile in zip(rows, old_tiles)},
+                                   {(col, row): None if tile is None else tile.copy()
+                                    for row, tile in zip(rows, new_tiles)})
+
+    def _tile_changed(self, tile, old_tile):
+        """Called by a tile in this grid after one of its attributes has changed. old_tile is a copy of the tile before
+        the change, or None if this grid has no observers."""
+        self.mark_dirty()
+        if old_tile is None:
+            return
+        position = (tile.__dict__["_col"], tile.__dict__["_row"])
+        self._notify_observers("tiles", {position: old_tile}, {position: tile.copy()})
+
+
+class _TektonTileColumn(list):
+    """A single column of tiles in a TektonTileGrid, which tells the grid when tiles are assigned to it."""
+
+    def __init__(self, grid, col, iterable=()):
+        super(_TektonTileColumn, self).__init__(iterable)
+        self._grid = grid
+        self._col = col
+
+    def __setitem__(self, row, new_value):
+        if isinstance(row, slice):
+            rows = range(*row.indices(len(self)))
+            old_tiles = [self[i] for i in rows]
+            list.__setitem__(self, row, new_value)
+            rows = range(*row.indices(len(self)))
+            new_tiles = [self._grid._get_placeable_tile(self[i], self._col, i) for i in rows]
+            for i, new_tile in zip(rows, new_tiles):
+                list.__setitem__(self, i, new_tile)
+        else:
+            rows = [row + len(self) if row < 0 else row]
+            old_tiles = [self[row]]
+            new_value = self._grid._get_placeable_tile(new_value, self._col, rows[0])
+            list.__setitem__(self, row, new_value)
+            new_tiles = [new_value]
+        self._grid._tiles_placed(self._col, rows, old_tiles, new_tiles)
+
 
 class GenerateUncompressedDataFromNoneError(Exception):
     """Exception raised when the TileGrid contains one or more None values and the uncompressed_data property is called."""
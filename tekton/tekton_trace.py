@@ -0,0 +1,216 @@
+"""Tekton Trace
+
+This module implements optional tracing of where tekton spends its time. While tracing is enabled, the slow parts of
+tekton (importing rooms, expanding level data into tiles, compressing level data and writing a build) each record a span
+with its start time, duration and attributes such as the room header, byte counts and cache hits. Spans nest, and can be
+exported as Chrome trace JSON, which can be opened in chrome://tracing or Perfetto.
+
+Tracing is off by default. While it is off, trace_span returns a shared object that does nothing, so the traced code
+pays only for one function call. Turn it on with enable_tracing, or by setting the TEKTON_TRACE environment variable to
+the path the Chrome trace should be written to when the process exits.
+
+Spans recorded in worker processes (see TektonProject.import_rooms) are not collected.
+
+Classes:
+    TektonTracer: Records spans, and exports them as Chrome trace JSON.
+    TektonSpanRecord: Named tuple describing a single finished span.
+
+Functions:
+    disable_tracing: Stops recording spans.
+    enable_tracing: Starts recording spans.
+    get_tracer: Returns the TektonTracer recording spans, or None if tracing is disabled.
+    trace_span: Returns a context manager that records a span if tracing is enabled.
+
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+TRACE_ENVIRONMENT_VARIABLE = "TEKTON_TRACE"
+
+TektonSpanRecord = namedtuple("TektonSpanRecord", ["name", "start_ns", "duration_ns", "thread_id", "attributes"])
+TektonSpanRecord.__doc__ = """A finished span.
+
+Attributes:
+    name (str): What the span measured, e.g. "import_room_from_rom".
+    start_ns (int): When the span started, in nanoseconds since the tracer was created.
+    duration_ns (int): How long the span took, in nanoseconds.
+    thread_id (int): Identifier of the thread the span ran in.
+    attributes (dict): Details of the span, e.g. {"header": 0x795d4}.
+"""
+
+
+class TektonTracer:
+    """Records spans, and exports them as Chrome trace JSON.
+
+    Attributes:
+        spans (list): TektonSpanRecords for every finished span, in the order they finished.
+
+    """
+
+    def __init__(self):
+        self.spans = []
+        self._start_ns = time.perf_counter_ns()
+
+    def span(self, name, **attributes):
+        """Returns a context manager that records a span from when it is entered until it exits.
+
+        Attributes can be added while the span is running by calling set(**attributes) on the object returned when it is
+        entered. If the span exits with an exception, the exception's type is recorded as the "error" attribute.
+
+        Args:
+            name (str): What the span measures.
+            **attributes: Details of the span.
+
+        Returns:
+            context manager : The span.
+
+        """
+        return _TektonSpan(self, name, attributes)
+
+    def clear(self):
+        """Forgets every span recorded so far."""
+        self.spans = []
+
+    def to_chrome_trace(self):
+        """Returns every recorded span in the Chrome trace event format.
+
+        Returns:
+            dict : Trace with a "traceEvents" list of complete ("X") events, with times in microseconds.
+
+        """
+        process_id = os.getpid()
+        trace_events = []
+        for span_record in sorted(self.spans, key=lambda span_record: span_record.start_ns):
+            trace_events.append({"name": span_record.name,
+                                 "cat": "tekton",
+                                 "ph": "X",
+                                 "ts": span_record.start_ns / 1000,
+                                 "dur": span_record.duration_ns / 1000,
+                                 "pid": process_id,
+                                 "tid": span_record.thread_id,
+                                 "args": span_record.attributes})
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, trace_path):
+        """Writes every recorded span to a file as Chrome trace JSON.
+
+        Args:
+            trace_path (str): Path of the file to write.
+
+        """
+        with open(trace_path, "w") as f:
+            json.dump(self.to_chrome_trace(), f, default=str)
+
+
+class _TektonSpan:
+    __slots__ = ["_tracer", "_name", "_attributes", "_start_ns"]
+
+    def __init__(self, tracer, name, attributes):
+        self._tracer = tracer
+        self._name = name
+        self._attributes = attributes
+        self._start_ns = 0
+
+    def __enter__(self):
+        self._start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end_ns = time.perf_counter_ns()
+        if exc_type is not None:
+            self._attributes["error"] = exc_type.__name__
+        self._tracer.spans.append(TektonSpanRecord(self._name,
+                                                   self._start_ns - self._tracer._start_ns,
+                                                   end_ns - self._start_ns,
+                                                   threading.get_ident(),
+                                                   self._attributes))
+        return False
+
+    def set(self, **attributes):
+        self._attributes.update(attributes)
+
+
+class _TektonNullSpan:
+    __slots__ = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+_NULL_SPAN = _TektonNullSpan()
+_tracer = None
+
+
+def trace_span(name, **attributes):
+    """Returns a context manager that records a span while tracing is enabled, and does nothing otherwise.
+
+    Example:
+        with trace_span("compress", header=room.header) as span:
+            level_data = compress()
+            span.set(compressed_bytes=len(level_data))
+
+    Args:
+        name (str): What the span measures.
+        **attributes: Details of the span.
+
+    Returns:
+        context manager : The span.
+
+    """
+    if _tracer is None:
+        return _NULL_SPAN
+    return _tracer.span(name, **attributes)
+
+
+def enable_tracing(tracer=None):
+    """Starts recording spans.
+
+    Args:
+        tracer (TektonTracer): Optional. The tracer to record spans in. Defaults to a new TektonTracer.
+
+    Returns:
+        TektonTracer : The tracer recording spans.
+
+    """
+    global _tracer
+    if tracer is None:
+        tracer = TektonTracer()
+    _tracer = tracer
+    return tracer
+
+
+def disable_tracing():
+    """Stops recording spans.
+
+    Returns:
+        TektonTracer : The tracer that was recording spans, or None if tracing was not enabled.
+
+    """
+    global _tracer
+    tracer = _tracer
+    _tracer = None
+    return tracer
+
+
+def get_tracer():
+    """Returns the TektonTracer recording spans, or None if tracing is disabled."""
+    return _tracer
+
+
+def _write_environment_trace(tracer, trace_path):
+    tracer.write_chrome_trace(trace_path)
+
+
+if os.environ.get(TRACE_ENVIRONMENT_VARIABLE):
+    atexit.register(_write_environment_trace, enable_tracing(), os.environ[TRACE_ENVIRONMENT_VARIABLE])
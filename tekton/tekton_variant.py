@@ -0,0 +1,317 @@
+"""Tekton Variant
+
+This module implements batch generation of ROM variants from one base project, e.g. for a randomizer that makes
+thousands of ROMs which differ from a common base in only a few rooms.
+
+The base ROM is built and indexed once. Each TektonVariant is a small set of overrides to room attributes, door
+attributes and tiles, and building a variant copies only the rooms and doors it overrides (copy-on-write), so the base
+rooms are never changed and can be shared by every variant. Only the bytes a variant changes are written over the base
+ROM: a room override rewrites the room's header data, a tile override also rewrites its level data, and a door override
+rewrites the door's data.
+
+Variants never move anything in the ROM. A door's data_address cannot be overridden, and level data changed by tile
+overrides must still fit in its room's level_data_length: unlike TektonProject builds, variant builds do not relocate
+level data into free space.
+
+Variants only contain plain values and TektonTiles, so they can be sent to worker processes. When variants are built
+with more than one job, each worker loads the base rooms from a snapshot and maps the base ROM into memory, so the
+operating system shares the base ROM's pages between every worker.
+
+Classes:
+    TektonVariant: A set of room, door and tile overrides to apply to a base ROM.
+    TektonVariantBase: The base ROM and rooms that variants are built from.
+    TektonVariantBuildStats: Named tuple holding the number of variants built, the time taken and the throughput.
+
+"""
+
+import copy
+import os
+import tempfile
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from .tekton_checksum import TektonChecksum, CHECKSUM_COMPLEMENT_ADDRESS
+from .tekton_parallel import split_into_chunks, map_rom_file
+from .tekton_room_record import copy_room, copy_door
+from .tekton_snapshot import write_snapshot, read_snapshot
+from .tekton_system import overwrite_bytes_in_place
+from .tekton_tile import TektonTile
+from .tekton_tile_grid import TektonTileGrid
+
+TektonVariantBuildStats = namedtuple("TektonVariantBuildStats", ["variant_count", "seconds", "variants_per_second"])
+
+_worker_variant_base = None
+
+
+class TektonVariant:
+    """A set of overrides to apply to the rooms and doors of a TektonVariantBase.
+
+    Overrides are only recorded here. They are checked and applied when the variant is built, so the same variant can
+    be built from any base which contains the rooms and doors it overrides.
+
+    Attributes:
+        name (str): Optional nickname for this variant. (This data is not copied to the ROM.)
+        room_overrides (dict): Room header address -> dict of attribute name -> new value.
+        door_overrides (dict): Door data address -> dict of attribute name -> new value.
+        tile_overrides (dict): Room header address -> dict of (x, y) -> new TektonTile in the room's standard state.
+
+    """
+
+    def __init__(self, name=None):
+        self.name = name
+        self.room_overrides = {}
+        self.door_overrides = {}
+        self.tile_overrides = {}
+
+    def set_room_attribute(self, room_header, attribute_name, new_value):
+        """Overrides one attribute of a room, such as up_scroller or special_graphics_bitflag.
+
+        Args:
+            room_header (int): Header address of the room.
+            attribute_name (str): Name of the TektonRoom attribute to override.
+            new_value: Value the attribute should have in this variant.
+
+        """
+        if not isinstance(room_header, int):
+            raise TypeError("room_header must be of type int!")
+        if not isinstance(attribute_name, str):
+            raise TypeError("attribute_name must be of type str!")
+        self.room_overrides.setdefault(room_header, {})[attribute_name] = new_value
+
+    def set_door_attribute(self, door_address, attribute_name, new_value):
+        """Overrides one attribute of a door, such as target_room_id. Every room which uses the door sees the change.
+
+        The door's data_address cannot be overridden, since variants do not rewrite the door lists that point at it.
+
+        Args:
+            door_address (int): Data address of the door.
+            attribute_name (str): Name of the TektonDoor attribute to override.
+            new_value: Value the attribute should have in this variant.
+
+        """
+        if not isinstance(door_address, int):
+            raise TypeError("door_address must be of type int!")
+        if not isinstance(attribute_name, str):
+            raise TypeError("attribute_name must be of type str!")
+        if attribute_name == "data_address":
+            raise ValueError("Variants cannot move a door's data.")
+        self.door_overrides.setdefault(door_address, {})[attribute_name] = new_value
+
+    def set_tile(self, room_header, x, y, new_tile):
+        """Overrides one tile in the standard state of a room. A copy of new_tile is stored.
+
+        The room's level data is not moved when the variant is built, so building raises CompressedDataTooLargeError if
+        the changed tiles no longer compress to fit in the room's level_data_length.
+
+        Args:
+            room_header (int): Header address of the room.
+            x (int): Column (x-coordinate) of the tile.
+            y (int): Row (y-coordinate) of the tile.
+            new_tile (TektonTile): The tile to place.
+
+        """
+        if not isinstance(room_header, int):
+            raise TypeError("room_header must be of type int!")
+        if not isinstance(new_tile, TektonTile):
+            raise TypeError("new_tile must be of type TektonTile!")
+        self.tile_overrides.setdefault(room_header, {})[(x, y)] = new_tile.copy()
+
+
+class TektonVariantBase:
+    """The base ROM and rooms that TektonVariants are built from.
+
+    Neither the base ROM contents nor the base rooms are changed by building variants.
+
+    Attributes:
+        base_contents (bytes): Contents of the base ROM, which every variant's writes are applied over. Any buffer, such
+            as a read-only mmap, can be used.
+        update_checksum (bool): If True, the internal checksum in each variant ROM's header is updated from the base
+            ROM's checksum and the bytes the variant changes. See tekton_checksum.
+
+    """
+
+    def __init__(self, rooms, base_contents, *, update_checksum=False):
+        """Creates a base from rooms and the contents of a ROM they have already been written to.
+
+        Args:
+            rooms (iterable): TektonRooms whose changes are already written to base_contents.
+            base_contents (bytes): Contents of the base ROM.
+            update_checksum (bool): Optional. If True, update each variant's checksum. Defaults to False.
+
+        """
+        self.base_contents = base_contents
+        self.update_checksum = update_checksum
+        self._base_checksum = TektonChecksum(base_contents) if update_checksum else None
+        self._rooms = {}
+        self._doors = {}
+        for room in rooms:
+            self._rooms[room.header] = room
+            for door in room.doors:
+                self._doors.setdefault(door.data_address, door)
+
+    @classmethod
+    def from_project(cls, project):
+        """Creates a TektonVariantBase from a TektonProject, building the project's modified ROM once. Variants update
+        their checksum if the project's update_checksum attribute is True.
+
+        Args:
+            project (TektonProject): Project whose modified ROM and loaded rooms are the base for every variant.
+
+        Returns:
+            TektonVariantBase : New base for building variants.
+
+        """
+        base_contents = project.get_modified_rom_contents()
+        return cls([room for header_address, room in project.rooms.loaded_items()],
+                   base_contents,
+                   update_checksum=project.update_checksum)
+
+    def get_variant_writes(self, variant):
+        """Returns the writes that turn the base ROM into a variant.
+
+        Args:
+            variant (TektonVariant): The variant to generate writes for.
+
+        Returns:
+            list : (PC address, bytes, owner) tuples, where owner is the copied room, room state or door the bytes were
+                generated from.
+
+        """
+        variant_writes = []
+        variant_doors = {}  # Door copies, shared by every room copy in this variant
+
+        for door_address, door_overrides in sorted(variant.door_overrides.items()):
+            if door_address not in self._doors:
+                raise ValueError("Variant overrides a door at {}, which is not in the base.".format(hex(door_address)))
+            if "data_address" in door_overrides:
+                raise ValueError("Variant moves the door at {}, but variants cannot move a door's data.".format(
+                    hex(door_address)))
+            new_door = copy_door(self._doors[door_address])
+            for attribute_name, new_value in door_overrides.items():
+                setattr(new_door, attribute_name, new_value)
+            variant_doors[door_address] = new_door
+            variant_writes.append((door_address, new_door.door_data, new_door))
+
+        for room_header in sorted(set(variant.room_overrides) | set(variant.tile_overrides)):
+            if room_header not in self._rooms:
+                raise ValueError("Variant overrides a room at {}, which is not in the base.".format(hex(room_header)))
+            new_room = copy_room(self._rooms[room_header], variant_doors)
+            for attribute_name, new_value in variant.room_overrides.get(room_header, {}).items():
+                setattr(new_room, attribute_name, new_value)
+
+            tile_overrides = variant.tile_overrides.get(room_header)
+            if tile_overrides:
+                self._apply_tile_overrides(new_room, tile_overrides)
+                variant_writes.append((new_room.standard_state.level_data_address,
+                                       new_room.compressed_level_data(new_room.standard_state),
+                                       new_room.standard_state))
+            variant_writes.append((new_room.header, new_room.header_data, new_room))
+
+        return variant_writes
+
+    def get_variant_rom_contents(self, variant):
+        """Returns the contents of the base ROM with a variant's writes applied.
+
+        Args:
+            variant (TektonVariant): The variant to build.
+
+        Returns:
+            bytes : The binary data of the variant ROM.
+
+        """
+        variant_contents = bytearray(self.base_contents)
+        if not self.update_checksum:
+            for write_address, write_data, write_owner in self.get_variant_writes(variant):
+                overwrite_bytes_in_place(variant_contents, write_data, write_address)
+            return bytes(variant_contents)
+
+        if self._base_checksum is None:
+            self._base_checksum = TektonChecksum(self.base_contents)
+        variant_checksum = copy.copy(self._base_checksum)
+        for write_address, write_data, write_owner in self.get_variant_writes(variant):
+            old_data = bytes(variant_contents[write_address:write_address + len(write_data)])
+            overwrite_bytes_in_place(variant_contents, write_data, write_address)
+            variant_checksum.update(write_address, old_data, write_data)
+        overwrite_bytes_in_place(variant_contents, variant_checksum.header_bytes, CHECKSUM_COMPLEMENT_ADDRESS)
+        return bytes(variant_contents)
+
+    def build_variants(self, variants, output_rom_paths, *, jobs=1):
+        """Builds a list of variants and writes each one to a file.
+
+        If jobs is greater than 1, the variants are split between that many worker processes. The base ROM and rooms are
+        saved to a temporary directory once, and each worker loads them from there when it starts.
+
+        Args:
+            variants (list): TektonVariants to build.
+            output_rom_paths (list): Path to write each variant's ROM to, in the same order as variants.
+            jobs (int): Optional. Number of worker processes to use. Defaults to 1 (no worker processes.)
+
+        Returns:
+            TektonVariantBuildStats : Number of variants built, seconds taken and variants built per second.
+
+        """
+        if not isinstance(jobs, int) or isinstance(jobs, bool):
+            raise TypeError("jobs must be of type int!")
+        if jobs < 1:
+            raise ValueError("jobs must be 1 or greater.")
+        if len(variants) != len(output_rom_paths):
+            raise ValueError("output_rom_paths must contain one path for each variant.")
+
+        start_time = time.perf_counter()
+        if jobs == 1 or len(variants) < 2:
+            for variant, output_rom_path in zip(variants, output_rom_paths):
+                _write_variant_rom(self, variant, output_rom_path)
+        else:
+            with tempfile.TemporaryDirectory() as base_dir:
+                base_rom_path = os.path.join(base_dir, "base.sfc")
+                base_snapshot_path = os.path.join(base_dir, "base.tss")
+                with open(base_rom_path, "wb") as f:
+                    f.write(self.base_contents)
+                write_snapshot(base_snapshot_path, None, sorted(self._rooms.values(), key=lambda room: room.header))
+
+                chunks = split_into_chunks(list(zip(variants, output_rom_paths)), jobs)
+                with ProcessPoolExecutor(max_workers=jobs,
+                                         initializer=_init_variant_worker,
+                                         initargs=(base_rom_path,
+                                                   base_snapshot_path,
+                                                   self.update_checksum)) as executor:
+                    list(executor.map(_build_variants_chunk, chunks))
+        seconds = time.perf_counter() - start_time
+
+        return TektonVariantBuildStats(len(variants), seconds, len(variants) / seconds if seconds > 0 else 0.0)
+
+    def _apply_tile_overrides(self, room, tile_overrides):
+        """Gives a copied room's standard state its own copy of its tile grid, then places the overridden tiles in it.
+
+        Other states of the copied room which shared the base grid are given the same new grid.
+
+        """
+        base_grid = room.standard_state.tiles
+        new_grid = TektonTileGrid(base_grid.width, base_grid.height)
+        new_grid.overwrite_with(base_grid)
+        for (x, y), new_tile in tile_overrides.items():
+            if not (0 <= x < new_grid.width and 0 <= y < new_grid.height):
+                raise ValueError("Tile override at {},{} is outside the room's tiles.".format(x, y))
+            new_grid[x][y] = new_tile.copy()
+
+        room.standard_state.tiles = new_grid
+        for room_state_pointer in room.extra_states:
+            if room_state_pointer.room_state.tiles is base_grid:
+                room_state_pointer.room_state.tiles = new_grid
+
+
+def _write_variant_rom(variant_base, variant, output_rom_path):
+    with open(output_rom_path, "wb") as f:
+        f.write(variant_base.get_variant_rom_contents(variant))
+
+
+def _init_variant_worker(base_rom_path, base_snapshot_path, update_checksum):
+    global _worker_variant_base
+    source_rom_path, rooms = read_snapshot(base_snapshot_path, memory_map=False)
+    _worker_variant_base = TektonVariantBase(rooms, map_rom_file(base_rom_path), update_checksum=update_checksum)
+
+
+def _build_variants_chunk(variants_and_paths):
+    for variant, output_rom_path in variants_and_paths:
+        _write_variant_rom(_worker_variant_base, variant, output_rom_path)
@@ -0,0 +1,161 @@
+"""Tekton Write Index
+
+This module implements an index of the writes a build makes to a ROM, which finds writes that overwrite each other.
+
+Every write is a (PC address, bytes, owner) tuple, as TektonProject generates them. Writes are kept sorted by address,
+so finding every overlap in a build takes O(n log n) time for n writes (plus the number of overlaps found), which is
+cheap enough to check on every build.
+
+Two writes that put the same bytes in the same place, such as a door shared by two rooms, or level data shared by rooms
+whose level data was deduplicated, do not conflict, and are not reported unless asked for.
+
+Classes:
+    TektonWriteIndex: Index of writes, sorted by address, which can be searched for overlapping writes.
+    TektonWriteOverlap: Named tuple describing two writes which overlap.
+    WriteOverlapError: Exception raised when a build in strict mode contains conflicting writes.
+
+Functions:
+    describe_write: Returns a short description of a write, for error messages.
+
+"""
+
+import heapq
+from bisect import bisect_left
+from collections import namedtuple
+
+
+TektonWriteOverlap = namedtuple("TektonWriteOverlap", ["start", "end", "first_write", "second_write"])
+TektonWriteOverlap.__doc__ = """Two writes which write to some of the same bytes.
+
+Attributes:
+    start (int): PC address of the first byte both writes write to.
+    end (int): PC address after the last byte both writes write to.
+    first_write (tuple): The (PC address, bytes, owner) write which starts first.
+    second_write (tuple): The (PC address, bytes, owner) write which starts second.
+"""
+
+
+class TektonWriteIndex:
+    """An index of (PC address, bytes, owner) writes, sorted by address.
+
+    Attributes:
+        (none)
+
+    """
+
+    def __init__(self, writes=()):
+        """
+        Args:
+            writes (iterable): Optional. (PC address, bytes, owner) tuples to add to the index.
+
+        """
+        self._writes = []
+        self._sorted_writes = None
+        self._sorted_starts = None
+        self._max_ends = None  # Largest end address of any write up to and including each index of _sorted_writes
+        for write_address, write_data, write_owner in writes:
+            self.add_write(write_address, write_data, write_owner)
+
+    def __len__(self):
+        """Returns the number of writes in the index."""
+        return len(self._writes)
+
+    def add_write(self, address, data, owner):
+        """Adds a write to the index. Empty writes are ignored, since they cannot overlap anything.
+
+        Args:
+            address (int): PC address of the first byte written.
+            data (bytes): The bytes written.
+            owner: The object the bytes were generated from.
+
+        """
+        if not isinstance(address, int):
+            raise TypeError("address must be of type int!")
+        if len(data) > 0:
+            self._writes.append((address, data, owner))
+            self._sorted_writes = None
+
+    def writes_in_range(self, start_address, end_address):
+        """Returns every write that writes to at least one byte in a range of addresses.
+
+        Args:
+            start_address (int): PC address of the first byte in the range.
+            end_address (int): PC address after the last byte in the range.
+
+        Returns:
+            list : (PC address, bytes, owner) tuples, sorted by address.
+
+        """
+        self._sort_writes()
+        found_writes = []
+        index = bisect_left(self._sorted_starts, end_address) - 1
+        while index >= 0 and self._max_ends[index] > start_address:
+            write_address, write_data, write_owner = self._sorted_writes[index]
+            if write_address + len(write_data) > start_address:
+                found_writes.append(self._sorted_writes[index])
+            index -= 1
+        found_writes.reverse()
+        return found_writes
+
+    def find_overlaps(self, *, include_identical=False):
+        """Finds every pair of writes which write to some of the same bytes.
+
+        Args:
+            include_identical (bool): Optional. If True, writes which write the same values to the bytes they share are
+                reported too. Defaults to False.
+
+        Returns:
+            list : TektonWriteOverlaps, sorted by the address of their first write.
+
+        """
+        self._sort_writes()
+        overlaps = []
+        active_writes = []  # Heap of (end address, index) of earlier writes which have not ended yet
+        for index, (write_address, write_data, write_owner) in enumerate(self._sorted_writes):
+            while active_writes and active_writes[0][0] <= write_address:
+                heapq.heappop(active_writes)
+            write_end = write_address + len(write_data)
+            for active_end, active_index in sorted(active_writes, key=lambda active_write: active_write[1]):
+                active_write = self._sorted_writes[active_index]
+                overlap_end = min(active_end, write_end)
+                if include_identical or _get_write_bytes(active_write, write_address, overlap_end) != \
+                        _get_write_bytes(self._sorted_writes[index], write_address, overlap_end):
+                    overlaps.append(TektonWriteOverlap(write_address, overlap_end, active_write,
+                                                       self._sorted_writes[index]))
+            heapq.heappush(active_writes, (write_end, index))
+        return overlaps
+
+    def _sort_writes(self):
+        if self._sorted_writes is not None:
+            return
+        self._sorted_writes = sorted(self._writes, key=lambda write: (write[0], write[0] + len(write[1])))
+        self._sorted_starts = [write_address for write_address, write_data, write_owner in self._sorted_writes]
+        self._max_ends = []
+        max_end = 0
+        for write_address, write_data, write_owner in self._sorted_writes:
+            max_end = max(max_end, write_address + len(write_data))
+            self._max_ends.append(max_end)
+
+
+def describe_write(write):
+    """Returns a short description of a write, for error messages.
+
+    Args:
+        write (tuple): A (PC address, bytes, owner) write.
+
+    Returns:
+        str : e.g. "TektonRoom write of 38 bytes at 0x795d4".
+
+    """
+    write_address, write_data, write_owner = write
+    return "{} write of {} bytes at {}".format(type(write_owner).__name__, len(write_data), hex(write_address))
+
+
+def _get_write_bytes(write, start_address, end_address):
+    write_address, write_data, write_owner = write
+    return bytes(write_data[start_address - write_address:end_address - write_address])
+
+
+class WriteOverlapError(Exception):
+    """Exception raised when a build in strict mode contains writes which overwrite each other with different bytes."""
+    pass
@@ -0,0 +1,64 @@
+from testing_common import tekton
+from tekton import tekton_address_space
+import unittest
+
+
+class TestTektonAddressSpace(unittest.TestCase):
+    def setUp(self):
+        self.test_space = tekton_address_space.TektonAddressSpace(0x300000)
+
+    def test_init(self):
+        self.assertEqual(0x300000, self.test_space.rom_size)
+        with self.assertRaises(TypeError):
+            tekton_address_space.TektonAddressSpace("0x300000")
+        with self.assertRaises(ValueError):
+            tekton_address_space.TektonAddressSpace(0x400001)
+
+    def test_lorom_to_pc(self):
+        self.assertEqual(0x21bcd2, self.test_space.lorom_to_pc(0xc3bcd2))
+        self.assertEqual(0x26950e, self.test_space.lorom_to_pc(0xcd950e))
+        self.assertEqual(0x000000, self.test_space.lorom_to_pc(0x808000))
+        self.assertEqual(0x008000, self.test_space.lorom_to_pc(0x818000))
+        self.assertEqual(0x001999, self.test_space.lorom_to_pc(0x809999 - 0x8000),
+                         "Addresses below $8000 were not read as if they were $8000 higher!")
+        self.assertEqual(0x79461, self.test_space.bank_pointer_to_pc(0x9461, 0x8f))
+        with self.assertRaises(ValueError):
+            self.test_space.lorom_to_pc(0x7f8000)
+        with self.assertRaises(ValueError):
+            self.test_space.lorom_to_pc(0xe08000)  # Past the end of a 3 MB ROM
+
+    def test_pc_to_lorom(self):
+        self.assertEqual(0xc3bcd2, self.test_space.pc_to_lorom(0x21bcd2))
+        self.assertEqual(0x808000, self.test_space.pc_to_lorom(0x000000))
+        self.assertEqual(0x848000, self.test_space.pc_to_lorom(0x020000),
+                         "PC address in the first half of a 64K block did not get the $8000 offset!")
+        self.assertEqual(b'\xd2\xbc\xc3', self.test_space.pointer_bytes(0x21bcd2))
+        self.assertEqual(b'\xd2\xbc', self.test_space.pointer_bytes(0x21bcd2, length=2))
+        with self.assertRaises(ValueError):
+            self.test_space.pc_to_lorom(0x300000)
+
+    def test_round_trip(self):
+        pc_addresses = list(range(0, 0x300000, 0x1234)) + [0x2fffff]
+        lorom_addresses = self.test_space.pc_to_lorom_array(pc_addresses)
+        self.assertEqual([self.test_space.pc_to_lorom(pc_address) for pc_address in pc_addresses], lorom_addresses)
+        self.assertEqual(pc_addresses, self.test_space.lorom_to_pc_array(lorom_addresses))
+        self.assertEqual([], self.test_space.lorom_to_pc_array([]))
+        with self.assertRaises(ValueError):
+            self.test_space.lorom_to_pc_array([0xc3bcd2, 0x7f8000])
+
+    def test_read_pointers(self):
+        test_rom = bytearray(0x10000)
+        test_rom[0x100:0x103] = b'\xd2\xbc\xc3'
+        test_rom[0x103:0x106] = b'\x00\x80\x80'
+        test_rom[0x200:0x202] = b'\x61\x94'
+
+        self.assertEqual([0x21bcd2, 0x0], self.test_space.read_pointers(test_rom, [0x100, 0x103]))
+        self.assertEqual([0x79461], self.test_space.read_pointers(test_rom, [0x200], bank=0x8f))
+        self.assertEqual([], self.test_space.read_pointers(test_rom, []))
+        with self.assertRaises(ValueError):
+            self.test_space.read_pointers(test_rom, [0xffff])
+
+    def test_get_address_space(self):
+        self.assertIs(tekton_address_space.get_address_space(0x300000),
+                      tekton_address_space.get_address_space(0x300000))
+        self.assertEqual(tekton_address_space.MAX_LOROM_ROM_SIZE, tekton_address_space.get_address_space().rom_size)
@@ -0,0 +1,135 @@
+import os
+import random
+import tempfile
+import unittest
+
+from testing_common import tekton, load_room_from_test_data
+from test_tekton_patch import apply_ips_patch
+from tekton import tekton_checksum, tekton_project, tekton_variant
+
+
+def get_mirrored_contents(rom_contents):
+    power_of_two = 1 << (len(rom_contents).bit_length() - 1)
+    if power_of_two == len(rom_contents):
+        return bytes(rom_contents)
+    mirrored_remainder = get_mirrored_contents(rom_contents[power_of_two:])
+    return bytes(rom_contents[:power_of_two]) + mirrored_remainder * (power_of_two // len(mirrored_remainder))
+
+
+def calculate_reference_checksum(rom_contents):
+    rom_contents = bytearray(rom_contents)
+    rom_contents[0x7fdc:0x7fe0] = b'\xff\xff\x00\x00'
+    return sum(get_mirrored_contents(rom_contents)) & 0xffff
+
+
+class TestTektonChecksum(unittest.TestCase):
+    def setUp(self):
+        random.seed(0x795d4)
+        self.test_contents = bytes(random.randrange(0x100) for i in range(0x38000))
+
+    def test_get_checksum_ranges(self):
+        self.assertEqual([(0, 0x400000, 1)], tekton_checksum.get_checksum_ranges(0x400000))
+        self.assertEqual([(0, 0x200000, 1), (0x200000, 0x300000, 2)], tekton_checksum.get_checksum_ranges(0x300000))
+        self.assertEqual([(0, 0x200000, 1), (0x200000, 0x300000, 1), (0x300000, 0x380000, 2)],
+                         tekton_checksum.get_checksum_ranges(0x380000))
+
+    def test_calculate_checksum(self):
+        for rom_size in [0x8000, 0x20000, 0x30000, 0x38000]:
+            rom_contents = self.test_contents[:rom_size]
+            self.assertEqual(calculate_reference_checksum(rom_contents), tekton_checksum.calculate_checksum(rom_contents),
+                             "Incorrect checksum for a ROM of {} bytes!".format(hex(rom_size)))
+
+        with self.assertRaises(ValueError):
+            tekton_checksum.calculate_checksum(bytes(0x1000))
+
+    def test_verify_checksum(self):
+        rom_contents = bytearray(self.test_contents)
+        self.assertFalse(tekton_checksum.verify_checksum(rom_contents))
+        checksum = tekton_checksum.calculate_checksum(rom_contents)
+        rom_contents[0x7fdc:0x7fe0] = (checksum ^ 0xffff).to_bytes(2, byteorder="little") + \
+            checksum.to_bytes(2, byteorder="little")
+        self.assertTrue(tekton_checksum.verify_checksum(rom_contents))
+        rom_contents[0x30000] ^= 0x01
+        self.assertFalse(tekton_checksum.verify_checksum(rom_contents))
+
+    def test_update(self):
+        rom_contents = bytearray(self.test_contents)
+        test_checksum = tekton_checksum.TektonChecksum(rom_contents)
+        self.assertEqual(calculate_reference_checksum(rom_contents), test_checksum.checksum)
+
+        test_writes = [(0x100, b'\x00' * 0x20), (0x7fd0, b'\x12' * 0x20), (0x1fff0, b'\xff' * 0x20),
+                       (0x37ff0, b'\x34' * 0x10), (0x30000, b'\x56')]
+        for write_address, write_data in test_writes:
+            old_data = bytes(rom_contents[write_address:write_address + len(write_data)])
+            rom_contents[write_address:write_address + len(write_data)] = write_data
+            test_checksum.update(write_address, old_data, write_data)
+            self.assertEqual(calculate_reference_checksum(rom_contents), test_checksum.checksum,
+                             "Incorrect checksum after a write at {}!".format(hex(write_address)))
+        self.assertEqual(test_checksum.checksum ^ 0xffff, test_checksum.complement)
+
+        rom_contents[0x7fdc:0x7fe0] = test_checksum.header_bytes
+        self.assertTrue(tekton_checksum.verify_checksum(rom_contents))
+
+        with self.assertRaises(ValueError):
+            test_checksum.update(0x100, b'\x00', b'\x00\x00')
+        with self.assertRaises(ValueError):
+            test_checksum.update(0x37fff, b'\x00\x00', b'\x00\x00')
+
+    def test_project_checksum(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source_rom_path = os.path.join(temp_dir, "source_rom.sfc")
+            output_rom_path = os.path.join(temp_dir, "output_rom.sfc")
+            with open(source_rom_path, "wb") as f:
+                f.write(bytes(range(0x100)) * 0x3000)
+
+            test_project = tekton_project.TektonProject()
+            test_project.source_rom_path = source_rom_path
+            test_project.update_checksum = True
+            test_project.rooms.add_room(load_room_from_test_data({"header": 0x795d4,
+                                                                  "room_width": 2,
+                                                                  "room_height": 1,
+                                                                  "standard_state": {"level_data_address": 0x21bcd2},
+                                                                  "doors": [{"data_address": 0x18ac6,
+                                                                             "target_room_id": 0x79461}]}))
+            modified_contents = test_project.get_modified_rom_contents()
+            self.assertTrue(tekton_checksum.verify_checksum(modified_contents))
+
+            test_project.rooms[0x795d4].standard_state.tiles[0][0].tileno = 0x2e0
+            modified_contents = test_project.get_modified_rom_contents()
+            self.assertTrue(tekton_checksum.verify_checksum(modified_contents),
+                            "Checksum was not updated by an incremental build!")
+
+            test_project.build_to(output_rom_path)
+            with open(output_rom_path, "rb") as f:
+                self.assertEqual(modified_contents, f.read())
+            with open(source_rom_path, "rb") as f:
+                source_contents = f.read()
+            self.assertEqual(modified_contents, apply_ips_patch(source_contents, test_project.get_ips_patch()))
+
+            # The source ROM's checksum is reused between builds, until the source ROM changes
+            source_checksum = test_project._source_checksum
+            test_project.get_ips_patch()
+            self.assertIs(source_checksum, test_project._source_checksum, "Source ROM was summed again!")
+            with open(source_rom_path, "wb") as f:
+                f.write(bytes(range(0xff, -1, -1)) * 0x3000)
+            os.utime(source_rom_path, ns=(0, 0))
+            with open(source_rom_path, "rb") as f:
+                changed_source_contents = f.read()
+            self.assertTrue(tekton_checksum.verify_checksum(apply_ips_patch(changed_source_contents,
+                                                                            test_project.get_ips_patch())),
+                            "Checksum was not recalculated after the source ROM changed!")
+            with open(source_rom_path, "wb") as f:
+                f.write(source_contents)
+
+            variant_base = tekton_variant.TektonVariantBase.from_project(test_project)
+            test_variant = tekton_variant.TektonVariant()
+            test_variant.set_room_attribute(0x795d4, "up_scroller", 0x70)
+            self.assertTrue(tekton_checksum.verify_checksum(variant_base.get_variant_rom_contents(test_variant)),
+                            "Checksum was not updated in a variant!")
+
+            test_project.update_checksum = False
+            self.assertEqual(source_contents[0x7fdc:0x7fe0], test_project.get_modified_rom_contents()[0x7fdc:0x7fe0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+from testing_common import tekton
+from tekton import tekton_door_graph, tekton_room, tekton_room_dict, tekton_door
+import unittest
+
+
+class TestTektonDoorGraph(unittest.TestCase):
+    def setUp(self):
+        # Rooms 0x79000 <-> 0x79100 -> 0x79200 <-> 0x79300, and 0x79400 with no doors
+        self.test_dict = tekton_room_dict.TektonRoomDict()
+        self.test_rooms = {}
+        for header in [0x79000, 0x79100, 0x79200, 0x79300, 0x79400]:
+            test_room = tekton_room.TektonRoom()
+            test_room.header = header
+            self.test_rooms[header] = test_room
+            self.test_dict.add_room(test_room)
+        self.test_doors = {}
+        for source_header, target_header in [(0x79000, 0x79100),
+                                             (0x79100, 0x79000),
+                                             (0x79100, 0x79200),
+                                             (0x79200, 0x79300),
+                                             (0x79300, 0x79200)]:
+            test_door = tekton_door.TektonDoor()
+            test_door.data_address = 0x18000 + len(self.test_doors) * 12
+            test_door.target_room_id = target_header
+            self.test_doors[(source_header, target_header)] = test_door
+            self.test_rooms[source_header].doors.append(test_door)
+        self.test_rooms[0x79400].doors.append(tekton_door.TektonElevatorLaunchpad())
+        self.test_graph = tekton_door_graph.TektonDoorGraph(self.test_dict)
+
+    def test_nodes_and_edges(self):
+        self.assertEqual(5, self.test_graph.node_count)
+        self.assertEqual(5, self.test_graph.edge_count)
+        self.assertEqual(2, self.test_graph.node_id(0x79200))
+        self.assertEqual(0x79200, self.test_graph.header(2))
+        self.assertEqual([0x79000, 0x79200], self.test_graph.neighbors(0x79100))
+        self.assertEqual([], self.test_graph.neighbors(0x79400))
+        with self.assertRaises(KeyError):
+            self.test_graph.node_id(0x79500)
+
+    def test_reachability(self):
+        self.assertEqual([0x79000, 0x79100, 0x79200, 0x79300], self.test_graph.reachable_from(0x79000))
+        self.assertEqual([0x79000, 0x79100, 0x79400], self.test_graph.unreachable_from(0x79200))
+        self.assertEqual([0x79000, 0x79100, 0x79200, 0x79300], self.test_graph.unreachable_from(0x79400))
+
+    def test_shortest_path(self):
+        self.assertEqual([0x79000, 0x79100, 0x79200, 0x79300], self.test_graph.shortest_path(0x79000, 0x79300))
+        self.assertEqual([0x79000], self.test_graph.shortest_path(0x79000, 0x79000))
+        self.assertIsNone(self.test_graph.shortest_path(0x79300, 0x79000))
+        self.assertEqual({0x79200: 0, 0x79300: 1}, self.test_graph.distances_from(0x79200))
+
+        # A shortcut that costs more than going the long way around
+        shortcut_door = tekton_door.TektonDoor()
+        shortcut_door.target_room_id = 0x79300
+        self.test_rooms[0x79000].doors.append(shortcut_door)
+        weighted_graph = tekton_door_graph.TektonDoorGraph(
+            self.test_dict, door_weight=lambda room, door: 5 if door is shortcut_door else 1
+        )
+        self.assertEqual([0x79000, 0x79300], self.test_graph.shortest_path(0x79000, 0x79300))
+        self.assertEqual([0x79000, 0x79100, 0x79200, 0x79300], weighted_graph.shortest_path(0x79000, 0x79300))
+        self.assertEqual(3, weighted_graph.distances_from(0x79000)[0x79300])
+
+    def test_strongly_connected_components(self):
+        self.assertEqual([[0x79000, 0x79100], [0x79200, 0x79300], [0x79400]],
+                         self.test_graph.strongly_connected_components())
+        self.assertTrue(self.test_graph.same_component(0x79300, 0x79200))
+        self.assertFalse(self.test_graph.same_component(0x79100, 0x79200))
+
+    def test_door_target_change(self):
+        self.test_graph.node_count  # Build the graph before changing it
+        offsets = self.test_graph._offsets
+        self.test_doors[(0x79300, 0x79200)].target_room_id = 0x79100
+        self.assertIs(offsets, self.test_graph._offsets, "Graph was rebuilt when a door target changed!")
+        self.assertEqual([0x79000, 0x79100, 0x79200, 0x79300], self.test_graph.reachable_from(0x79300))
+        self.assertEqual([[0x79000, 0x79100, 0x79200, 0x79300], [0x79400]],
+                         self.test_graph.strongly_connected_components())
+
+        self.test_doors[(0x79300, 0x79200)].target_room_id = 0x7a000  # Not a room in the graph
+        self.assertEqual([0x79300], self.test_graph.reachable_from(0x79300))
+
+    def test_structural_changes(self):
+        self.assertEqual([0x79400], self.test_graph.reachable_from(0x79400))
+
+        new_door = tekton_door.TektonDoor()
+        new_door.target_room_id = 0x79000
+        self.test_rooms[0x79400].doors.append(new_door)
+        self.assertEqual([0x79000, 0x79100, 0x79200, 0x79300, 0x79400], self.test_graph.reachable_from(0x79400))
+
+        new_room = tekton_room.TektonRoom()
+        new_room.header = 0x79500
+        new_door.target_room_id = 0x79500
+        self.test_dict.add_room(new_room)
+        self.assertEqual([0x79400, 0x79500], self.test_graph.reachable_from(0x79400))
+
+        self.test_dict.remove_room(0x79500)
+        self.assertEqual([0x79400], self.test_graph.reachable_from(0x79400))
+
+        # Doors still lead to the old header, which is no longer in the graph
+        self.test_rooms[0x79000].header = 0x79500
+        self.assertEqual([0x79100, 0x79200, 0x79300], self.test_graph.reachable_from(0x79100))
+        self.assertEqual([0x79100, 0x79200, 0x79300, 0x79500], self.test_graph.reachable_from(0x79500))
+
+        self.test_graph.detach()
+        with self.assertRaises(ValueError):
+            self.test_graph.reachable_from(0x79100)
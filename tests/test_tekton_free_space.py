@@ -0,0 +1,91 @@
+import unittest
+
+from testing_common import tekton
+from tekton import tekton_free_space
+
+
+class TestTektonFreeSpace(unittest.TestCase):
+    def test_init(self):
+        test_free_space = tekton_free_space.TektonFreeSpace()
+        self.assertEqual(0, len(test_free_space))
+        self.assertEqual([], test_free_space.blocks)
+        self.assertEqual(0, test_free_space.free_bytes)
+
+    def test_add_free_block(self):
+        test_free_space = tekton_free_space.TektonFreeSpace()
+        test_free_space.add_free_block(0x21000, 0x100)
+        test_free_space.add_free_block(0x21100, 0x80)  # Touches the previous block, so they are merged
+        test_free_space.add_free_block(0x20f80, 0x100)  # Overlaps the first block
+        test_free_space.add_free_block(0x23000, 0x10)
+        self.assertEqual([(0x20f80, 0x200), (0x23000, 0x10)], test_free_space.blocks)
+        self.assertEqual(0x210, test_free_space.free_bytes)
+
+    def test_add_free_block_bank_boundaries(self):
+        test_free_space = tekton_free_space.TektonFreeSpace()
+        test_free_space.add_free_block(0x27ff0, 0x8020)
+        self.assertEqual([(0x27ff0, 0x10), (0x28000, 0x8000), (0x30000, 0x10)],
+                         test_free_space.blocks,
+                         "Free block was not split at LoROM bank boundaries!")
+
+        test_free_space.add_free_block(0x27fe0, 0x10)
+        self.assertEqual((0x27fe0, 0x20), test_free_space.blocks[0])
+        self.assertEqual(0x20 + 0x8000 + 0x10, test_free_space.free_bytes)
+
+    def test_add_free_block_validation(self):
+        test_free_space = tekton_free_space.TektonFreeSpace()
+        with self.assertRaises(TypeError):
+            test_free_space.add_free_block("0x21000", 0x10)
+        with self.assertRaises(TypeError):
+            test_free_space.add_free_block(0x21000, "0x10")
+        with self.assertRaises(ValueError):
+            test_free_space.add_free_block(-1, 0x10)
+        with self.assertRaises(ValueError):
+            test_free_space.add_free_block(0x21000, -1)
+
+    def test_add_padding(self):
+        rom_contents = b'\x01\x02\xff' + b'\xff' * 0x20 + b'\x03\xff\xff\x04' + b'\xff' * 0x18
+        test_free_space = tekton_free_space.TektonFreeSpace()
+        test_free_space.add_padding(rom_contents, 0, len(rom_contents))
+        self.assertEqual([(0x03, 0x20), (0x28, 0x17)],
+                         test_free_space.blocks,
+                         "Padding was not found, or the byte ending the data before it was not left alone!")
+
+        test_free_space = tekton_free_space.TektonFreeSpace()
+        test_free_space.add_padding(rom_contents, 0, 0x10, min_length=8)
+        self.assertEqual([(0x03, 0x0d)], test_free_space.blocks, "Padding outside the scanned range was added!")
+
+        with self.assertRaises(ValueError):
+            test_free_space.add_padding(rom_contents, 0, len(rom_contents), min_length=0)
+
+    def test_allocate(self):
+        test_free_space = tekton_free_space.TektonFreeSpace()
+        test_free_space.add_free_block(0x21000, 0x100)
+        test_free_space.add_free_block(0x22000, 0x40)
+        test_free_space.add_free_block(0x23000, 0x80)
+
+        self.assertEqual(0x23000, test_free_space.allocate(0x50), "Allocation did not use the best fitting block!")
+        self.assertEqual(0x22000, test_free_space.allocate(0x40))
+        self.assertEqual(0x23050, test_free_space.allocate(0x30))
+        self.assertEqual([(0x21000, 0x100)], test_free_space.blocks)
+
+        with self.assertRaises(tekton_free_space.OutOfFreeSpaceError):
+            test_free_space.allocate(0x101)
+        with self.assertRaises(ValueError):
+            test_free_space.allocate(0)
+        with self.assertRaises(TypeError):
+            test_free_space.allocate("0x10")
+
+    def test_release(self):
+        test_free_space = tekton_free_space.TektonFreeSpace()
+        test_free_space.add_free_block(0x21000, 0x100)
+        first_address = test_free_space.allocate(0x80)
+        second_address = test_free_space.allocate(0x80)
+        self.assertEqual(0, len(test_free_space))
+
+        test_free_space.release(second_address, 0x80)
+        test_free_space.release(first_address, 0x80)
+        self.assertEqual([(0x21000, 0x100)], test_free_space.blocks, "Released blocks were not merged!")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from testing_common import tekton, load_room_from_test_data
+from tekton import tekton_import_cache, tekton_project
+
+
+class TestTektonImportCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.temp_dir.name, "cache")
+        self.room_headers = [{"header": 0x795d4, "name": "Crateria Tube"}, {"header": 0x79461, "name": "Save Room"}]
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def get_test_rooms(self):
+        test_rooms = []
+        for room_data, level_data_address in zip(self.room_headers, [0x21bcd2, 0x21c000]):
+            test_rooms.append(load_room_from_test_data({"header": room_data["header"],
+                                                        "name": room_data["name"],
+                                                        "room_width": 1,
+                                                        "room_height": 1,
+                                                        "standard_state": {"level_data_address": level_data_address},
+                                                        "doors": [{"data_address": 0x18ac6,
+                                                                   "target_room_id": 0x792b3}]}))
+        return test_rooms
+
+    def test_get_tekton_version(self):
+        self.assertEqual(40, len(tekton_import_cache.get_tekton_version()))
+        self.assertEqual(tekton_import_cache.get_tekton_version(), tekton_import_cache.get_tekton_version())
+
+    def test_get_import_cache_key(self):
+        rom_contents = b'\x00' * 0x1000
+        test_key = tekton_import_cache.get_import_cache_key(rom_contents, self.room_headers)
+        self.assertEqual(test_key, tekton_import_cache.get_import_cache_key(rom_contents, list(self.room_headers)))
+        self.assertNotEqual(test_key, tekton_import_cache.get_import_cache_key(b'\x01' + rom_contents[1:],
+                                                                               self.room_headers),
+                            "Changing the ROM did not change the cache key!")
+        self.assertNotEqual(test_key, tekton_import_cache.get_import_cache_key(rom_contents, self.room_headers[:1]),
+                            "Changing the header list did not change the cache key!")
+        renamed_headers = [{"header": 0x795d4, "name": "Crateria Tube 2"}, self.room_headers[1]]
+        self.assertNotEqual(test_key, tekton_import_cache.get_import_cache_key(rom_contents, renamed_headers),
+                            "Changing a room name did not change the cache key!")
+
+    def test_save_and_load(self):
+        self.assertIsNone(tekton_import_cache.load_cached_rooms(self.cache_dir, "a" * 40))
+
+        tekton_import_cache.save_cached_rooms(self.cache_dir, "a" * 40, self.get_test_rooms())
+        cached_rooms = tekton_import_cache.load_cached_rooms(self.cache_dir, "a" * 40)
+        self.assertEqual(["Crateria Tube", "Save Room"], [room.name for room in cached_rooms])
+        self.assertEqual(self.get_test_rooms()[0].header_data, cached_rooms[0].header_data)
+
+        # An entry whose saved key does not match its file name is not used
+        shutil.copy(os.path.join(self.cache_dir, "a" * 40 + tekton_import_cache.IMPORT_CACHE_SUFFIX),
+                    os.path.join(self.cache_dir, "b" * 40 + tekton_import_cache.IMPORT_CACHE_SUFFIX))
+        self.assertIsNone(tekton_import_cache.load_cached_rooms(self.cache_dir, "b" * 40))
+
+        # Truncated entries are not used
+        with open(os.path.join(self.cache_dir, "a" * 40 + tekton_import_cache.IMPORT_CACHE_SUFFIX), "r+b") as f:
+            f.truncate(200)
+        self.assertIsNone(tekton_import_cache.load_cached_rooms(self.cache_dir, "a" * 40))
+
+    def test_project_import_cache(self):
+        source_rom_path = os.path.join(self.temp_dir.name, "test_rom.sfc")
+        header_address_file = os.path.join(self.temp_dir.name, "headers.yaml")
+        rom_contents = bytearray(0x300000)
+        for test_room in self.get_test_rooms():
+            rom_contents[test_room.header:test_room.header + len(test_room.header_data)] = test_room.header_data
+            rom_contents[0x18ac6:0x18ad2] = test_room.doors[0].door_data
+        with open(source_rom_path, "wb") as f:
+            f.write(rom_contents)
+        with open(header_address_file, "w") as f:
+            for room_data in self.room_headers:
+                f.write("- header: {}\n  name: {}\n".format(hex(room_data["header"]), room_data["name"]))
+
+        first_project = tekton_project.TektonProject()
+        first_project.source_rom_path = source_rom_path
+        first_project.import_rooms(header_address_file, cache_dir=self.cache_dir)
+        self.assertEqual(1, len(os.listdir(self.cache_dir)), "Import was not saved to the cache!")
+
+        # Replace the cache entry, to check that the next import reads it
+        cache_key = tekton_import_cache.get_import_cache_key(bytes(rom_contents), self.room_headers)
+        cached_rooms = self.get_test_rooms()
+        cached_rooms[0].up_scroller = 0x70
+        tekton_import_cache.save_cached_rooms(self.cache_dir, cache_key, cached_rooms)
+
+        second_project = tekton_project.TektonProject()
+        second_project.source_rom_path = source_rom_path
+        second_project.import_rooms(header_address_file, cache_dir=self.cache_dir)
+        self.assertEqual(first_project.rooms.keys(), second_project.rooms.keys())
+        self.assertEqual(0x70, second_project.rooms[0x795d4].up_scroller, "Rooms were not loaded from the cache!")
+        self.assertEqual("Crateria Tube", second_project.rooms[0x795d4].name)
+
+        with self.assertRaises(ValueError):
+            tekton_project.TektonProject().import_rooms(header_address_file, lazy=True, cache_dir=self.cache_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
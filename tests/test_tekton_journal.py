@@ -0,0 +1,144 @@
+import os
+import tempfile
+import unittest
+
+from testing_common import tekton, load_room_from_test_data
+from tekton import tekton_door, tekton_journal, tekton_project, tekton_room, tekton_room_state, tekton_tile
+
+
+class TestTektonJournal(unittest.TestCase):
+    def get_test_project(self):
+        test_project = tekton_project.TektonProject()
+        for room_data in [{"header": 0x795d4,
+                           "room_width": 2,
+                           "room_height": 1,
+                           "standard_state": {"level_data_address": 0x21bcd2},
+                           "extra_states": [{"type": "event_state",
+                                             "event_value": 0x0e,
+                                             "room_state": {"level_data_address": 0x21bcd2}}],
+                           "doors": [{"data_address": 0x18ac6, "target_room_id": 0x79461}]},
+                          {"header": 0x79461,
+                           "room_width": 1,
+                           "room_height": 1,
+                           "standard_state": {"level_data_address": 0x21c000}}]:
+            test_project.rooms.add_room(load_room_from_test_data(room_data))
+        crateria_tube = test_project.rooms[0x795d4]
+        crateria_tube.extra_states[0].room_state.tiles = crateria_tube.standard_state.tiles
+        test_project.rooms[0x79461].doors.append(crateria_tube.doors[0])
+        return test_project
+
+    def get_project_state(self, test_project):
+        return [(room.header, room.header_data, room.standard_state.tiles.uncompressed_data,
+                 [door.door_data for door in room.doors])
+                for header, room in test_project.rooms.loaded_items()]
+
+    def make_test_edits(self, test_project):
+        crateria_tube = test_project.rooms[0x795d4]
+        crateria_tube.up_scroller = 0x70
+        crateria_tube.map_area = tekton_room.MapArea.BRINSTAR
+        crateria_tube.doors[0].target_room_id = 0x792b3
+        crateria_tube.extra_states[0].room_state.songset = tekton_room_state.SongSet.LOWER_BRINSTAR
+        crateria_tube.standard_state.tiles[3][4].tileno = 0x2e0
+        new_tile = tekton_tile.TektonTile()
+        new_tile.bts_type = 0x0c
+        crateria_tube.standard_state.tiles[20][2] = new_tile
+
+        new_door = tekton_door.TektonDoor()
+        new_door.data_address = 0x18b9e
+        test_project.rooms[0x79461].doors.append(new_door)
+        new_door.target_room_id = 0x795d4
+
+        new_room = load_room_from_test_data({"header": 0x792b3,
+                                             "room_width": 1,
+                                             "room_height": 1,
+                                             "standard_state": {"level_data_address": 0x21d000}})
+        new_room.standard_state.tiles[1][1].tileno = 0x111
+        test_project.rooms.add_room(new_room)
+        new_room.down_scroller = 0x01
+
+    def test_undo_redo(self):
+        test_project = self.get_test_project()
+        original_state = self.get_project_state(test_project)
+        test_journal = tekton_journal.TektonEditJournal(test_project)
+        self.assertFalse(test_journal.can_undo)
+
+        self.make_test_edits(test_project)
+        edited_state = self.get_project_state(test_project)
+        self.assertEqual(10, len(test_journal.steps))
+
+        while test_journal.can_undo:
+            test_journal.undo()
+        self.assertEqual(original_state, self.get_project_state(test_project), "Undo did not restore the project!")
+        self.assertIsNone(test_project.rooms[0x792b3])
+
+        while test_journal.can_redo:
+            test_journal.redo()
+        self.assertEqual(edited_state, self.get_project_state(test_project), "Redo did not repeat the edits!")
+        self.assertIs(test_project.rooms[0x795d4].doors[0], test_project.rooms[0x79461].doors[0])
+
+        # A new edit clears the steps that could be redone
+        test_journal.undo()
+        test_project.rooms[0x795d4].down_scroller = 0x02
+        self.assertFalse(test_journal.can_redo)
+        with self.assertRaises(ValueError):
+            test_journal.redo()
+
+    def test_tile_deltas(self):
+        test_project = self.get_test_project()
+        test_journal = tekton_journal.TektonEditJournal(test_project)
+        test_project.rooms[0x795d4].standard_state.tiles[3][4].tileno = 0x2e0
+        test_entry = test_journal.steps[0][0]
+        self.assertEqual(("tiles", 0x795d4, 0), test_entry.path)
+        self.assertEqual([[3, 4, [0x00, 0, 0, False, False]]], test_entry.old_value)
+        self.assertEqual([[3, 4, [0x2e0, 0, 0, False, False]]], test_entry.new_value)
+
+    def test_group(self):
+        test_project = self.get_test_project()
+        test_journal = tekton_journal.TektonEditJournal(test_project)
+        with test_journal.group():
+            test_project.rooms[0x795d4].up_scroller = 0x70
+            with test_journal.group():
+                test_project.rooms[0x795d4].down_scroller = 0x01
+        self.assertEqual(1, len(test_journal.steps))
+        self.assertEqual(2, len(test_journal.steps[0]))
+        test_journal.undo()
+        self.assertEqual(0x00, test_project.rooms[0x795d4].up_scroller)
+        self.assertEqual(0x00, test_project.rooms[0x795d4].down_scroller)
+
+    def test_replay(self):
+        test_project = self.get_test_project()
+        test_journal = tekton_journal.TektonEditJournal(test_project)
+        self.make_test_edits(test_project)
+        test_project.rooms[0x795d4].header = 0x795e0
+        test_project.rooms[0x795e0].minimap_x_coord = 0x05
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            journal_path = os.path.join(temp_dir, "journal.json")
+            test_journal.save(journal_path)
+            fresh_project = self.get_test_project()
+            tekton_journal.replay_journal(fresh_project, journal_path)
+
+            self.assertEqual(self.get_project_state(test_project), self.get_project_state(fresh_project))
+            self.assertIs(fresh_project.rooms[0x795e0].doors[0], fresh_project.rooms[0x79461].doors[0],
+                          "Replay did not keep a shared door shared!")
+
+            with self.assertRaises(tekton_journal.JournalReplayError):
+                tekton_journal.replay_journal(tekton_project.TektonProject(), journal_path)
+
+    def test_detach(self):
+        test_project = self.get_test_project()
+        test_journal = tekton_journal.TektonEditJournal(test_project)
+        test_project.rooms.add_lazy_room(0x792b3, lambda: load_room_from_test_data({"header": 0x792b3,
+                                                                                     "room_width": 1,
+                                                                                     "room_height": 1}))
+        test_project.rooms[0x792b3].up_scroller = 0x70
+        self.assertEqual(1, len(test_journal.steps), "Loading a lazy room was recorded as an edit!")
+
+        test_journal.detach()
+        test_project.rooms[0x795d4].up_scroller = 0x70
+        test_project.rooms[0x795d4].standard_state.tiles[3][4].tileno = 0x2e0
+        self.assertEqual(1, len(test_journal.steps))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+from testing_common import tekton
+from tekton import tekton_memory_report, tekton_project, tekton_room, tekton_room_state, tekton_tile_grid, \
+    tekton_door, tekton_synthetic_rom
+import os
+import tempfile
+import unittest
+
+
+class TestTektonMemoryReport(unittest.TestCase):
+    def test_add_room(self):
+        test_room = tekton_room.TektonRoom(1, 1)
+        test_room.header = 0x795d4
+        test_room.standard_state.tiles = tekton_tile_grid.TektonTileGrid(16, 16)
+        test_room.standard_state.tiles.fill()
+        extra_state_pointer = tekton_room_state.TektonRoomEventStatePointer()
+        extra_state_pointer.room_state = tekton_room_state.TektonRoomState()
+        extra_state_pointer.room_state.tiles = test_room.standard_state.tiles
+        test_room.extra_states.append(extra_state_pointer)
+        test_room.doors.append(tekton_door.TektonDoor())
+
+        test_report = tekton_memory_report.TektonMemoryReport()
+        test_report.add_room(test_room)
+        self.assertEqual(1, test_report.room_count)
+        self.assertEqual(1, test_report.grid_count, "Grid shared between room states was counted twice!")
+        self.assertEqual(1, test_report.shared_grid_count)
+        for category in ("tile_objects", "grid_lists", "state_objects", "room_objects", "door_objects"):
+            self.assertGreater(test_report.category_bytes[category], 0, "Nothing was counted in {}!".format(category))
+        self.assertEqual(0, test_report.category_bytes["rom_buffers"])
+        self.assertEqual(sum(test_report.category_bytes.values()), test_report.total_bytes)
+
+        # Tiles are the largest part of a room
+        self.assertGreater(test_report.category_bytes["tile_objects"], test_report.total_bytes // 2)
+
+        category_bytes = dict(test_report.category_bytes)
+        test_report.add_room(test_room)
+        self.assertEqual(category_bytes, test_report.category_bytes, "Room was counted twice!")
+        self.assertEqual(1, test_report.room_count)
+
+        self.assertIn("tile_objects", str(test_report))
+        with self.assertRaises(ValueError):
+            test_report.add_object("tiles", test_room)
+
+    def test_pending_tile_grid(self):
+        test_room = tekton_room.TektonRoom(1, 1)
+        test_room.standard_state.tiles = tekton_tile_grid.TektonTileGrid.from_uncompressed_data(16, 16,
+                                                                                                bytes(16 * 16 * 3))
+        test_report = tekton_memory_report.TektonMemoryReport()
+        test_report.add_room(test_room)
+        self.assertEqual(0, test_report.category_bytes["tile_objects"])
+        self.assertGreater(test_report.category_bytes["cached_buffers"], 16 * 16 * 3)
+        self.assertIn("_pending_data", test_room.standard_state.tiles.__dict__,
+                      "Counting a grid should not create its tiles!")
+
+    def test_project_memory_report(self):
+        test_project = tekton_project.TektonProject()
+        test_room = tekton_room.TektonRoom(1, 1)
+        test_room.header = 0x795d4
+        test_room.standard_state.tiles = tekton_tile_grid.TektonTileGrid(16, 16)
+        test_room.standard_state.tiles.fill()
+        test_project.rooms.add_room(test_room)
+        test_project.rooms.add_lazy_room(0x791f8, lambda: None)
+
+        test_report = test_project.memory_report()
+        self.assertEqual(1, test_report.room_count)
+        self.assertEqual(1, test_report.unloaded_room_count)
+        self.assertEqual({}, test_report.measurements)
+        self.assertFalse(test_project.rooms.is_loaded(0x791f8), "Memory report loaded a lazy room!")
+
+    def test_trace_memory(self):
+        with tempfile.TemporaryDirectory() as test_dir:
+            rom_path = os.path.join(test_dir, "synthetic.sfc")
+            header_address_file = os.path.join(test_dir, "rooms.yaml")
+            tekton_synthetic_rom.write_synthetic_rom(rom_path, header_address_file, room_count=10, rom_size=0x300000)
+            test_project = tekton_project.TektonProject()
+            test_project.source_rom_path = rom_path
+            test_project.trace_memory = True
+            test_project.import_rooms(header_address_file)
+            for header, room in test_project.rooms.items():
+                room.write_level_data = False
+            test_project.get_modified_rom_contents()
+
+        test_report = test_project.memory_report()
+        self.assertEqual(10, test_report.room_count)
+        self.assertEqual(["build", "import_rooms"], sorted(test_report.measurements))
+        import_measurement = test_report.measurements["import_rooms"]
+        self.assertGreaterEqual(import_measurement.peak_bytes, import_measurement.retained_bytes)
+        self.assertGreater(import_measurement.retained_bytes, 0)
+        self.assertGreater(len(import_measurement.top_allocations), 0)
+        # The build keeps a copy of the source ROM and the modified ROM
+        self.assertGreaterEqual(test_report.category_bytes["rom_buffers"], 2 * 0x300000)
+        self.assertGreaterEqual(test_report.measurements["build"].peak_bytes, 2 * 0x300000)
+        self.assertGreater(test_report.category_bytes["cached_buffers"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import os
+import tempfile
+import unittest
+
+from testing_common import tekton
+from tekton import tekton_parallel
+
+
+class TestTektonParallel(unittest.TestCase):
+    def test_split_into_chunks(self):
+        self.assertEqual([], tekton_parallel.split_into_chunks([], 4))
+        self.assertEqual([[0], [1], [2]], tekton_parallel.split_into_chunks([0, 1, 2], 4))
+
+        items = list(range(100))
+        chunks = tekton_parallel.split_into_chunks(items, 2)
+        self.assertEqual(8, len(chunks))
+        self.assertEqual(items, [item for chunk in chunks for item in chunk], "Chunks do not keep the items in order!")
+
+    def test_map_rom_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            rom_path = os.path.join(temp_dir, "rom.sfc")
+            with open(rom_path, "wb") as f:
+                f.write(bytes(range(0x100)))
+
+            rom_contents = tekton_parallel.map_rom_file(rom_path)
+            try:
+                self.assertEqual(bytes(range(0x100)), rom_contents[:])
+                with self.assertRaises(TypeError):
+                    rom_contents[0] = 0xff
+            finally:
+                rom_contents.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,187 @@
+import os
+import random
+import tempfile
+import unittest
+import zlib
+
+from testing_common import tekton
+from tekton import tekton_patch, tekton_project
+from testing_common import load_room_from_test_data
+
+
+def apply_ips_patch(source_contents, patch):
+    target = bytearray(source_contents)
+    offset = len(tekton_patch.IPS_HEADER)
+    while patch[offset:offset + 3] != tekton_patch.IPS_FOOTER:
+        address = int.from_bytes(patch[offset:offset + 3], byteorder="big")
+        length = int.from_bytes(patch[offset + 3:offset + 5], byteorder="big")
+        offset += 5
+        if length == 0:
+            rle_length = int.from_bytes(patch[offset:offset + 2], byteorder="big")
+            target[address:address + rle_length] = patch[offset + 2:offset + 3] * rle_length
+            offset += 3
+        else:
+            target[address:address + length] = patch[offset:offset + length]
+            offset += length
+    return bytes(target)
+
+
+def apply_bps_patch(source_contents, patch):
+    offset = len(tekton_patch.BPS_HEADER)
+
+    def decode_number():
+        nonlocal offset
+        number = 0
+        shift = 1
+        while True:
+            next_byte = patch[offset]
+            offset += 1
+            number += (next_byte & 0x7f) * shift
+            if next_byte & 0x80:
+                return number
+            shift <<= 7
+            number += shift
+
+    source_size = decode_number()
+    target_size = decode_number()
+    metadata_size = decode_number()
+    offset += metadata_size
+    target = bytearray()
+    source_relative_offset = 0
+    target_relative_offset = 0
+    while offset < len(patch) - 12:
+        action_data = decode_number()
+        action = action_data & 3
+        length = (action_data >> 2) + 1
+        if action == tekton_patch.BPS_SOURCE_READ:
+            target += source_contents[len(target):len(target) + length]
+        elif action == tekton_patch.BPS_TARGET_READ:
+            target += patch[offset:offset + length]
+            offset += length
+        else:
+            relative_offset = decode_number()
+            relative_offset = -(relative_offset >> 1) if relative_offset & 1 else relative_offset >> 1
+            if action == tekton_patch.BPS_SOURCE_COPY:
+                source_relative_offset += relative_offset
+                target += source_contents[source_relative_offset:source_relative_offset + length]
+                source_relative_offset += length
+            else:
+                target_relative_offset += relative_offset
+                for i in range(length):
+                    target.append(target[target_relative_offset])
+                    target_relative_offset += 1
+
+    assert source_size == len(source_contents)
+    assert target_size == len(target)
+    assert int.from_bytes(patch[-12:-8], byteorder="little") == zlib.crc32(source_contents)
+    assert int.from_bytes(patch[-8:-4], byteorder="little") == zlib.crc32(target)
+    assert int.from_bytes(patch[-4:], byteorder="little") == zlib.crc32(patch[:-4])
+    return bytes(target)
+
+
+def apply_writes(source_contents, writes):
+    target = bytearray(source_contents)
+    for write_address, write_data, write_owner in writes:
+        target[write_address:write_address + len(write_data)] = write_data
+    return bytes(target)
+
+
+class TestTektonPatch(unittest.TestCase):
+    def setUp(self):
+        self.source_contents = bytes(range(0x100)) * 0x20
+
+    def test_get_patch_regions(self):
+        writes = [(0x10, b'\x01\x02\x03', None),
+                  (0x12, b'\x04\x05', None),  # Overlaps the previous write and wins
+                  (0x40, self.source_contents[0x40:0x50], None),  # Same as the source, so left out
+                  (0x100, b'\xaa', None),
+                  (0x103, b'\xbb', None)]  # Close enough to the previous write to be merged
+        expected_regions = [(0x10, b'\x01\x02\x04\x05'),
+                            (0x100, b'\xaa' + self.source_contents[0x101:0x103] + b'\xbb')]
+
+        self.assertEqual(expected_regions, tekton_patch.get_patch_regions(self.source_contents, writes))
+        self.assertEqual(3, len(tekton_patch.get_patch_regions(self.source_contents, writes, merge_distance=0)))
+
+    def test_get_patch_regions_validation(self):
+        with self.assertRaises(tekton_patch.PatchAddressError):
+            tekton_patch.get_patch_regions(self.source_contents, [(0x1fff, b'\x00\x00', None)])
+        with self.assertRaises(TypeError):
+            tekton_patch.get_patch_regions(self.source_contents, [], merge_distance="5")
+        with self.assertRaises(ValueError):
+            tekton_patch.get_patch_regions(self.source_contents, [], merge_distance=-1)
+
+    def test_create_ips_patch(self):
+        regions = [(0x10, b'\x01\x02\x03'), (0x200, b'\x07' + b'\xff' * 40 + b'\x08')]
+        expected_patch = b'PATCH' + \
+                         b'\x00\x00\x10\x00\x03\x01\x02\x03' + \
+                         b'\x00\x02\x00\x00\x01\x07' + \
+                         b'\x00\x02\x01\x00\x00\x00\x28\xff' + \
+                         b'\x00\x02\x29\x00\x01\x08' + \
+                         b'EOF'
+        self.assertEqual(expected_patch, tekton_patch.create_ips_patch(regions))
+
+    def test_create_ips_patch_footer_address(self):
+        address = tekton_patch.IPS_FOOTER_ADDRESS
+        ips_patch = tekton_patch.create_ips_patch([(address - 20, b'\x01' * 20 + b'\x02\x03')])
+        self.assertEqual(b'PATCH' +
+                         (address - 20).to_bytes(3, byteorder="big") + b'\x00\x00\x00\x14\x01' +
+                         (address - 1).to_bytes(3, byteorder="big") + b'\x00\x03\x01\x02\x03' +
+                         b'EOF',
+                         ips_patch)
+        with self.assertRaises(tekton_patch.PatchAddressError):
+            tekton_patch.create_ips_patch([(address, b'\x01')])
+        with self.assertRaises(tekton_patch.PatchAddressError):
+            tekton_patch.create_ips_patch([(tekton_patch.IPS_MAX_ADDRESS, b'\x01\x02')])
+
+    def test_round_trip(self):
+        rng = random.Random(0x21bcd2)
+        for i in range(20):
+            writes = []
+            for j in range(rng.randrange(1, 30)):
+                write_address = rng.randrange(0, len(self.source_contents) - 300)
+                if rng.random() < 0.3:
+                    write_data = bytes([rng.randrange(0x100)]) * rng.randrange(1, 300)
+                elif rng.random() < 0.2 and writes:
+                    write_data = writes[-1][1]
+                else:
+                    write_data = bytes(rng.randrange(0x100) for k in range(rng.randrange(1, 40)))
+                writes.append((write_address, write_data, None))
+
+            expected_contents = apply_writes(self.source_contents, writes)
+            regions = tekton_patch.get_patch_regions(self.source_contents, writes)
+            self.assertEqual(expected_contents,
+                             apply_ips_patch(self.source_contents, tekton_patch.create_ips_patch(regions)))
+            self.assertEqual(expected_contents,
+                             apply_bps_patch(self.source_contents,
+                                             tekton_patch.create_bps_patch(self.source_contents, regions)))
+
+    def test_bps_patch_copies_runs_and_repeats(self):
+        regions = [(0x100, b'\x01\x02' * 20), (0x400, b'\x00' * 200), (0x800, b'\x01\x02' * 20)]
+        bps_patch = tekton_patch.create_bps_patch(self.source_contents, regions)
+        self.assertLess(len(bps_patch), 100, "BPS patch did not use copy actions for runs and repeated regions!")
+        self.assertEqual(apply_writes(self.source_contents, [region + (None,) for region in regions]),
+                         apply_bps_patch(self.source_contents, bps_patch))
+
+    def test_project_patches(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source_rom_path = os.path.join(temp_dir, "blank_rom.sfc")
+            with open(source_rom_path, "wb") as f:
+                f.write(b'\xff' * 0x300000)
+
+            test_project = tekton_project.TektonProject()
+            test_project.source_rom_path = source_rom_path
+            test_project.rooms.add_room(load_room_from_test_data({"header": 0x795d4,
+                                                                  "room_width": 1,
+                                                                  "room_height": 1,
+                                                                  "standard_state": {"level_data_address": 0x21bcd2},
+                                                                  "doors": [{"data_address": 0x18ac6,
+                                                                             "target_room_id": 0x79461}]}))
+
+            expected_contents = test_project.get_modified_rom_contents()
+            source_contents = test_project.get_source_rom_contents()
+            self.assertEqual(expected_contents, apply_ips_patch(source_contents, test_project.get_ips_patch()))
+            self.assertEqual(expected_contents, apply_bps_patch(source_contents, test_project.get_bps_patch()))
+
+
+if __name__ == '__main__':
+    unittest.main()
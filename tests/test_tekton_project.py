@@ -1,13 +1,31 @@
 from testing_common import tekton, original_rom_path, load_test_data_dir, int_list_to_bytes, load_room_from_test_data
-from tekton import tekton_project, tekton_room_dict, tekton_room, tekton_door, tekton_room_state, tekton_tile_grid
+from tekton import tekton_project, tekton_room_dict, tekton_room, tekton_door, tekton_room_state, tekton_tile_grid, \
+    tekton_write_index, tekton_free_space, tekton_synthetic_rom
+import gc
 import hashlib
+import tempfile
 import modified_test_roms
 import os
 import yaml
 import unittest
+import weakref
 
 
 class TestTektonProjectUnit(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def get_blank_project(self, rom_contents=None):
+        source_rom_path = os.path.join(self.temp_dir.name, "blank_rom.sfc")
+        with open(source_rom_path, "wb") as f:
+            f.write(b'\x00' * 0x300000 if rom_contents is None else rom_contents)
+        test_project = tekton_project.TektonProject()
+        test_project.source_rom_path = source_rom_path
+        return test_project
+
     def test_init(self):
         test_proj = tekton_project.TektonProject()
         self.assertNotEqual(test_proj, None, "Test Project is None!")
@@ -36,6 +54,297 @@ class TestTektonProjectUnit(unittest.TestCase):
                          hashlib.md5(actual_result).digest(),
                          "Original ROM does not have correct hash!")
 
+    def test_import_rooms_jobs(self):
+        test_project = tekton_project.TektonProject()
+        with self.assertRaises(TypeError):
+            test_project.import_rooms(jobs="2")
+        with self.assertRaises(TypeError):
+            test_project.import_rooms(jobs=True)
+        with self.assertRaises(ValueError):
+            test_project.import_rooms(jobs=0)
+        with self.assertRaises(ValueError):
+            test_project.import_rooms(jobs=2, lazy=True)
+
+    def test_incremental_build(self):
+        test_room_data = {"header": 0x795d4,
+                          "room_width": 1,
+                          "room_height": 1,
+                          "standard_state": {"level_data_address": 0x21bcd2},
+                          "doors": [{"data_address": 0x18ac6, "target_room_id": 0x79461}]}
+        test_project = self.get_blank_project(b'\xff' * 0x300000)
+        test_room = load_room_from_test_data(test_room_data)
+        test_project.rooms.add_room(test_room)
+
+        first_build = test_project.get_modified_rom_contents()
+        self.assertFalse(test_room.dirty, "Room was not marked clean after it was written!")
+        self.assertEqual(first_build, test_project.get_modified_rom_contents())
+
+        test_room.standard_state.tiles[0][0].tileno = 0x2e0
+        test_room.doors[0].target_room_id = 0x792b3
+        test_room.header = 0x7a000
+        incremental_build = test_project.get_modified_rom_contents()
+
+        fresh_project = tekton_project.TektonProject()
+        fresh_project.source_rom_path = test_project.source_rom_path
+        fresh_room = load_room_from_test_data(test_room_data)
+        fresh_room.standard_state.tiles[0][0].tileno = 0x2e0
+        fresh_room.doors[0].target_room_id = 0x792b3
+        fresh_room.header = 0x7a000
+        fresh_project.rooms.add_room(fresh_room)
+
+        self.assertNotEqual(first_build, incremental_build)
+        self.assertEqual(fresh_project.get_modified_rom_contents(),
+                         incremental_build,
+                         "Incremental build did not match a full build of the same rooms!")
+        self.assertEqual(b'\xff' * 16,
+                         incremental_build[0x795d4:0x795e4],
+                         "Incremental build did not restore the source ROM where the room header used to be!")
+
+    def test_incremental_build_shared_writes(self):
+        test_project = self.get_blank_project()
+        test_rooms = []
+        for header in [0x795d4, 0x79600]:
+            test_room = load_room_from_test_data({"header": header,
+                                                  "room_width": 1,
+                                                  "room_height": 1,
+                                                  "standard_state": {"level_data_address": 0x21bcd2}})
+            test_project.rooms.add_room(test_room)
+            test_rooms.append(test_room)
+        shared_door = tekton_door.TektonDoor()
+        shared_door.data_address = 0x18ac6
+        shared_door.target_room_id = 0x79461
+        test_rooms[0].doors.append(shared_door)
+        test_rooms[1].doors.append(shared_door)
+        first_build = test_project.get_modified_rom_contents()
+        self.assertEqual(shared_door.door_data, first_build[0x18ac6:0x18ad2])
+
+        # Both rooms wrote the shared door and level data, but only one of them changes
+        new_door = tekton_door.TektonDoor()
+        new_door.data_address = 0x18ad2
+        new_door.target_room_id = 0x79461
+        test_rooms[0].doors[0] = new_door
+        test_rooms[0].standard_state.level_data_address = 0x21c000
+        incremental_build = test_project.get_modified_rom_contents()
+        self.assertEqual(shared_door.door_data, incremental_build[0x18ac6:0x18ad2],
+                         "Door still used by an unchanged room was not kept!")
+        level_data = test_rooms[1].compressed_level_data(test_rooms[1].standard_state)
+        self.assertEqual(level_data, incremental_build[0x21bcd2:0x21bcd2 + len(level_data)],
+                         "Level data still used by an unchanged room was not kept!")
+
+        test_project._build_source_key = None  # Force a full build to compare against
+        self.assertEqual(test_project.get_modified_rom_contents(), incremental_build,
+                         "Incremental build did not match a full build of the same rooms!")
+
+    def test_incremental_build_shared_tile(self):
+        def get_rooms(project):
+            rooms = []
+            for header, level_data_address in [(0x795d4, 0x21bcd2), (0x79600, 0x21c000)]:
+                room = load_room_from_test_data({"header": header,
+                                                 "room_width": 1,
+                                                 "room_height": 1,
+                                                 "standard_state": {"level_data_address": level_data_address}})
+                project.rooms.add_room(room)
+                rooms.append(room)
+            return rooms
+
+        test_project = self.get_blank_project()
+        test_rooms = get_rooms(test_project)
+        test_rooms[1].standard_state.tiles[0][0] = test_rooms[0].standard_state.tiles[0][0]
+        test_project.get_modified_rom_contents()
+        test_rooms[0].standard_state.tiles[0][0].tileno = 0x2e0
+        incremental_build = test_project.get_modified_rom_contents()
+
+        fresh_project = tekton_project.TektonProject()
+        fresh_project.source_rom_path = test_project.source_rom_path
+        fresh_rooms = get_rooms(fresh_project)
+        fresh_rooms[0].standard_state.tiles[0][0].tileno = 0x2e0
+        self.assertEqual(fresh_project.get_modified_rom_contents(), incremental_build,
+                         "Incremental build did not match a full build after changing a tile placed in two rooms!")
+
+    def test_build_to(self):
+        output_rom_path = os.path.join(self.temp_dir.name, "output_rom.sfc")
+        test_project = self.get_blank_project(bytes(range(0x100)) * 0x3000)
+        test_project.rooms.add_room(load_room_from_test_data({"header": 0x795d4,
+                                                              "room_width": 2,
+                                                              "room_height": 1,
+                                                              "standard_state": {"level_data_address": 0x21bcd2},
+                                                              "doors": [{"data_address": 0x18ac6,
+                                                                         "target_room_id": 0x79461}]}))
+
+        test_project.build_to(output_rom_path)
+        with open(output_rom_path, "rb") as f:
+            self.assertEqual(test_project.get_modified_rom_contents(), f.read())
+
+        with self.assertRaises(ValueError):
+            test_project.build_to(test_project.source_rom_path)
+
+    def test_build_to_failure(self):
+        output_rom_path = os.path.join(self.temp_dir.name, "output_rom.sfc")
+        with open(output_rom_path, "wb") as f:
+            f.write(b'previous build')
+        test_project = self.get_blank_project()
+        test_room = load_room_from_test_data({"header": 0x795d4,
+                                              "room_width": 1,
+                                              "room_height": 1,
+                                              "level_data_length": 2,
+                                              "standard_state": {"level_data_address": 0x21bcd2}})
+        test_project.rooms.add_room(test_room)
+
+        with self.assertRaises(tekton_room.CompressedDataTooLargeError):
+            test_project.build_to(output_rom_path)
+        with open(output_rom_path, "rb") as f:
+            self.assertEqual(b'previous build', f.read(), "A failed build replaced the previous output!")
+        self.assertEqual(["blank_rom.sfc", "output_rom.sfc"], sorted(os.listdir(self.temp_dir.name)),
+                         "A failed build left a temporary file behind!")
+
+    def test_relocate_oversized_level_data(self):
+        test_project = self.get_blank_project()
+        test_room = load_room_from_test_data({"header": 0x795d4,
+                                              "room_width": 1,
+                                              "room_height": 1,
+                                              "level_data_length": 2,
+                                              "standard_state": {"level_data_address": 0x21bcd2}})
+        test_room.standard_state.tiles[3][4].tileno = 0x2e0
+        sharing_room = load_room_from_test_data({"header": 0x79461,
+                                                 "room_width": 1,
+                                                 "room_height": 1,
+                                                 "standard_state": {"level_data_address": 0x21bcd2}})
+        sharing_room.write_level_data = False
+        test_project.rooms.add_room(test_room)
+        test_project.rooms.add_room(sharing_room)
+
+        with self.assertRaises(tekton_room.CompressedDataTooLargeError):
+            test_project.get_modified_rom_contents()
+
+        test_project.free_space.add_free_block(0x2e0000, 0x100)
+        modified_rom_contents = test_project.get_modified_rom_contents()
+        level_data = test_room.compressed_level_data(test_room.standard_state, fit_to_length=False)
+
+        self.assertEqual(0x2e0000, test_room.standard_state.level_data_address, "Level data was not moved!")
+        self.assertEqual(0x2e0000, sharing_room.standard_state.level_data_address,
+                         "Room state sharing the old level data was not moved with it!")
+        self.assertEqual(len(level_data), test_room.level_data_length)
+        self.assertEqual(level_data, modified_rom_contents[0x2e0000:0x2e0000 + len(level_data)])
+        self.assertEqual(b'\x00\x80\xdc',  # $DC:8000
+                         modified_rom_contents[0x795d4 + 13:0x795d4 + 16],
+                         "Room header does not point at the moved level data!")
+        self.assertIn((0x21bcd2, 2), test_project.free_space.blocks, "Old level data space was not released!")
+
+    def test_relocate_level_data_with_unloaded_rooms(self):
+        test_project = self.get_blank_project()
+        test_room = load_room_from_test_data({"header": 0x795d4,
+                                              "room_width": 1,
+                                              "room_height": 1,
+                                              "level_data_length": 2,
+                                              "standard_state": {"level_data_address": 0x21bcd2}})
+        test_room.standard_state.tiles[3][4].tileno = 0x2e0
+        test_project.rooms.add_room(test_room)
+        test_project.rooms.add_lazy_room(0x79461, lambda: self.fail("Build loaded a lazy room!"))
+        test_project.free_space.add_free_block(0x2e0000, 0x100)
+
+        test_project.get_modified_rom_contents()
+
+        self.assertEqual(0x2e0000, test_room.standard_state.level_data_address, "Level data was not moved!")
+        self.assertNotIn((0x21bcd2, 2), test_project.free_space.blocks,
+                         "Level data an unloaded room may point at was released!")
+        self.assertFalse(test_project.rooms.is_loaded(0x79461))
+
+    def test_deduplicate_level_data(self):
+        test_project = self.get_blank_project()
+        test_project.deduplicate_level_data = True
+        test_rooms = []
+        for header, level_data_address in [(0x792b3, 0x21bcd2), (0x79461, 0x21c000), (0x795d4, 0x21d000)]:
+            test_room = load_room_from_test_data({"header": header,
+                                                  "room_width": 1,
+                                                  "room_height": 1,
+                                                  "level_data_length": 0x40,
+                                                  "standard_state": {"level_data_address": level_data_address}})
+            test_project.rooms.add_room(test_room)
+            test_rooms.append(test_room)
+
+        first_build = test_project.get_modified_rom_contents()
+        for test_room in test_rooms:
+            self.assertEqual(0x21bcd2, test_room.standard_state.level_data_address,
+                             "Identical level data was not shared!")
+        self.assertEqual([(0x21c000, 0x40), (0x21d000, 0x40)], test_project.free_space.blocks,
+                         "Space used by duplicate level data was not released!")
+        level_data = test_rooms[0].compressed_level_data(test_rooms[0].standard_state)
+        self.assertEqual(level_data, first_build[0x21bcd2:0x21bcd2 + 0x40])
+        self.assertEqual(b'\x00' * 0x40, first_build[0x21c000:0x21c040])
+
+        # Rooms sharing level data get their own space back once their tiles change
+        test_rooms[2].standard_state.tiles[3][4].tileno = 0x2e0
+        free_space = test_project.free_space
+        test_project.free_space = tekton_free_space.TektonFreeSpace()
+        with self.assertRaisesRegex(tekton_free_space.OutOfFreeSpaceError, "no longer matches"):
+            test_project.get_modified_rom_contents()
+        test_project.free_space = free_space
+        second_build = test_project.get_modified_rom_contents()
+        self.assertEqual(0x21bcd2, test_rooms[1].standard_state.level_data_address)
+        self.assertNotEqual(0x21bcd2, test_rooms[2].standard_state.level_data_address)
+        self.assertEqual(level_data, second_build[0x21bcd2:0x21bcd2 + 0x40],
+                         "Level data shared with a changed room was not kept!")
+        moved_address = test_rooms[2].standard_state.level_data_address
+        self.assertEqual(test_rooms[2].compressed_level_data(test_rooms[2].standard_state),
+                         second_build[moved_address:moved_address + test_rooms[2].level_data_length])
+
+        test_project._build_source_key = None  # Force a full build to compare against
+        self.assertEqual(test_project.get_modified_rom_contents(), second_build)
+
+    def test_remove_room_build(self):
+        test_project = self.get_blank_project()
+        test_project.rooms.add_room(load_room_from_test_data({"header": 0x795d4,
+                                                              "room_width": 1,
+                                                              "room_height": 1,
+                                                              "up_scroller": 0x70,
+                                                              "standard_state": {"level_data_address": 0x21bcd2}}))
+        self.assertNotEqual(b'\x00' * 0x10, test_project.get_modified_rom_contents()[0x795d4:0x795e4])
+
+        removed_room = weakref.ref(test_project.rooms[0x795d4])
+        test_project.rooms.remove_room(0x795d4)
+        self.assertEqual(b'\x00' * 0x300000, test_project.get_modified_rom_contents(),
+                         "Bytes written by a removed room were not restored!")
+        self.assertEqual({}, test_project._room_write_cache, "Writes of a removed room were kept!")
+        self.assertEqual({}, test_project._level_data_cache, "Level data of a removed room was kept!")
+        gc.collect()
+        self.assertIsNone(removed_room(), "Removed room was kept alive by the project's caches!")
+
+    def test_write_overlaps(self):
+        test_project = self.get_blank_project()
+        for header, level_data_address in [(0x795d4, 0x21bcd2), (0x79600, 0x21c000)]:
+            test_project.rooms.add_room(load_room_from_test_data({"header": header,
+                                                                  "room_width": 1,
+                                                                  "room_height": 1,
+                                                                  "standard_state": {"level_data_address":
+                                                                                     level_data_address}}))
+            test_project.rooms[header].doors.append(tekton_door.TektonDoor())
+            test_project.rooms[header].doors[0].data_address = 0x18ac6
+            test_project.rooms[header].doors[0].target_room_id = 0x792b3
+
+        test_project.get_modified_rom_contents()
+        self.assertEqual([], test_project.write_overlaps, "Identical door writes were reported as overlapping!")
+
+        # Adding a state makes the first room's header run into the second room's header
+        test_project.rooms[0x795d4].extra_states.append(tekton_room_state.TektonRoomLandingStatePointer())
+        test_project.rooms[0x795d4].extra_states[0].room_state = tekton_room_state.TektonRoomState()
+        test_project.rooms[0x795d4].extra_states[0].room_state.level_data_address = 0x21bcd2
+        test_project.rooms[0x795d4].extra_states[0].room_state.tiles = \
+            test_project.rooms[0x795d4].standard_state.tiles
+        test_project.get_modified_rom_contents()
+        self.assertEqual(1, len(test_project.write_overlaps))
+        self.assertIs(test_project.rooms[0x795d4], test_project.write_overlaps[0].first_write[2])
+        self.assertIs(test_project.rooms[0x79600], test_project.write_overlaps[0].second_write[2])
+        self.assertEqual(0x79600, test_project.write_overlaps[0].start)
+
+        test_project.strict_writes = True
+        test_project.rooms[0x795d4].up_scroller = 0x70
+        with self.assertRaises(tekton_write_index.WriteOverlapError):
+            test_project.get_modified_rom_contents()
+        with self.assertRaises(tekton_write_index.WriteOverlapError):
+            test_project.build_to(os.path.join(self.temp_dir.name, "output_rom.sfc"))
+        with self.assertRaises(tekton_write_index.WriteOverlapError):
+            test_project.get_ips_patch()
+
 
 class TestTektonProjectIntegration(unittest.TestCase):
     def test_write_modified_rom(self):
@@ -110,6 +419,56 @@ class TestTektonProjectIntegration(unittest.TestCase):
                             msg="Room {} was not created on import!".format(hex(room_header)))
             self._test_room_properties(test_project.rooms[room_header], test_item)
 
+    def test_import_rooms_multiprocess(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            rom_path = os.path.join(temp_dir, "synthetic.sfc")
+            header_address_file = os.path.join(temp_dir, "rooms.yaml")
+            tekton_synthetic_rom.write_synthetic_rom(rom_path, header_address_file, room_count=30, rom_size=0x300000)
+
+            serial_project = tekton_project.TektonProject()
+            serial_project.source_rom_path = rom_path
+            serial_project.import_rooms(header_address_file)
+            parallel_project = tekton_project.TektonProject()
+            parallel_project.source_rom_path = rom_path
+            parallel_project.import_rooms(header_address_file, jobs=2)
+
+            self.assertEqual(serial_project.rooms.keys(), parallel_project.rooms.keys())
+            for header, serial_room in serial_project.rooms.items():
+                parallel_room = parallel_project.rooms[header]
+                self.assertEqual(serial_room.name, parallel_room.name)
+                self.assertEqual(serial_room.header_data,
+                                 parallel_room.header_data,
+                                 "Room {} imported different header data in worker processes!".format(hex(header)))
+                self.assertEqual([door.door_data for door in serial_room.doors],
+                                 [door.door_data for door in parallel_room.doors],
+                                 "Room {} imported different doors in worker processes!".format(hex(header)))
+            self.assertEqual(serial_project.get_modified_rom_contents(), parallel_project.get_modified_rom_contents())
+
+    def test_import_rooms_lazy(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            rom_path = os.path.join(temp_dir, "synthetic.sfc")
+            header_address_file = os.path.join(temp_dir, "rooms.yaml")
+            tekton_synthetic_rom.write_synthetic_rom(rom_path, header_address_file, room_count=30, rom_size=0x300000)
+
+            eager_project = tekton_project.TektonProject()
+            eager_project.source_rom_path = rom_path
+            eager_project.import_rooms(header_address_file)
+            lazy_project = tekton_project.TektonProject()
+            lazy_project.source_rom_path = rom_path
+            lazy_project.import_rooms(header_address_file, lazy=True)
+
+            self.assertEqual(eager_project.rooms.keys(), lazy_project.rooms.keys())
+            for header in lazy_project.rooms.keys():
+                self.assertFalse(lazy_project.rooms.is_loaded(header))
+
+            # Unloaded rooms are not written, so the output matches the source ROM
+            self.assertEqual(lazy_project.get_source_rom_contents(), lazy_project.get_modified_rom_contents())
+
+            for header in lazy_project.rooms.keys():
+                self.assertEqual(eager_project.rooms[header].header_data, lazy_project.rooms[header].header_data)
+                self.assertEqual(eager_project.rooms[header].name, lazy_project.rooms[header].name)
+            self.assertEqual(eager_project.get_modified_rom_contents(), lazy_project.get_modified_rom_contents())
+
     def _get_room_import_test_data(self, test_data_dir=None):
         if test_data_dir is None:
             test_data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
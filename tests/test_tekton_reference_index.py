@@ -0,0 +1,109 @@
+from testing_common import tekton
+from tekton import tekton_reference_index, tekton_room, tekton_room_dict, tekton_door, tekton_room_state
+import unittest
+
+
+class TestTektonReferenceIndex(unittest.TestCase):
+    def setUp(self):
+        self.test_dict = tekton_room_dict.TektonRoomDict()
+        self.test_index = tekton_reference_index.TektonReferenceIndex(self.test_dict)
+
+        self.test_room = tekton_room.TektonRoom()
+        self.test_room.header = 0x795d4
+        self.test_room.standard_state.level_data_address = 0x21bcd2
+        self.test_door = tekton_door.TektonDoor()
+        self.test_door.data_address = 0x18ac6
+        self.test_door.target_room_id = 0x79461
+        self.test_room.doors.append(self.test_door)
+        self.test_dict.add_room(self.test_room)
+
+    def test_lookups(self):
+        level_data_references = self.test_index.level_data_references(0x21bcd2)
+        self.assertEqual(1, len(level_data_references))
+        self.assertIs(self.test_room, level_data_references[0].room)
+        self.assertIs(self.test_room.standard_state, level_data_references[0].source)
+
+        door_data_references = self.test_index.door_data_references(0x18ac6)
+        self.assertEqual(1, len(door_data_references))
+        self.assertIs(self.test_door, door_data_references[0].source)
+
+        header_references = self.test_index.room_header_references(0x79461)
+        self.assertEqual(1, len(header_references))
+        self.assertIs(self.test_door, header_references[0].source)
+
+        state_references = self.test_index.room_state_references(0x795d4 + 13)
+        self.assertEqual(1, len(state_references))
+        self.assertIs(self.test_room.standard_state, state_references[0].source)
+
+        self.assertEqual([], self.test_index.level_data_references(0x21bcd3))
+        with self.assertRaises(ValueError):
+            self.test_index.get_references("not_a_kind", 0x21bcd2)
+
+    def test_setters_update_index(self):
+        reindexed_rooms = []
+        self.test_index.reindex_room = reindexed_rooms.append
+
+        self.test_room.standard_state.level_data_address = 0x21c000
+        self.assertEqual([], self.test_index.level_data_references(0x21bcd2))
+        self.assertEqual(1, len(self.test_index.level_data_references(0x21c000)))
+
+        self.test_door.target_room_id = 0x792b3
+        self.assertEqual([], self.test_index.room_header_references(0x79461))
+        self.assertEqual(1, len(self.test_index.room_header_references(0x792b3)))
+
+        self.test_door.data_address = 0x18ad2
+        self.assertEqual([], self.test_index.door_data_references(0x18ac6))
+        self.assertEqual(1, len(self.test_index.door_data_references(0x18ad2)))
+
+        self.test_room.header = 0x7a000
+        self.assertEqual([], self.test_index.room_state_references(0x795d4 + 13))
+        self.assertEqual(1, len(self.test_index.room_state_references(0x7a000 + 13)))
+        self.assertEqual([0x18ad2, 0x792b3, 0x7a000 + 13, 0x21c000],
+                         [reference.address for reference in self.test_index.references_in_range(0, 0x300000)])
+        self.assertEqual([], reindexed_rooms, "Changing a pointer should not reindex the whole room!")
+
+    def test_lists_update_index(self):
+        new_door = tekton_door.TektonDoor()
+        new_door.data_address = 0x18ad2
+        self.test_room.doors.append(new_door)
+        self.assertEqual(1, len(self.test_index.door_data_references(0x18ad2)))
+
+        new_door.data_address = 0x18ade
+        self.assertEqual(1, len(self.test_index.door_data_references(0x18ade)))
+
+        self.test_room.doors.remove(new_door)
+        self.assertEqual([], self.test_index.door_data_references(0x18ade))
+
+        new_door.data_address = 0x18aea
+        self.assertEqual([], self.test_index.door_data_references(0x18aea),
+                         "Index still watches a door that was removed from its room!")
+
+        new_pointer = tekton_room_state.TektonRoomEventStatePointer()
+        new_pointer.room_state = tekton_room_state.TektonRoomState()
+        new_pointer.room_state.level_data_address = 0x21d000
+        self.test_room.extra_states.append(new_pointer)
+        self.assertEqual(1, len(self.test_index.level_data_references(0x21d000)))
+
+    def test_references_in_range(self):
+        second_room = tekton_room.TektonRoom()
+        second_room.header = 0x79461
+        second_room.standard_state.level_data_address = 0x21bd6d
+        self.test_dict.add_room(second_room)
+
+        range_references = self.test_index.references_in_range(0x21bc00, 0x21be00)
+        self.assertEqual([0x21bcd2, 0x21bd6d], [reference.address for reference in range_references])
+        self.assertEqual([], self.test_index.references_in_range(0x21bd6e, 0x21be00))
+
+        self.test_index.remove_room(second_room)
+        self.assertEqual([0x21bcd2],
+                         [reference.address for reference in self.test_index.references_in_range(0x21bc00, 0x21be00)])
+
+    def test_shared_door(self):
+        second_room = tekton_room.TektonRoom()
+        second_room.header = 0x79461
+        second_room.doors.append(self.test_door)
+        self.test_dict.add_room(second_room)
+
+        self.assertEqual(2, len(self.test_index.door_data_references(0x18ac6)))
+        self.test_door.data_address = 0x18ad2
+        self.assertEqual(2, len(self.test_index.door_data_references(0x18ad2)))
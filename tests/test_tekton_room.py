@@ -1,5 +1,5 @@
 from testing_common import tekton, load_test_data_dir, int_list_to_bytes, load_room_from_test_data
-from tekton import tekton_room, tekton_tile_grid, tekton_room_state
+from tekton import tekton_room, tekton_tile_grid, tekton_room_state, tekton_door
 import os
 import unittest
 
@@ -60,6 +60,34 @@ class TestTektonRoom(unittest.TestCase):
                              actual_results,
                              "TektonRoom.header_data returned incorrect header data!")
 
+    def test_header_data_cache(self):
+        test_room = tekton_room.TektonRoom()
+        test_room.header = 0x795d4
+        test_door = tekton_door.TektonDoor()
+        test_door.data_address = 0x18ac6
+        test_room.doors.append(test_door)
+
+        header_data = test_room.header_data
+        self.assertIs(header_data, test_room.header_data, "Unchanged header data was not cached!")
+        test_door.target_room_id = 0x79461
+        test_room.name = "Not in the header"
+        test_room.standard_state.tiles = tekton_tile_grid.TektonTileGrid(16, 16)
+        self.assertIs(header_data, test_room.header_data, "Header data cache was dropped by an unrelated change!")
+
+        extra_state_pointer = tekton_room_state.TektonRoomEventStatePointer()
+        extra_state_pointer.room_state = tekton_room_state.TektonRoomState()
+        changes = [lambda: setattr(test_room, "map_area", tekton_room.MapArea.NORFAIR),
+                   lambda: setattr(test_room.standard_state, "tileset", tekton_room_state.TileSet.NORFAIR_RED_RIDLEY),
+                   lambda: setattr(test_door, "data_address", 0x18ad2),
+                   lambda: test_room.extra_states.append(extra_state_pointer),
+                   lambda: setattr(extra_state_pointer, "event_value", 0x0e),
+                   lambda: setattr(extra_state_pointer.room_state, "level_data_address", 0x21bcd2),
+                   lambda: setattr(test_room, "header", 0x79461)]
+        for change in changes:
+            test_room.header_data
+            change()
+            self.assertEqual(test_room._get_header_data(), test_room.header_data,
+                             "Header data cache was not dropped when the header data changed!")
 
     def test_compressed_level_data(self):
         test_data_dir = os.path.join(os.path.dirname((os.path.abspath(__file__))),
@@ -91,3 +119,39 @@ class TestTektonRoom(unittest.TestCase):
         with self.assertRaises(tekton_room.CompressedDataTooLargeError):
             actual_result = test_room.compressed_level_data(test_room.standard_state)
 
+    def test_dirty(self):
+        test_room = tekton_room.TektonRoom()
+        test_room.standard_state.tiles = tekton_tile_grid.TektonTileGrid(16, 16)
+        test_room.standard_state.tiles.fill()
+        test_pointer = tekton_room_state.TektonRoomEventStatePointer()
+        test_pointer.room_state = tekton_room_state.TektonRoomState()
+        test_room.extra_states.append(test_pointer)
+        test_door = tekton.tekton_door.TektonDoor()
+        test_room.doors.append(test_door)
+        self.assertTrue(test_room.dirty, "New TektonRoom is not dirty!")
+
+        test_room.mark_clean()
+        self.assertFalse(test_room.dirty)
+        self.assertFalse(test_room.standard_state.dirty)
+        self.assertFalse(test_room.standard_state.tiles.dirty)
+        self.assertFalse(test_door.dirty)
+
+        test_room.up_scroller = 0x70
+        self.assertTrue(test_room.dirty, "Changing a room attribute did not mark the room dirty!")
+        test_room.mark_clean()
+
+        test_door.target_room_id = 0x79461
+        self.assertTrue(test_door.dirty)
+        self.assertTrue(test_room.dirty, "Changing a door did not mark the room dirty!")
+        test_room.mark_clean()
+
+        test_pointer.room_state.songset = tekton_room_state.SongSet.MARIDIA
+        self.assertTrue(test_room.dirty, "Changing an extra room state did not mark the room dirty!")
+        test_room.mark_clean()
+
+        test_room.standard_state.tiles[0][0].tileno = 0x10
+        self.assertTrue(test_room.dirty, "Changing a tile did not mark the room dirty!")
+        test_room.mark_clean()
+
+        test_room.doors.append(tekton.tekton_door.TektonDoor())
+        self.assertTrue(test_room.dirty, "Adding a door did not mark the room dirty!")
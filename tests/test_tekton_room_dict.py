@@ -1,18 +1,19 @@
 from testing_common import tekton
-from tekton import tekton_room_dict, tekton_room
+from tekton import tekton_room_dict, tekton_room, tekton_room_state
+import copy
 import unittest
 
 class TestTektonRoomDict(unittest.TestCase):
     def test_init(self):
         test_dict = tekton_room_dict.TektonRoomDict()
         self.assertIsNotNone(test_dict)
-        self.assertEqual(test_dict._rooms, [])
+        self.assertEqual(test_dict._rooms, {})
 
     def test_get_item(self):
         test_dict = tekton_room_dict.TektonRoomDict()
         test_room = tekton_room.TektonRoom()
         test_room.header = 0x795d4
-        test_dict._rooms = [test_room]
+        test_dict.add_room(test_room)
 
         self.assertEqual(test_room, test_dict[0x795d4], "Looking up room by header did not return correct room!")
 
@@ -24,7 +25,9 @@ class TestTektonRoomDict(unittest.TestCase):
         test_room_2.header = 0x791f8
         test_room_3 = tekton_room.TektonRoom()
         test_room_3.header = 0x7968f
-        test_dict._rooms = [test_room_1, test_room_2, test_room_3]
+        test_dict.add_room(test_room_1)
+        test_dict.add_room(test_room_2)
+        test_dict.add_room(test_room_3)
 
         expected_value = [0x791f8, 0x795d4, 0x7968f]
         test_value = test_dict.keys()
@@ -61,8 +64,178 @@ class TestTektonRoomDict(unittest.TestCase):
         test_room_2.header = 0x795d4
         test_dict.add_room(test_room_1)
 
-        expected_value = [test_room_1]
+        expected_value = {0x795d4: test_room_1}
         self.assertEqual(expected_value, test_dict._rooms)
 
         with self.assertRaises(tekton_room_dict.DuplicateRoomError):
             test_dict.add_room(test_room_2)
+
+    def test_add_lazy_room(self):
+        test_dict = tekton_room_dict.TektonRoomDict()
+        test_room_1 = tekton_room.TektonRoom()
+        test_room_1.header = 0x795d4
+        test_room_2 = tekton_room.TektonRoom()
+        test_room_2.header = 0x791f8
+        loaded_headers = []
+
+        def load_room_2():
+            loaded_headers.append(0x791f8)
+            return test_room_2
+
+        test_dict.add_room(test_room_1)
+        test_dict.add_lazy_room(0x791f8, load_room_2)
+
+        self.assertEqual([0x791f8, 0x795d4], test_dict.keys())
+        self.assertFalse(test_dict.is_loaded(0x791f8))
+        self.assertEqual([(0x795d4, test_room_1)], list(test_dict.loaded_items()))
+        self.assertEqual([], loaded_headers, "Lazy room was loaded before it was looked up!")
+
+        self.assertEqual(test_room_2, test_dict[0x791f8])
+        self.assertEqual(test_room_2, test_dict[0x791f8])
+        self.assertTrue(test_dict.is_loaded(0x791f8))
+        self.assertEqual([0x791f8], loaded_headers, "Lazy room was not loaded exactly once!")
+        self.assertEqual([(0x791f8, test_room_2), (0x795d4, test_room_1)], list(test_dict.loaded_items()))
+
+        with self.assertRaises(tekton_room_dict.DuplicateRoomError):
+            test_dict.add_lazy_room(0x795d4, load_room_2)
+
+        test_dict.add_lazy_room(0x792b3, load_room_2)
+        with self.assertRaises(ValueError):
+            test_dict[0x792b3]
+        self.assertFalse(test_dict.is_loaded(0x792b3), "Room loaded under the wrong header was kept!")
+
+    def test_remove_room(self):
+        test_dict = tekton_room_dict.TektonRoomDict()
+        test_room_1 = tekton_room.TektonRoom()
+        test_room_1.header = 0x795d4
+        changes = []
+        test_dict.add_room(test_room_1)
+        test_dict.add_lazy_room(0x791f8, lambda: None)
+        test_dict.add_observer(lambda *args: changes.append(args[1:]))
+
+        self.assertIsNone(test_dict.remove_room(0x791f8))
+        self.assertEqual(test_room_1, test_dict.remove_room(0x795d4))
+        self.assertEqual([], test_dict.keys())
+        self.assertEqual([("rooms", test_room_1, None)], changes)
+
+        with self.assertRaises(KeyError):
+            test_dict.remove_room(0x795d4)
+
+    def test_values_loads_lazy_rooms(self):
+        test_dict = tekton_room_dict.TektonRoomDict()
+        test_room = tekton_room.TektonRoom()
+        test_room.header = 0x795d4
+        test_dict.add_lazy_room(0x795d4, lambda: test_room)
+
+        self.assertEqual([test_room], test_dict.values())
+        self.assertTrue(test_dict.is_loaded(0x795d4))
+
+    def test_header_change(self):
+        test_dict = tekton_room_dict.TektonRoomDict()
+        test_room_1 = tekton_room.TektonRoom()
+        test_room_1.header = 0x795d4
+        test_room_2 = tekton_room.TektonRoom()
+        test_room_2.header = 0x791f8
+        test_dict.add_room(test_room_1)
+        test_dict.add_room(test_room_2)
+        self.assertEqual([0x791f8, 0x795d4], test_dict.keys())
+
+        test_room_1.header = 0x78000
+        self.assertIsNone(test_dict[0x795d4], "Room was still found under its old header!")
+        self.assertEqual(test_room_1, test_dict[0x78000], "Room was not found under its new header!")
+        self.assertEqual([0x78000, 0x791f8], test_dict.keys())
+        self.assertIn(0x78000, test_dict)
+        self.assertEqual(2, len(test_dict))
+
+        header_changes = []
+        test_room_1.add_observer(lambda *args: header_changes.append(args[1:]))
+        with self.assertRaises(tekton_room_dict.DuplicateRoomError):
+            test_room_1.header = 0x791f8
+        self.assertEqual(0x78000, test_room_1.header, "Header was changed to a duplicate header!")
+        self.assertEqual([], header_changes, "Observers were told about a header that was refused!")
+        self.assertEqual(test_room_2, test_dict[0x791f8])
+
+        test_dict.remove_room(0x791f8)
+        test_room_2.header = 0x78000
+        self.assertEqual(0x78000, test_room_2.header, "Removed room still refused a header used in the dict!")
+
+    def test_copied_rooms(self):
+        test_dict = tekton_room_dict.TektonRoomDict()
+        test_room_1 = tekton_room.TektonRoom()
+        test_room_1.header = 0x795d4
+        test_room_1.map_area = tekton_room.MapArea.NORFAIR
+        test_room_2 = tekton_room.TektonRoom()
+        test_room_2.header = 0x791f8
+        test_dict.add_room(test_room_1)
+        test_dict.add_room(test_room_2)
+        self.assertIsNotNone(test_room_1.header_data)
+
+        for copy_function in [copy.copy, copy.deepcopy]:
+            copied_room = copy_function(test_room_1)
+            copied_room.header = 0x791f8
+            copied_room.map_area = tekton_room.MapArea.TOURIAN
+            copied_room.doors.append(None)
+            self.assertEqual(0x795d4, test_room_1.header)
+            self.assertEqual([], test_room_1.doors, "Copied room shares its doors list with the original room!")
+            self.assertIs(test_room_2, test_dict[0x791f8])
+            self.assertEqual([test_room_1], test_dict.query(map_area=tekton_room.MapArea.NORFAIR),
+                             "Change to a copied room was reported to the original room's dict!")
+            self.assertEqual([], test_dict.query(map_area=tekton_room.MapArea.TOURIAN))
+            self.assertNotIn("_header_data_cache", copied_room.__dict__)
+
+        copied_rooms = copy.deepcopy([test_room_1, test_room_2])
+        self.assertIsNot(test_room_1.standard_state, copied_rooms[0].standard_state)
+        self.assertNotIn("_header_checks", copied_rooms[0].__dict__, "Deep copy of a room copied its room dict!")
+        self.assertEqual([0x791f8, 0x795d4], test_dict.keys(), "Deep copy changed the original room dict!")
+        self.assertIs(test_room_1, test_dict[0x795d4])
+        self.assertEqual(test_room_1.header_data, copied_rooms[0].header_data)
+        copied_rooms[0].standard_state.tileset = tekton_room_state.TileSet.NORFAIR_RED_RIDLEY
+        self.assertNotEqual(test_room_1.header_data, copied_rooms[0].header_data,
+                            "Copied room's header data was not updated after a change to its state!")
+
+    def test_query(self):
+        test_dict = tekton_room_dict.TektonRoomDict()
+        test_room_1 = tekton_room.TektonRoom()
+        test_room_1.header = 0x795d4
+        test_room_1.name = "Room 1"
+        test_room_1.map_area = tekton_room.MapArea.NORFAIR
+        test_room_1.standard_state.tileset = tekton_room_state.TileSet.NORFAIR_RED_RIDLEY
+        test_room_2 = tekton_room.TektonRoom()
+        test_room_2.header = 0x791f8
+        test_room_2.map_area = tekton_room.MapArea.NORFAIR
+        test_room_3 = tekton_room.TektonRoom()
+        test_room_3.header = 0x7968f
+        test_room_3.map_area = tekton_room.MapArea.NORFAIR
+        extra_state_pointer = tekton_room_state.TektonRoomEventStatePointer()
+        extra_state_pointer.room_state = tekton_room_state.TektonRoomState()
+        extra_state_pointer.room_state.tileset = tekton_room_state.TileSet.NORFAIR_RED_RIDLEY
+        extra_state_pointer.room_state.songset = tekton_room_state.SongSet.BOSS_FIGHT_1
+        test_room_3.extra_states.append(extra_state_pointer)
+        test_dict.add_room(test_room_1)
+        test_dict.add_room(test_room_2)
+        test_dict.add_lazy_room(0x7968f, lambda: test_room_3)
+
+        self.assertEqual([test_room_1, test_room_3],
+                         test_dict.query(map_area=tekton_room.MapArea.NORFAIR,
+                                         tileset=tekton_room_state.TileSet.NORFAIR_RED_RIDLEY),
+                         "Query did not return rooms matching every criterion!")
+        self.assertEqual([test_room_3], test_dict.query(songset=tekton_room_state.SongSet.BOSS_FIGHT_1))
+        self.assertEqual([test_room_1], test_dict.query(name="Room 1"))
+        self.assertEqual([test_room_2, test_room_1, test_room_3], test_dict.query())
+        with self.assertRaises(ValueError):
+            test_dict.query(width_screens=1)
+
+        # Indexes follow changes to rooms, states and state pointers
+        test_room_1.map_area = tekton_room.MapArea.TOURIAN
+        test_room_2.standard_state.tileset = tekton_room_state.TileSet.NORFAIR_RED_RIDLEY
+        extra_state_pointer.room_state = tekton_room_state.TektonRoomState()
+        self.assertEqual([test_room_2],
+                         test_dict.query(map_area=tekton_room.MapArea.NORFAIR,
+                                         tileset=tekton_room_state.TileSet.NORFAIR_RED_RIDLEY),
+                         "Query did not reflect changes to indexed fields!")
+        self.assertEqual([], test_dict.query(songset=tekton_room_state.SongSet.BOSS_FIGHT_1))
+
+        test_room_3.extra_states = []
+        test_dict.remove_room(0x791f8)
+        self.assertEqual([test_room_3], test_dict.query(map_area=tekton_room.MapArea.NORFAIR))
+        self.assertEqual([test_room_1], test_dict.query(tileset=tekton_room_state.TileSet.NORFAIR_RED_RIDLEY))
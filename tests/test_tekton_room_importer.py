@@ -25,6 +25,12 @@ class TestTektonRoomImporter(unittest.TestCase):
         self.assertEqual(0,
                          test_importer._room_header_address,
                          "TektonRoomImporter._room_header_address did not initialize correctly!")
+        self.assertEqual({},
+                         test_importer._door_cache,
+                         "TektonRoomImporter._door_cache did not initialize correctly!")
+        self.assertEqual({},
+                         test_importer._room_state_cache,
+                         "TektonRoomImporter._room_state_cache did not initialize correctly!")
 
     def test_room_header_address(self):
         test_importer = tekton_room_importer.TektonRoomImporter()
@@ -210,6 +216,41 @@ class TestTektonRoomImporter(unittest.TestCase):
             with self.assertRaises(ValueError):
                 test_door = test_importer.import_door(-5)
 
+    def test_import_door_interning(self):
+        test_door = tekton_door.TektonDoor()
+        test_door.target_room_id = 0x792b3
+        test_door.eject_direction = tekton_door.DoorEjectDirection.LEFT
+        rom_contents = bytearray(0x20000)
+        rom_contents[0x18ad2:0x18ade] = test_door.door_data
+
+        test_importer = tekton_room_importer.TektonRoomImporter()
+        test_importer.rom_contents = bytes(rom_contents)
+        first_door = test_importer.import_door(0x18ad2)
+        second_door = test_importer.import_door(0x18ad2)
+
+        self.assertIs(first_door, second_door, "Importing the same door address twice returned two objects!")
+        self.assertEqual(0x792b3, first_door.target_room_id)
+        self.assertTrue(isinstance(test_importer.import_door(0x18ac6), tekton_door.TektonElevatorLaunchpad))
+
+        test_importer.clear_cache()
+        self.assertIsNot(first_door, test_importer.import_door(0x18ad2), "clear_cache did not forget imported doors!")
+
+    def test_room_state_interning(self):
+        rom_contents = bytearray(0x80000)
+        rom_contents[0x7a000:0x7a003] = b'\xd2\xbc\xc3'
+
+        test_importer = tekton_room_importer.TektonRoomImporter()
+        test_importer.rom_contents = bytes(rom_contents)
+        first_state = test_importer._get_room_state_at_address(0x7a000)
+        test_importer._level_data_addresses = {}
+        second_state = test_importer._get_room_state_at_address(0x7a000)
+
+        self.assertIs(first_state, second_state, "Importing the same room state address twice returned two objects!")
+        self.assertEqual(0x21bcd2, first_state.level_data_address)
+        self.assertIs(first_state.tiles,
+                      test_importer._level_data_addresses[0x21bcd2],
+                      "Interned room state's tiles were not shared with the current room!")
+
     def _test_room_state_pointer(self, actual_result, expected_result, room_header_address, room_width, room_height):
         print(actual_result)
         if expected_result["type"] == "event_state":
@@ -0,0 +1,78 @@
+from testing_common import tekton, load_test_data_dir, load_room_from_test_data
+from tekton import tekton_room_record, tekton_room_state, tekton_door
+import os
+import unittest
+
+
+class TestTektonRoomRecord(unittest.TestCase):
+    def test_room_record_round_trip(self):
+        test_data_dir = os.path.join(os.path.dirname((os.path.abspath(__file__))),
+                                     'fixtures',
+                                     'unit',
+                                     'test_tekton_room',
+                                     'test_header_data'
+                                     )
+        test_data = load_test_data_dir(test_data_dir)
+
+        for test_case in test_data:
+            test_room = load_room_from_test_data(test_case)
+            test_record = tekton_room_record.room_to_record(test_room)
+            actual_room = tekton_room_record.room_from_record(test_record)
+
+            self.assertEqual(test_record,
+                             tekton_room_record.room_to_record(actual_room),
+                             "Room rebuilt from record did not produce the same record!")
+            self.assertEqual(test_room.header_data,
+                             actual_room.header_data,
+                             "Room rebuilt from record did not produce the same header data!")
+
+    def test_room_from_record_shares_tile_grids(self):
+        test_room = tekton.tekton_room.TektonRoom(2, 1)
+        test_room.standard_state.level_data_address = 0x21bcd2
+        test_pointer = tekton_room_state.TektonRoomEventStatePointer()
+        test_pointer.event_value = 0x0e
+        test_pointer.room_state = tekton_room_state.TektonRoomState()
+        test_pointer.room_state.level_data_address = 0x21bcd2
+        test_room.extra_states.append(test_pointer)
+
+        actual_room = tekton_room_record.room_from_record(tekton_room_record.room_to_record(test_room))
+
+        self.assertIs(actual_room.standard_state.tiles,
+                      actual_room.extra_states[0].room_state.tiles,
+                      "Room states with the same level data address did not share a tile grid!")
+        self.assertEqual(32, actual_room.standard_state.tiles.width)
+        self.assertEqual(0x0e, actual_room.extra_states[0].event_value)
+
+    def test_room_from_record_interns_room_states(self):
+        test_room = tekton.tekton_room.TektonRoom(2, 1)
+        test_room.standard_state.level_data_address = 0x21bcd2
+
+        def get_state_address(room_state):
+            return 0x795df if room_state is test_room.standard_state else None
+
+        test_record = tekton_room_record.room_to_record(test_room, state_address=get_state_address)
+        self.assertEqual(0x795df, test_record.standard_state.data_address)
+
+        interned_room_states = {}
+        first_room = tekton_room_record.room_from_record(test_record, interned_room_states=interned_room_states)
+        second_room = tekton_room_record.room_from_record(test_record, interned_room_states=interned_room_states)
+        self.assertIs(first_room.standard_state, second_room.standard_state,
+                      "Room states with the same data address were not interned!")
+        self.assertEqual({0x795df: first_room.standard_state}, interned_room_states)
+
+        third_room = tekton_room_record.room_from_record(test_record)
+        self.assertIsNot(first_room.standard_state, third_room.standard_state)
+        self.assertIsNone(tekton_room_record.room_to_record(test_room).standard_state.data_address)
+
+    def test_launchpad_record(self):
+        test_room = tekton.tekton_room.TektonRoom()
+        test_launchpad = tekton_door.TektonElevatorLaunchpad()
+        test_launchpad.data_address = 0x1a332
+        test_launchpad.door_data = b'\x00\x00\x80\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+        test_room.doors.append(test_launchpad)
+
+        actual_room = tekton_room_record.room_from_record(tekton_room_record.room_to_record(test_room))
+
+        self.assertTrue(isinstance(actual_room.doors[0], tekton_door.TektonElevatorLaunchpad))
+        self.assertEqual(test_launchpad.door_data, actual_room.doors[0].door_data)
+        self.assertEqual(0x1a332, actual_room.doors[0].data_address)
@@ -0,0 +1,134 @@
+import os
+import tempfile
+import unittest
+
+from testing_common import tekton, load_room_from_test_data
+from tekton import tekton_door, tekton_project, tekton_room_state, tekton_snapshot
+
+
+class TestTektonSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.snapshot_path = os.path.join(self.temp_dir.name, "project.tss")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def get_test_rooms(self):
+        first_room = load_room_from_test_data({"header": 0x795d4,
+                                               "name": "Crateria Tube",
+                                               "room_width": 2,
+                                               "room_height": 1,
+                                               "level_data_length": 0x80,
+                                               "map_area": 0x01,
+                                               "standard_state": {"level_data_address": 0x21bcd2,
+                                                                  "tileset": 0x02,
+                                                                  "songset": 0x09,
+                                                                  "fx_pointer": 0x8186},
+                                               "extra_states": [{"type": "event_state",
+                                                                 "event_value": 0x0e,
+                                                                 "room_state": {"level_data_address": 0x21bcd2}},
+                                                                {"type": "landing_state",
+                                                                 "room_state": {"level_data_address": 0x21c000}}],
+                                               "doors": [{"data_address": 0x18ac6, "target_room_id": 0x79461}]})
+        first_room.standard_state.tiles[3][4].tileno = 0x2e0
+        first_room.standard_state.tiles[3][4].h_mirror = True
+        first_room.standard_state.tiles[20][2].bts_type = 0x0c
+        first_room.standard_state.tiles[20][2].bts_num = 0x81
+        first_room.extra_states[0].room_state.tiles = first_room.standard_state.tiles
+        first_room.extra_states[1].room_state.tiles[0][0] = None
+
+        launchpad = tekton_door.TektonElevatorLaunchpad()
+        launchpad.data_address = 0x18b9e
+        launchpad.door_data = b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x01'
+        first_room.doors.append(launchpad)
+
+        second_room = load_room_from_test_data({"header": 0x79461,
+                                                "room_width": 1,
+                                                "room_height": 1,
+                                                "standard_state": {"level_data_address": 0x21d000}})
+        second_room.doors.append(first_room.doors[0])
+        return [first_room, second_room]
+
+    def test_round_trip(self):
+        test_rooms = self.get_test_rooms()
+        tekton_snapshot.write_snapshot(self.snapshot_path, "original_rom.sfc", test_rooms)
+
+        for memory_map in [True, False]:
+            source_rom_path, loaded_rooms = tekton_snapshot.read_snapshot(self.snapshot_path, memory_map=memory_map)
+            self.assertEqual("original_rom.sfc", source_rom_path)
+            self.assertEqual(len(test_rooms), len(loaded_rooms))
+            for test_room, loaded_room in zip(test_rooms, loaded_rooms):
+                self.assertEqual(test_room.name, loaded_room.name)
+                self.assertEqual(test_room.map_area, loaded_room.map_area)
+                self.assertEqual(test_room.level_data_length, loaded_room.level_data_length)
+                self.assertEqual(test_room.header_data, loaded_room.header_data, "Room header data does not match!")
+                self.assertEqual(test_room.standard_state.tiles.uncompressed_data,
+                                 loaded_room.standard_state.tiles.uncompressed_data,
+                                 "Tiles do not match!")
+                self.assertEqual([door.door_data for door in test_room.doors],
+                                 [door.door_data for door in loaded_room.doors])
+
+            first_room, second_room = loaded_rooms
+            self.assertIsInstance(first_room.extra_states[0], tekton_room_state.TektonRoomEventStatePointer)
+            self.assertEqual(0x0e, first_room.extra_states[0].event_value)
+            self.assertIsInstance(first_room.extra_states[1], tekton_room_state.TektonRoomLandingStatePointer)
+            self.assertIsInstance(first_room.doors[1], tekton_door.TektonElevatorLaunchpad)
+            self.assertIs(first_room.doors[0], second_room.doors[0], "Shared door was not shared after loading!")
+            self.assertIs(first_room.standard_state.tiles, first_room.extra_states[0].room_state.tiles,
+                          "Shared tile grid was not shared after loading!")
+            self.assertEqual(0x2e0, first_room.standard_state.tiles[3][4].tileno)
+            self.assertTrue(first_room.standard_state.tiles[3][4].h_mirror)
+            self.assertEqual(0x0c, first_room.standard_state.tiles[20][2].bts_type)
+            self.assertEqual(0x81, first_room.standard_state.tiles[20][2].bts_num)
+            self.assertIsNone(first_room.extra_states[1].room_state.tiles[0][0], "Empty tile was not kept empty!")
+            self.assertIsNotNone(first_room.extra_states[1].room_state.tiles[1][0])
+
+    def test_save_lazy_grids(self):
+        test_rooms = self.get_test_rooms()
+        tekton_snapshot.write_snapshot(self.snapshot_path, "original_rom.sfc", test_rooms)
+        source_rom_path, loaded_rooms = tekton_snapshot.read_snapshot(self.snapshot_path, memory_map=False)
+
+        second_snapshot_path = os.path.join(self.temp_dir.name, "second_project.tss")
+        tekton_snapshot.write_snapshot(second_snapshot_path, source_rom_path, loaded_rooms)
+        self.assertIn("_pending_data", loaded_rooms[1].standard_state.tiles.__dict__,
+                      "Saving a snapshot created the tiles of a grid loaded from a snapshot!")
+
+        source_rom_path, reloaded_rooms = tekton_snapshot.read_snapshot(second_snapshot_path)
+        for test_room, reloaded_room in zip(test_rooms, reloaded_rooms):
+            self.assertEqual(test_room.standard_state.tiles.uncompressed_data,
+                             reloaded_room.standard_state.tiles.uncompressed_data,
+                             "Tiles do not match!")
+
+    def test_project_snapshot(self):
+        source_rom_path = os.path.join(self.temp_dir.name, "blank_rom.sfc")
+        with open(source_rom_path, "wb") as f:
+            f.write(b'\xff' * 0x300000)
+
+        test_project = tekton_project.TektonProject()
+        test_project.source_rom_path = source_rom_path
+        for test_room in self.get_test_rooms():
+            test_project.rooms.add_room(test_room)
+        test_project.save_snapshot(self.snapshot_path)
+
+        loaded_project = tekton_project.TektonProject.load_snapshot(self.snapshot_path)
+        self.assertEqual(source_rom_path, loaded_project.source_rom_path)
+        self.assertEqual(test_project.rooms.keys(), loaded_project.rooms.keys())
+        self.assertEqual(test_project.get_modified_rom_contents(), loaded_project.get_modified_rom_contents())
+
+    def test_bad_snapshot(self):
+        with open(self.snapshot_path, "wb") as f:
+            f.write(b'PATCH' + b'\x00' * 100)
+        with self.assertRaises(tekton_snapshot.SnapshotFormatError):
+            tekton_snapshot.read_snapshot(self.snapshot_path)
+
+        tekton_snapshot.write_snapshot(self.snapshot_path, None, [])
+        with open(self.snapshot_path, "r+b") as f:
+            f.seek(len(tekton_snapshot.SNAPSHOT_MAGIC))
+            f.write((tekton_snapshot.SNAPSHOT_VERSION + 1).to_bytes(2, byteorder="little"))
+        with self.assertRaises(tekton_snapshot.SnapshotFormatError):
+            tekton_snapshot.read_snapshot(self.snapshot_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+from testing_common import tekton
+from tekton import tekton_synthetic_rom, tekton_room_importer, tekton_checksum, tekton_project, tekton_door
+import os
+import tempfile
+import unittest
+
+
+class TestTektonSyntheticROM(unittest.TestCase):
+    def test_generate_synthetic_rom(self):
+        test_rom = tekton_synthetic_rom.generate_synthetic_rom(40, rom_size=0x300000, seed=3)
+
+        self.assertEqual(0x300000, len(test_rom.rom_contents))
+        self.assertEqual(40, len(test_rom.room_headers))
+        self.assertEqual(tekton_synthetic_rom.ROOM_HEADERS_START, test_rom.room_headers[0])
+        self.assertTrue(tekton_checksum.verify_checksum(test_rom.rom_contents), "Synthetic ROM checksum is wrong!")
+        self.assertEqual(test_rom, tekton_synthetic_rom.generate_synthetic_rom(40, rom_size=0x300000, seed=3),
+                         "The same seed did not generate the same ROM!")
+        tekton_synthetic_rom.clear_cache()
+        self.assertEqual(test_rom, tekton_synthetic_rom.generate_synthetic_rom(40, rom_size=0x300000, seed=3),
+                         "A cold start did not generate the same ROM!")
+        self.assertNotEqual(test_rom.rom_contents,
+                            tekton_synthetic_rom.generate_synthetic_rom(40, rom_size=0x300000, seed=4).rom_contents)
+
+    def test_import_synthetic_rooms(self):
+        test_rom = tekton_synthetic_rom.generate_synthetic_rom(40, rom_size=0x300000, seed=3)
+        test_importer = tekton_room_importer.TektonRoomImporter()
+        test_importer.rom_contents = test_rom.rom_contents
+
+        room_headers = set(test_rom.room_headers)
+        extra_state_count = 0
+        for header in test_rom.room_headers:
+            test_importer.room_header_address = header
+            test_room = test_importer.import_room_from_rom()
+            extra_state_count += len(test_room.extra_states)
+
+            self.assertEqual(test_rom.rom_contents[header:header + len(test_room.header_data)], test_room.header_data,
+                             "Imported room did not produce the header data it was imported from!")
+            self.assertGreater(len(test_room.doors), 0)
+            for door in test_room.doors:
+                self.assertIsInstance(door, tekton_door.TektonDoor)
+                self.assertIn(door.target_room_id, room_headers, "Door does not lead to a room in the ROM!")
+                self.assertEqual(test_rom.rom_contents[door.data_address:door.data_address + 12], door.door_data)
+            for room_state_address, room_state in test_room.room_state_addresses:
+                self.assertGreaterEqual(room_state.level_data_address, tekton_synthetic_rom.LEVEL_DATA_START)
+                self.assertEqual(b'\x01\x00', test_rom.rom_contents[room_state.level_data_address:
+                                                                    room_state.level_data_address + 2])
+        self.assertGreater(extra_state_count, 0, "Synthetic ROM has no rooms with extra states!")
+
+    def test_write_synthetic_rom(self):
+        with tempfile.TemporaryDirectory() as test_dir:
+            rom_path = os.path.join(test_dir, "synthetic.sfc")
+            header_address_file = os.path.join(test_dir, "rooms.yaml")
+            test_rom = tekton_synthetic_rom.write_synthetic_rom(rom_path, header_address_file, room_count=10,
+                                                                rom_size=0x300000)
+
+            test_project = tekton_project.TektonProject()
+            test_project.source_rom_path = rom_path
+            test_project.import_rooms(header_address_file)
+            self.assertEqual(test_rom.room_headers, test_project.rooms.keys())
+            self.assertEqual("Synthetic Room 0", test_project.rooms[test_rom.room_headers[0]].name)
+
+            # The importer does not decompress level data, so only write headers and doors
+            for header, room in test_project.rooms.items():
+                room.write_level_data = False
+            self.assertEqual(test_rom.rom_contents, test_project.get_modified_rom_contents(),
+                             "Rebuilding unchanged synthetic rooms changed the ROM!")
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(TypeError):
+            tekton_synthetic_rom.generate_synthetic_rom("10")
+        with self.assertRaises(ValueError):
+            tekton_synthetic_rom.generate_synthetic_rom(0)
+        with self.assertRaises(ValueError):
+            tekton_synthetic_rom.generate_synthetic_rom(10, rom_size=0x100000)
+        with self.assertRaises(ValueError):
+            tekton_synthetic_rom.generate_synthetic_rom(10, max_width_screens=10, max_height_screens=10)
+        with self.assertRaises(ValueError):
+            tekton_synthetic_rom.generate_synthetic_rom(2000)  # Headers do not fit in bank $8F
@@ -50,6 +50,20 @@ class TestTektonSystem(unittest.TestCase):
 
         self.assertEqual(expected_result, actual_result, "Byte string was not correctly replaced at index {}".format(replace_start_index))
 
+    def test_overwrite_bytes_in_place(self):
+        test_buffer = bytearray(b'\x00\x00\x00\x00\x00\x00\x00\x00')
+        tekton_system.overwrite_bytes_in_place(test_buffer, b'\x11\x22\x33\x44', 0x02)
+        self.assertEqual(bytearray(b'\x00\x00\x11\x22\x33\x44\x00\x00'), test_buffer)
+
+        tekton_system.overwrite_bytes_in_place(test_buffer, b'\x55\x66', 0x06)
+        self.assertEqual(bytearray(b'\x00\x00\x11\x22\x33\x44\x55\x66'), test_buffer)
+
+        with self.assertRaises(ValueError):
+            tekton_system.overwrite_bytes_in_place(test_buffer, b'\x77\x88', 0x07)
+        with self.assertRaises(ValueError):
+            tekton_system.overwrite_bytes_in_place(test_buffer, b'\x77', -1)
+        self.assertEqual(8, len(test_buffer), "Buffer length changed after failed writes!")
+
     def test_pad_bytes(self):
         test_data_dir = os.path.join(os.path.dirname((os.path.abspath(__file__))),
                                      'fixtures',
@@ -65,4 +79,48 @@ class TestTektonSystem(unittest.TestCase):
             pad_byte = test_case["pad_byte"].to_bytes(1, byteorder="big")
             expected_result = int_list_to_bytes(test_case["expected_result"])
             actual_result = tekton_system.pad_bytes(input_string, min_length, pad_byte)
-            self.assertEqual(expected_result, actual_result, "pad_bytes did not return the correct results!")
\ No newline at end of file
+            self.assertEqual(expected_result, actual_result, "pad_bytes did not return the correct results!")
+
+    def test_observable(self):
+        class TestObservable(tekton_system.TektonObservable):
+            _observed_attributes = frozenset(["watched"])
+
+            def __init__(self):
+                self.watched = 0
+                self.unwatched = 0
+
+        changes = []
+
+        def test_observer(changed_object, attribute_name, old_value, new_value):
+            changes.append((changed_object, attribute_name, old_value, new_value))
+
+        test_object = TestObservable()
+        test_object.add_observer(test_observer)
+        test_object.add_observer(test_observer)
+        test_object.watched = 5
+        test_object.unwatched = 5
+        self.assertEqual([(test_object, "watched", 0, 5)], changes)
+
+        test_object.remove_observer(test_observer)
+        test_object.watched = 6
+        self.assertEqual(1, len(changes), "Observer was called after it was removed!")
+
+    def test_observable_list(self):
+        class TestOwner(tekton_system.TektonObservable):
+            pass
+
+        changes = []
+        test_owner = TestOwner()
+        test_list = tekton_system.TektonObservableList(test_owner, "items", [1, 2])
+        test_list.append(3)
+        self.assertEqual([], changes)
+
+        test_owner.add_observer(lambda *args: changes.append(args[1:]))
+        test_list.append(4)
+        test_list[0] = 0
+        del test_list[1]
+        self.assertEqual([("items", [1, 2, 3], [1, 2, 3, 4]),
+                          ("items", [1, 2, 3, 4], [0, 2, 3, 4]),
+                          ("items", [0, 2, 3, 4], [0, 3, 4])],
+                         changes)
+        self.assertEqual([0, 3, 4], test_list)
@@ -130,4 +130,100 @@ class TestTektonTileGrid(unittest.TestCase):
                 if col == 8 and row == 14:
                     self.assertEqual(paste_tile, bg_grid[col][row], "TileGrid returned incorrect tile!")
                 else:
-                    self.assertEqual(bg_tile, bg_grid[col][row], "TileGrid returned incorrect tile!")
\ No newline at end of file
+                    self.assertEqual(bg_tile, bg_grid[col][row], "TileGrid returned incorrect tile!")
+
+    def test_dirty(self):
+        test_grid = tekton_tile_grid.TektonTileGrid(4, 4)
+        self.assertTrue(test_grid.dirty, "New TektonTileGrid is not dirty!")
+        test_grid.fill()
+        test_grid.mark_clean()
+        self.assertFalse(test_grid.dirty)
+
+        test_grid[1][2].tileno = 0x2e0
+        self.assertTrue(test_grid.dirty, "Changing a tile in the grid did not mark the grid dirty!")
+        test_grid.mark_clean()
+
+        test_grid[1][2] = tekton_tile.TektonTile()
+        self.assertTrue(test_grid.dirty, "Placing a tile in the grid did not mark the grid dirty!")
+        test_grid.mark_clean()
+
+        paste_grid = tekton_tile_grid.TektonTileGrid(2, 2)
+        paste_grid.fill()
+        test_grid.overwrite_with(paste_grid)
+        self.assertTrue(test_grid.dirty, "overwrite_with did not mark the grid dirty!")
+        test_grid.mark_clean()
+
+        paste_grid[0][0].tileno = 0x10
+        self.assertFalse(test_grid.dirty, "Changing a copied tile marked the original grid dirty!")
+
+    def test_tile_observers(self):
+        test_grid = tekton_tile_grid.TektonTileGrid(4, 4)
+        test_grid.fill()
+        changes = []
+        test_grid.add_observer(lambda *args: changes.append(args[1:]))
+
+        test_grid[1][2].tileno = 0x2e0
+        self.assertEqual(1, len(changes))
+        self.assertEqual("tiles", changes[0][0])
+        self.assertEqual([(1, 2)], list(changes[0][1].keys()))
+        self.assertEqual(0x00, changes[0][1][(1, 2)].tileno)
+        self.assertEqual(0x2e0, changes[0][2][(1, 2)].tileno)
+
+        new_tile = tekton_tile.TektonTile()
+        new_tile.bts_type = 0x08
+        test_grid.set_tile(3, 0, new_tile)
+        self.assertEqual(0x08, changes[1][2][(3, 0)].bts_type)
+        self.assertIs(new_tile, test_grid[3][0])
+
+        new_tile.h_mirror = True
+        self.assertEqual([(3, 0)], list(changes[2][2].keys()))
+        self.assertTrue(changes[2][2][(3, 0)].h_mirror)
+
+        loaded_grid = tekton_tile_grid.TektonTileGrid.from_uncompressed_data(4, 4, test_grid.uncompressed_data)
+        loaded_grid.add_observer(lambda *args: changes.append(args[1:]))
+        loaded_grid[2][3].bts_num = 0x42
+        self.assertEqual([(2, 3)], list(changes[3][2].keys()))
+
+    def test_place_owned_tile(self):
+        first_grid = tekton_tile_grid.TektonTileGrid(2, 2)
+        first_grid.fill()
+        second_grid = tekton_tile_grid.TektonTileGrid(2, 2)
+        second_grid.fill()
+        second_grid.mark_clean()
+
+        owned_tile = first_grid[0][0]
+        second_grid[1][1] = owned_tile
+        self.assertIsNot(owned_tile, second_grid[1][1], "Tile already in a grid was placed without being copied!")
+        first_grid[1][0:2] = [owned_tile, owned_tile]
+        self.assertIsNot(first_grid[1][0], first_grid[1][1])
+        self.assertIs(owned_tile, first_grid[0][0])
+
+        second_grid.mark_clean()
+        owned_tile.tileno = 0x2e0
+        self.assertFalse(second_grid.dirty, "Changing a tile marked a grid holding a copy of it dirty!")
+        self.assertEqual(0x00, second_grid[1][1].tileno)
+        second_grid[1][1] = second_grid[1][1]
+        self.assertIs(second_grid[1][1], second_grid[1][1])
+
+    def test_from_uncompressed_data(self):
+        test_grid = tekton_tile_grid.TektonTileGrid(3, 2)
+        test_grid.fill()
+        test_grid[2][1].tileno = 0x2e0
+        test_grid[2][1].v_mirror = True
+        test_grid[0][1].bts_type = 0x0f
+        test_grid[0][1].bts_num = 0x42
+
+        loaded_grid = tekton_tile_grid.TektonTileGrid.from_uncompressed_data(3, 2, test_grid.uncompressed_data)
+        self.assertEqual(3, loaded_grid.width)
+        self.assertEqual(2, loaded_grid.height)
+        self.assertEqual(test_grid.uncompressed_data, loaded_grid.uncompressed_data)
+        for x in range(3):
+            for y in range(2):
+                self.assertEqual(test_grid[x][y], loaded_grid[x][y], "Tile at {},{} does not match!".format(x, y))
+
+        loaded_grid.mark_clean()
+        loaded_grid[1][1].tileno = 0x10
+        self.assertTrue(loaded_grid.dirty, "Changing a tile in a loaded grid did not mark it dirty!")
+
+        with self.assertRaises(ValueError):
+            tekton_tile_grid.TektonTileGrid.from_uncompressed_data(3, 2, b'\x00' * 17)
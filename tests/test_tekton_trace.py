@@ -0,0 +1,125 @@
+from testing_common import tekton
+from tekton import tekton_trace, tekton_synthetic_rom, tekton_project, tekton_room, tekton_tile_grid
+import json
+import os
+import tempfile
+import unittest
+
+
+class TestTektonTrace(unittest.TestCase):
+    def tearDown(self):
+        tekton_trace.disable_tracing()
+
+    def test_disabled(self):
+        tekton_trace.disable_tracing()
+        self.assertIsNone(tekton_trace.get_tracer())
+        with tekton_trace.trace_span("test", header=0x795d4) as span:
+            span.set(bytes=10)
+        self.assertIs(tekton_trace.trace_span("test"), tekton_trace.trace_span("other"),
+                      "Disabled spans should share a single object!")
+
+    def test_nested_spans(self):
+        test_tracer = tekton_trace.enable_tracing()
+        self.assertIs(test_tracer, tekton_trace.get_tracer())
+        with tekton_trace.trace_span("outer", header=0x795d4) as outer_span:
+            with tekton_trace.trace_span("inner") as inner_span:
+                inner_span.set(bytes=10)
+            outer_span.set(cache_hit=False)
+        with self.assertRaises(ValueError):
+            with tekton_trace.trace_span("failed"):
+                raise ValueError("test")
+
+        self.assertEqual(["inner", "outer", "failed"], [span.name for span in test_tracer.spans])
+        inner_record, outer_record, failed_record = test_tracer.spans
+        self.assertEqual({"bytes": 10}, inner_record.attributes)
+        self.assertEqual({"header": 0x795d4, "cache_hit": False}, outer_record.attributes)
+        self.assertEqual({"error": "ValueError"}, failed_record.attributes)
+        self.assertLessEqual(outer_record.start_ns, inner_record.start_ns)
+        self.assertGreaterEqual(outer_record.start_ns + outer_record.duration_ns,
+                                inner_record.start_ns + inner_record.duration_ns,
+                                "Inner span did not finish inside the outer span!")
+
+        self.assertIs(test_tracer, tekton_trace.disable_tracing())
+        with tekton_trace.trace_span("ignored"):
+            pass
+        self.assertEqual(3, len(test_tracer.spans), "Span was recorded after tracing was disabled!")
+        test_tracer.clear()
+        self.assertEqual([], test_tracer.spans)
+
+    def test_chrome_trace(self):
+        test_tracer = tekton_trace.enable_tracing()
+        with tekton_trace.trace_span("outer"):
+            with tekton_trace.trace_span("inner", header=0x795d4):
+                pass
+
+        trace = test_tracer.to_chrome_trace()
+        self.assertEqual(["outer", "inner"], [event["name"] for event in trace["traceEvents"]],
+                         "Trace events should be sorted by start time!")
+        for event, span_record in zip(trace["traceEvents"], reversed(test_tracer.spans)):
+            self.assertEqual("X", event["ph"])
+            self.assertEqual(span_record.start_ns / 1000, event["ts"])
+            self.assertEqual(span_record.duration_ns / 1000, event["dur"])
+            self.assertEqual(os.getpid(), event["pid"])
+            self.assertEqual(span_record.attributes, event["args"])
+
+        with tempfile.TemporaryDirectory() as test_dir:
+            trace_path = os.path.join(test_dir, "trace.json")
+            test_tracer.write_chrome_trace(trace_path)
+            with open(trace_path) as f:
+                self.assertEqual(trace, json.load(f))
+
+    def test_traced_import_and_build(self):
+        with tempfile.TemporaryDirectory() as test_dir:
+            rom_path = os.path.join(test_dir, "synthetic.sfc")
+            header_address_file = os.path.join(test_dir, "rooms.yaml")
+            test_rom = tekton_synthetic_rom.write_synthetic_rom(rom_path, header_address_file, room_count=10,
+                                                                rom_size=0x300000)
+            test_project = tekton_project.TektonProject()
+            test_project.source_rom_path = rom_path
+
+            test_tracer = tekton_trace.enable_tracing()
+            test_project.import_rooms(header_address_file)
+            for header, room in test_project.rooms.items():
+                room.write_level_data = False
+            test_project.get_modified_rom_contents()
+
+        spans_by_name = {}
+        for span_record in test_tracer.spans:
+            spans_by_name.setdefault(span_record.name, []).append(span_record)
+        self.assertEqual(1, len(spans_by_name["import_rooms"]))
+        self.assertEqual(10, spans_by_name["import_rooms"][0].attributes["room_count"])
+        self.assertEqual(test_rom.room_headers,
+                         [span_record.attributes["header"] for span_record in spans_by_name["import_room_from_rom"]])
+        for span_record in spans_by_name["import_room_from_rom"]:
+            self.assertGreater(span_record.attributes["door_count"], 0)
+        self.assertEqual(1, len(spans_by_name["get_modified_rom_contents"]))
+        self.assertEqual(10, spans_by_name["get_modified_rom_contents"][0].attributes["changed_rooms"])
+        write_owners = set(span_record.attributes["owner"] for span_record in spans_by_name["write"])
+        self.assertEqual({"TektonRoom", "TektonDoor"}, write_owners)
+
+    def test_traced_level_data(self):
+        test_room = tekton_room.TektonRoom(2, 1)
+        test_room.header = 0x795d4
+        test_room.standard_state.tiles = tekton_tile_grid.TektonTileGrid(32, 16)
+        test_room.standard_state.tiles.fill()
+        test_tracer = tekton_trace.enable_tracing()
+        compressed_data = test_room.compressed_level_data(test_room.standard_state, fit_to_length=False)
+
+        compress_record = test_tracer.spans[-1]
+        self.assertEqual("compressed_level_data", compress_record.name)
+        self.assertEqual(0x795d4, compress_record.attributes["header"])
+        self.assertEqual(len(compressed_data), compress_record.attributes["compressed_bytes"])
+        self.assertEqual(len(test_room.standard_state.tiles.uncompressed_data),
+                         compress_record.attributes["uncompressed_bytes"])
+
+        test_tiles = test_room.standard_state.tiles
+        test_tile_grid = tekton_tile_grid.TektonTileGrid.from_uncompressed_data(test_tiles.width,
+                                                                                test_tiles.height,
+                                                                                test_tiles.uncompressed_data)
+        test_tracer.clear()
+        test_tile_grid[0][0]
+        self.assertEqual(["load_tiles"], [span_record.name for span_record in test_tracer.spans])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import os
+import tempfile
+import unittest
+
+from testing_common import tekton, load_room_from_test_data
+from tekton import tekton_project, tekton_tile, tekton_variant
+
+
+class TestTektonVariant(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.source_rom_path = os.path.join(self.temp_dir.name, "source_rom.sfc")
+        with open(self.source_rom_path, "wb") as f:
+            f.write(bytes(0x300000))
+
+        self.test_project = tekton_project.TektonProject()
+        self.test_project.source_rom_path = self.source_rom_path
+        for room_data in [{"header": 0x795d4,
+                           "room_width": 1,
+                           "room_height": 1,
+                           "level_data_length": 0x40,
+                           "standard_state": {"level_data_address": 0x21bcd2},
+                           "extra_states": [{"type": "landing_state",
+                                             "room_state": {"level_data_address": 0x21bcd2}}],
+                           "doors": [{"data_address": 0x18ac6, "target_room_id": 0x79461}]},
+                          {"header": 0x79461,
+                           "room_width": 1,
+                           "room_height": 1,
+                           "level_data_length": 0x40,
+                           "standard_state": {"level_data_address": 0x21c000}}]:
+            self.test_project.rooms.add_room(load_room_from_test_data(room_data))
+        crateria_tube = self.test_project.rooms[0x795d4]
+        crateria_tube.extra_states[0].room_state.tiles = crateria_tube.standard_state.tiles
+        self.test_project.rooms[0x79461].doors.append(crateria_tube.doors[0])
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def get_test_variant(self):
+        test_tile = tekton_tile.TektonTile()
+        test_tile.tileno = 0x2e0
+        test_variant = tekton_variant.TektonVariant("Test Variant")
+        test_variant.set_room_attribute(0x795d4, "up_scroller", 0x70)
+        test_variant.set_door_attribute(0x18ac6, "target_room_id", 0x792b3)
+        test_variant.set_tile(0x79461, 3, 4, test_tile)
+        return test_variant
+
+    def test_variant_rom_contents(self):
+        variant_base = tekton_variant.TektonVariantBase.from_project(self.test_project)
+        base_contents = variant_base.base_contents
+        variant_contents = variant_base.get_variant_rom_contents(self.get_test_variant())
+
+        self.assertEqual(base_contents, variant_base.base_contents, "Building a variant changed the base ROM!")
+        self.assertEqual(0x00, self.test_project.rooms[0x795d4].up_scroller, "Building a variant changed a base room!")
+        self.assertEqual(0x79461, self.test_project.rooms[0x79461].doors[0].target_room_id,
+                         "Building a variant changed a base door!")
+        self.assertEqual(0x00, self.test_project.rooms[0x79461].standard_state.tiles[3][4].tileno,
+                         "Building a variant changed a base tile!")
+
+        # Making the same changes to the project should give the same ROM
+        self.test_project.rooms[0x795d4].up_scroller = 0x70
+        self.test_project.rooms[0x795d4].doors[0].target_room_id = 0x792b3
+        self.test_project.rooms[0x79461].standard_state.tiles[3][4].tileno = 0x2e0
+        self.assertEqual(self.test_project.get_modified_rom_contents(), variant_contents)
+
+        empty_contents = variant_base.get_variant_rom_contents(tekton_variant.TektonVariant())
+        self.assertEqual(base_contents, empty_contents)
+
+    def test_variant_shares_tiles(self):
+        test_variant = tekton_variant.TektonVariant()
+        test_variant.set_tile(0x795d4, 0, 0, tekton_tile.TektonTile())
+        variant_base = tekton_variant.TektonVariantBase.from_project(self.test_project)
+        variant_writes = variant_base.get_variant_writes(test_variant)
+        variant_room = variant_writes[-1][2]
+        self.assertIsNot(self.test_project.rooms[0x795d4].standard_state.tiles, variant_room.standard_state.tiles)
+        self.assertIs(variant_room.standard_state.tiles, variant_room.extra_states[0].room_state.tiles)
+
+    def test_bad_variant(self):
+        variant_base = tekton_variant.TektonVariantBase.from_project(self.test_project)
+        bad_room_variant = tekton_variant.TektonVariant()
+        bad_room_variant.set_room_attribute(0x792b3, "up_scroller", 0x70)
+        bad_door_variant = tekton_variant.TektonVariant()
+        bad_door_variant.set_door_attribute(0x18b9e, "target_room_id", 0x792b3)
+        bad_tile_variant = tekton_variant.TektonVariant()
+        bad_tile_variant.set_tile(0x795d4, 16, 0, tekton_tile.TektonTile())
+        moved_door_variant = tekton_variant.TektonVariant()
+        moved_door_variant.door_overrides[0x18ac6] = {"data_address": 0x18ad2}
+        for bad_variant in [bad_room_variant, bad_door_variant, bad_tile_variant, moved_door_variant]:
+            with self.assertRaises(ValueError):
+                variant_base.get_variant_writes(bad_variant)
+
+        with self.assertRaises(TypeError):
+            tekton_variant.TektonVariant().set_tile(0x795d4, 0, 0, 0x2e0)
+        with self.assertRaises(ValueError):
+            tekton_variant.TektonVariant().set_door_attribute(0x18ac6, "data_address", 0x18ad2)
+
+    def test_build_variants(self):
+        variant_base = tekton_variant.TektonVariantBase.from_project(self.test_project)
+        test_variants = [tekton_variant.TektonVariant() for i in range(4)]
+        for i, test_variant in enumerate(test_variants):
+            test_variant.set_room_attribute(0x795d4, "up_scroller", i)
+        test_variants[3] = self.get_test_variant()
+
+        for jobs in [1, 2]:
+            output_rom_paths = [os.path.join(self.temp_dir.name, "variant_{}_{}.sfc".format(jobs, i))
+                                for i in range(len(test_variants))]
+            build_stats = variant_base.build_variants(test_variants, output_rom_paths, jobs=jobs)
+            self.assertEqual(len(test_variants), build_stats.variant_count)
+            self.assertGreater(build_stats.variants_per_second, 0)
+            for test_variant, output_rom_path in zip(test_variants, output_rom_paths):
+                with open(output_rom_path, "rb") as f:
+                    self.assertEqual(variant_base.get_variant_rom_contents(test_variant), f.read(),
+                                     "Variant built with {} jobs does not match!".format(jobs))
+
+        with self.assertRaises(ValueError):
+            variant_base.build_variants(test_variants, output_rom_paths[:1])
+        with self.assertRaises(ValueError):
+            variant_base.build_variants(test_variants, output_rom_paths, jobs=0)
+        with self.assertRaises(TypeError):
+            variant_base.build_variants(test_variants, output_rom_paths, jobs=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
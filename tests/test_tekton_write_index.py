@@ -0,0 +1,59 @@
+import unittest
+
+from testing_common import tekton
+from tekton import tekton_write_index
+
+
+class TestTektonWriteIndex(unittest.TestCase):
+    def setUp(self):
+        self.test_writes = [(0x100, b'\x01' * 0x10, "first"),
+                            (0x108, b'\x02' * 0x10, "second"),
+                            (0x120, b'\x03' * 0x04, "third"),
+                            (0x120, b'\x03' * 0x04, "third copy"),
+                            (0x200, b'\x04' * 0x100, "fourth"),
+                            (0x210, b'\x04' * 0x04, "inside fourth"),
+                            (0x280, b'\x05' * 0x04, "also inside fourth"),
+                            (0x300, b'\x06' * 0x04, "after fourth")]
+
+    def test_add_write(self):
+        test_index = tekton_write_index.TektonWriteIndex(self.test_writes)
+        test_index.add_write(0x400, b'', "empty")
+        self.assertEqual(len(self.test_writes), len(test_index))
+        with self.assertRaises(TypeError):
+            test_index.add_write("0x400", b'\x00', "bad")
+
+    def test_writes_in_range(self):
+        test_index = tekton_write_index.TektonWriteIndex(reversed(self.test_writes))
+        test_cases = [{"range": (0x0, 0x100), "owners": []},
+                      {"range": (0x0, 0x101), "owners": ["first"]},
+                      {"range": (0x10f, 0x110), "owners": ["first", "second"]},
+                      {"range": (0x118, 0x120), "owners": []},
+                      {"range": (0x2ff, 0x301), "owners": ["fourth", "after fourth"]},
+                      {"range": (0x250, 0x260), "owners": ["fourth"]},
+                      {"range": (0x150, 0x281), "owners": ["fourth", "inside fourth", "also inside fourth"]}]
+        for test_case in test_cases:
+            found_writes = test_index.writes_in_range(*test_case["range"])
+            self.assertEqual(test_case["owners"], [write_owner for write_address, write_data, write_owner in found_writes],
+                             "Incorrect writes found in range {}-{}".format(*[hex(address)
+                                                                             for address in test_case["range"]]))
+
+    def test_find_overlaps(self):
+        test_index = tekton_write_index.TektonWriteIndex(self.test_writes)
+        found_overlaps = [(overlap.start, overlap.end, overlap.first_write[2], overlap.second_write[2])
+                          for overlap in test_index.find_overlaps()]
+        self.assertEqual([(0x108, 0x110, "first", "second"),
+                          (0x280, 0x284, "fourth", "also inside fourth")], found_overlaps)
+
+        found_overlaps = [(overlap.start, overlap.end, overlap.first_write[2], overlap.second_write[2])
+                          for overlap in test_index.find_overlaps(include_identical=True)]
+        self.assertEqual([(0x108, 0x110, "first", "second"),
+                          (0x120, 0x124, "third", "third copy"),
+                          (0x210, 0x214, "fourth", "inside fourth"),
+                          (0x280, 0x284, "fourth", "also inside fourth")], found_overlaps)
+
+    def test_describe_write(self):
+        self.assertEqual("str write of 16 bytes at 0x100", tekton_write_index.describe_write(self.test_writes[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()